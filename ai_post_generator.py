@@ -10,7 +10,9 @@ import json
 import aiohttp
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
-from google_sheets_client import GoogleSheetsClient
+from async_google_sheets_client import AsyncGoogleSheetsClient
+from render_cache import RenderCache
+from config import RENDER_CACHE_PATH
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,7 +25,7 @@ class AIPostGenerator:
         self.openrouter_api_key = os.getenv("OPENROUTER_API_KEY")
         self.model = os.getenv("AI_MODEL", "google/gemini-2.5-flash-lite-preview-06-17")
         self.api_url = "https://openrouter.ai/api/v1/chat/completions"
-        self.sheets_client = GoogleSheetsClient()
+        self.sheets_client = AsyncGoogleSheetsClient()
         
         # Проверяем API ключ
         if not self.openrouter_api_key or self.openrouter_api_key == "YOUR_OPENROUTER_API_KEY":
@@ -576,13 +578,13 @@ Prompt:"""
             ]
             
             # Проверяем, есть ли уже заголовки
-            existing_data = self.sheets_client.get_all_posts()
+            existing_data = await self.sheets_client.get_all_posts()
             if existing_data and len(existing_data) > 0:
                 logger.info("Заголовки уже существуют")
                 return True
             
             # Добавляем заголовки через setup_headers
-            result = self.sheets_client.setup_headers()
+            result = await self.sheets_client.setup_headers()
             if result:
                 logger.info("✅ Заголовки таблицы инициализированы")
                 return True
@@ -599,9 +601,9 @@ Prompt:"""
         try:
             logger.info(f"📤 Загружаем {len(posts)} постов в Google Таблицу")
             
-            for post in posts:
-                # Преобразуем пост в правильный формат для add_post (правильный порядок)
-                post_data = {
+            # Преобразуем посты в правильный формат для add_posts (правильный порядок)
+            posts_data = [
+                {
                     "date": post["date"],
                     "time": post["time"],
                     "text": post["post"],
@@ -610,19 +612,39 @@ Prompt:"""
                     "image_urls": post["image"] if post["image"] else "",
                     "status": post["status"]
                 }
-                
-                result = self.sheets_client.add_post(post_data)
-                if not result:
-                    logger.error(f"Ошибка загрузки поста {post['date']} {post['time']}")
-                    return False
+                for post in posts
+            ]
+            
+            # Одним запросом: либо загружено все расписание, либо ничего
+            row_indices = await self.sheets_client.add_posts(posts_data)
+            if row_indices is None:
+                logger.error(f"Ошибка загрузки {len(posts_data)} постов - таблица не изменена")
+                return False
             
             logger.info("✅ Все посты успешно загружены в таблицу")
+            
+            # Тексты рендерим сразу после генерации - при публикации они уже будут в кэше.
+            # Разбор и запись в SQLite синхронные - выполняем в отдельном потоке, чтобы не блокировать event loop
+            await asyncio.to_thread(self._prerender_posts, [post["text"] for post in posts_data])
             return True
             
         except Exception as e:
             logger.error(f"Ошибка загрузки постов в таблицу: {e}")
             return False
 
+    def _prerender_posts(self, texts: List[str]):
+        """Готовит тексты постов для отправки в Telegram (кэш рендера)"""
+        try:
+            render_cache = RenderCache(RENDER_CACHE_PATH)
+            try:
+                rendered = render_cache.prepare_texts(texts)
+            finally:
+                render_cache.close()
+            logger.info(f"📝 Подготовлено для Telegram: {rendered} постов")
+        except Exception as e:
+            # Не страшно: при чтении таблицы тексты будут подготовлены заново
+            logger.warning(f"Не удалось подготовить тексты постов заранее: {e}")
+
     async def generate_and_upload_weekly_posts(self) -> bool:
         """Генерирует и загружает посты на 3 дня"""
         try:
@@ -650,6 +672,9 @@ Prompt:"""
         except Exception as e:
             logger.error(f"Ошибка генерации и загрузки постов: {e}")
             return False
+        finally:
+            # Закрываем HTTP-сессию Google Sheets (она привязана к текущему event loop)
+            await self.sheets_client.close()
 
 async def main():
     """Основная функция для тестирования"""
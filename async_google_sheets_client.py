@@ -0,0 +1,304 @@
+"""
+Асинхронный клиент для работы с Google Sheets API
+Работает через aiohttp и не блокирует event loop во время HTTP-запросов
+"""
+import asyncio
+import logging
+import time
+from typing import List, Dict, Any, Optional
+from urllib.parse import quote
+
+import aiohttp
+from google.auth.transport.requests import Request
+
+from google_sheets_client import (
+    GoogleSheetsClient, SheetsUnavailableError, RETRYABLE_STATUSES, get_service_registry
+)
+from rate_limiter import backoff_delay
+from post_record import Post, SHEET_HEADERS
+from config import (
+    GOOGLE_SHEET_ID, GOOGLE_SHEET_NAME, GOOGLE_SHEETS_API_BASE_URL, STATUS_PENDING, SHEETS_RETRY_DEADLINE_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+SHEETS_API_URL = (
+    f"{GOOGLE_SHEETS_API_BASE_URL.rstrip('/')}/v4/spreadsheets" if GOOGLE_SHEETS_API_BASE_URL
+    else "https://sheets.googleapis.com/v4/spreadsheets"
+)
+
+
+class AsyncGoogleSheetsClient:
+    """Асинхронный клиент для работы с Google Sheets API (тот же интерфейс, что и GoogleSheetsClient)"""
+    
+    def __init__(self):
+        self.credentials = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop = None
+        self._token_lock: Optional[asyncio.Lock] = None
+        self._authenticate()
+        
+    def _authenticate(self):
+        """Берет общие credentials процесса (токен получаем лениво, вне event loop)"""
+        self._registry = get_service_registry()
+        self.credentials = self._registry.get_credentials()
+            
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Возвращает общую сессию с пулом соединений (пересоздает при смене event loop)"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            await self._close_session()
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=10, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=30)
+            )
+            self._session_loop = loop
+            self._token_lock = asyncio.Lock()
+        return self._session
+        
+    async def _close_session(self):
+        """Закрывает прежнюю сессию, чтобы не оставлять открытые соединения"""
+        session, self._session = self._session, None
+        if session is None or session.closed:
+            return
+        try:
+            await session.close()
+        except Exception as e:
+            # Сессия от уже закрытого event loop: соединения могли закрыться вместе с ним
+            logger.debug(f"Прежняя сессия Google Sheets закрыта с ошибкой: {e}")
+            
+    async def _get_token(self) -> Optional[str]:
+        """Возвращает access token, обновляя его в отдельном потоке при необходимости"""
+        if self._registry.anonymous:
+            return None
+        async with self._token_lock:
+            if not self.credentials.valid:
+                # Обновление токена - блокирующий HTTP-запрос, выносим из event loop
+                await asyncio.to_thread(self.credentials.refresh, Request())
+        return self.credentials.token
+        
+    async def _request(self, method: str, path: str, params: Dict[str, Any] = None,
+                       body: Dict[str, Any] = None, idempotent: bool = True) -> Dict[str, Any]:
+        """
+        Выполняет запрос к Sheets API с общими лимитами квот и повторами
+        при 429/5xx (как GoogleSheetsClient._execute, append повторяется только после 429)
+        """
+        session = await self._get_session()
+        url = f"{SHEETS_API_URL}/{GOOGLE_SHEET_ID}{path}"
+        limiter = self._registry.read_limiter if method == "GET" else self._registry.write_limiter
+        deadline = time.monotonic() + SHEETS_RETRY_DEADLINE_SECONDS
+        attempt = 0
+        
+        while True:
+            await limiter.acquire_async()
+            try:
+                token = await self._get_token()
+                headers = {"Authorization": f"Bearer {token}"} if token else {}
+                async with session.request(method, url, params=params, json=body, headers=headers) as response:
+                    response.raise_for_status()
+                    return await response.json()
+            except aiohttp.ClientResponseError as e:
+                if e.status not in RETRYABLE_STATUSES:
+                    raise
+                error = e
+                reason = f"HTTP {e.status}"
+                rejected = e.status == 429
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = e
+                reason = type(e).__name__
+                rejected = False
+            
+            if not idempotent and not rejected:
+                logger.error(f"Google Sheets ответила {reason} на запись, которую нельзя повторять - она могла быть выполнена")
+                raise SheetsUnavailableError(f"Google Sheets не подтвердила запись ({reason}), проверьте таблицу") from error
+            
+            delay = backoff_delay(attempt)
+            if time.monotonic() + delay > deadline:
+                logger.error(f"Google Sheets недоступна ({reason}), повторы исчерпаны за {SHEETS_RETRY_DEADLINE_SECONDS} сек")
+                raise SheetsUnavailableError(f"Google Sheets временно недоступна: {reason}") from error
+            
+            attempt += 1
+            logger.warning(f"Google Sheets ответила {reason}, повтор #{attempt} через {delay:.1f} сек")
+            await asyncio.sleep(delay)
+            
+    @staticmethod
+    def _values_path(a1_range: str, suffix: str = '') -> str:
+        """Формирует путь к диапазону значений"""
+        return f"/values/{quote(a1_range, safe='')}{suffix}"
+        
+    async def close(self):
+        """Закрывает HTTP-сессию"""
+        await self._close_session()
+        
+    async def get_sheet_name(self) -> str:
+        """Получает имя первого доступного листа"""
+        if not self.credentials:
+            return GOOGLE_SHEET_NAME
+            
+        if self._registry.sheet_name:
+            return self._registry.sheet_name
+            
+        try:
+            result = await self._request("GET", "", params={"fields": "sheets.properties.title"})
+            sheets = result.get('sheets', [])
+            
+            if sheets:
+                first_sheet = sheets[0].get('properties', {}).get('title', GOOGLE_SHEET_NAME)
+                self._registry.sheet_name = first_sheet
+                logger.info(f"📋 Используем лист: '{first_sheet}'")
+                return first_sheet
+            else:
+                logger.warning("⚠️ В таблице нет листов, используем значение по умолчанию")
+                return GOOGLE_SHEET_NAME
+                
+        except SheetsUnavailableError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения имени листа: {e}")
+            logger.info(f"📋 Используем значение по умолчанию: '{GOOGLE_SHEET_NAME}'")
+            return GOOGLE_SHEET_NAME
+            
+    async def _get_rows(self) -> List[List[str]]:
+        """Читает все строки с данными (без заголовка)"""
+        sheet_name = await self.get_sheet_name()
+        result = await self._request("GET", self._values_path(f'{sheet_name}!A2:I'))
+        return result.get('values', [])
+        
+    async def get_pending_posts(self) -> List[Post]:
+        """Получает посты со статусом 'Ожидает' для публикации"""
+        if not self.credentials:
+            logger.warning("Google Sheets API не инициализирован, возвращаем пустой список")
+            return []
+            
+        try:
+            values = await self._get_rows()
+            pending_posts = [
+                Post.from_row(row, i)
+                for i, row in enumerate(values, start=2)
+                if len(row) >= 7 and row[6] == STATUS_PENDING
+            ]
+            logger.info(f"Найдено {len(pending_posts)} постов для публикации")
+            return pending_posts
+            
+        except SheetsUnavailableError:
+            raise
+        except aiohttp.ClientResponseError as e:
+            logger.error(f"Ошибка Google Sheets API: {e.status} {e.message}")
+            return []
+        except Exception as e:
+            logger.error(f"Ошибка получения постов для публикации: {e}")
+            return []
+            
+    async def get_all_posts(self) -> List[Post]:
+        """Получает все посты из Google Sheets"""
+        if not self.credentials:
+            logger.warning("Google Sheets API не инициализирован, возвращаем пустой список")
+            return []
+            
+        try:
+            values = await self._get_rows()
+            posts = [
+                Post.from_row(row, i)
+                for i, row in enumerate(values, start=2)
+                if len(row) >= 5
+            ]
+            logger.info(f"Получено {len(posts)} постов из Google Sheets")
+            return posts
+            
+        except SheetsUnavailableError:
+            raise
+        except aiohttp.ClientResponseError as e:
+            logger.error(f"Ошибка Google Sheets API: {e.status} {e.message}")
+            return []
+        except Exception as e:
+            logger.error(f"Ошибка получения всех постов: {e}")
+            return []
+            
+    async def update_post_status(self, row_index: int, status: str, error_msg: str = None) -> bool:
+        """Обновляет статус поста в Google Sheets"""
+        if not self.credentials:
+            logger.warning("Google Sheets API не инициализирован, пропускаем обновление")
+            return True
+            
+        try:
+            sheet_name = await self.get_sheet_name()
+            await self._request(
+                "PUT", self._values_path(f'{sheet_name}!G{row_index}'),
+                params={"valueInputOption": "RAW"},
+                body={'values': [[status]]}
+            )
+            
+            if error_msg:
+                logger.info(f"Статус поста в строке {row_index} обновлен на '{status}': {error_msg}")
+            else:
+                logger.info(f"Статус поста в строке {row_index} обновлен на '{status}'")
+            return True
+            
+        except aiohttp.ClientResponseError as e:
+            logger.error(f"Ошибка Google Sheets API: {e.status} {e.message}")
+            return False
+        except Exception as e:
+            logger.error(f"Ошибка обновления статуса поста: {e}")
+            return False
+            
+    async def add_post(self, post_data: Dict[str, Any]) -> bool:
+        """Добавляет пост в Google Sheets"""
+        return await self.add_posts([post_data]) is not None
+        
+    async def add_posts(self, posts: List[Dict[str, Any]]) -> Optional[List[int]]:
+        """
+        Добавляет несколько постов одним запросом append (все или ничего).
+        Возвращает номера добавленных строк или None при ошибке.
+        """
+        if not self.credentials:
+            logger.warning("Google Sheets API не инициализирован, пропускаем добавление постов")
+            return []
+            
+        if not posts:
+            return []
+            
+        try:
+            values = [GoogleSheetsClient._post_to_row(post_data) for post_data in posts]
+            sheet_name = await self.get_sheet_name()
+            result = await self._request(
+                "POST", self._values_path(f'{sheet_name}!A:G', ':append'),
+                params={"valueInputOption": "RAW", "insertDataOption": "INSERT_ROWS"},
+                body={'values': values}, idempotent=False
+            )
+            
+            updates = result.get('updates', {})
+            row_indices = GoogleSheetsClient._rows_from_range(updates.get('updatedRange', ''))
+            logger.info(f"Добавлено {updates.get('updatedRows', 0)} строк в Google Sheets: {row_indices}")
+            return row_indices
+            
+        except aiohttp.ClientResponseError as e:
+            logger.error(f"Ошибка Google Sheets API: {e.status} {e.message}")
+            return None
+        except Exception as e:
+            logger.error(f"Ошибка добавления постов: {e}")
+            return None
+            
+    async def setup_headers(self) -> bool:
+        """Настраивает заголовки таблицы"""
+        if not self.credentials:
+            logger.warning("Google Sheets API не инициализирован, пропускаем настройку заголовков")
+            return True
+            
+        try:
+            sheet_name = await self.get_sheet_name()
+            headers = [SHEET_HEADERS]
+            await self._request(
+                "PUT", self._values_path(f'{sheet_name}!A1:I1'),
+                params={"valueInputOption": "RAW"},
+                body={'values': headers}
+            )
+            
+            logger.info("Заголовки таблицы настроены")
+            return True
+            
+        except aiohttp.ClientResponseError as e:
+            logger.error(f"Ошибка Google Sheets API: {e.status} {e.message}")
+            return False
+        except Exception as e:
+            logger.error(f"Ошибка настройки заголовков: {e}")
+            return False
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк разбора времени публикации
+
+Сравнивает прежний перебор datetime.strptime по форматам с разбором
+через скомпилированные регулярные выражения и кэш (post_record.parse_publish_datetime).
+    python bench_publish_time_parser.py --rows 10000 --cycles 10
+"""
+import argparse
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+from post_record import MOSCOW_TZ, PUBLISH_DATETIME_FORMATS, parse_publish_datetime
+
+
+def parse_with_strptime(date_str: str, time_str: str):
+    """Прежний парсер: перебор форматов strptime с исключениями"""
+    value = f"{date_str} {time_str}"
+    for fmt in PUBLISH_DATETIME_FORMATS:
+        try:
+            return MOSCOW_TZ.localize(datetime.strptime(value, fmt))
+        except ValueError:
+            continue
+    return None
+
+
+def generate_rows(count: int):
+    """Строки (дата, время) во всех поддерживаемых форматах и немного некорректных"""
+    start = datetime(2025, 9, 1, 8, 0)
+    rows = []
+    for i in range(count):
+        moment = start + timedelta(minutes=37 * i)
+        kind = i % 10
+        if kind < 4:
+            rows.append((moment.strftime('%d.%m.%y'), moment.strftime('%H:%M')))
+        elif kind < 7:
+            rows.append((moment.strftime('%d.%m.%Y'), moment.strftime('%H:%M')))
+        elif kind < 8:
+            rows.append((moment.strftime('%Y-%m-%d'), moment.strftime('%H:%M:%S')))
+        elif kind < 9:
+            rows.append((moment.strftime('%Y-%m-%d'), moment.strftime('%H:%M')))
+        else:
+            rows.append(('завтра', moment.strftime('%H:%M')))
+    random.Random(42).shuffle(rows)
+    return rows
+
+
+def measure(parser, rows, cycles: int) -> float:
+    started = time.perf_counter()
+    for _ in range(cycles):
+        for date_str, time_str in rows:
+            parser(date_str, time_str)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк разбора времени публикации')
+    parser.add_argument('--rows', type=int, default=10000, help='Количество строк')
+    parser.add_argument('--cycles', type=int, default=10, help='Сколько раз разбирать те же строки (циклы опроса)')
+    args = parser.parse_args()
+
+    # Предупреждения о нераспознанных датах не интересны для замера
+    logging.basicConfig(level=logging.ERROR)
+    rows = generate_rows(args.rows)
+
+    # Результаты обоих парсеров должны совпадать
+    mismatches = [row for row in rows if parse_with_strptime(*row) != parse_publish_datetime(*row)]
+    print(f"Расхождений с прежним парсером: {len(mismatches)}")
+
+    baseline_single = measure(parse_with_strptime, rows, 1)
+    baseline = measure(parse_with_strptime, rows, args.cycles)
+
+    parse_publish_datetime.cache_clear()
+    cold = measure(parse_publish_datetime.__wrapped__, rows, 1)
+    parse_publish_datetime.cache_clear()
+    cached = measure(parse_publish_datetime, rows, args.cycles)
+
+    print(f"Строк: {args.rows}, циклов: {args.cycles}")
+    print(f"strptime, один проход:      {baseline_single * 1000:8.1f} мс")
+    print(f"regex без кэша, один проход: {cold * 1000:8.1f} мс ({baseline_single / cold:.1f}x)")
+    print(f"strptime, {args.cycles} циклов:        {baseline * 1000:8.1f} мс")
+    print(f"regex + кэш, {args.cycles} циклов:     {cached * 1000:8.1f} мс ({baseline / cached:.1f}x)")
+    print(f"Кэш: {parse_publish_datetime.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк цикла опроса Google Sheets на локальном fake_sheets_server.py
+
+Запускает фейковый API, направляет на него GoogleSheetsClient и выполняет
+N циклов проверки (has_changes + get_pending_posts, как в main.py).
+Режимы чтения переключаются теми же переменными окружения, что и в продакшене:
+    SHEETS_SPARSE_READS=false SHEETS_CHANGE_PROBE=false python bench_sheets_polling.py
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+
+from fake_sheets_server import FakeSheetsServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк опроса Google Sheets')
+    parser.add_argument('--rows', type=int, default=2000, help='Количество постов в таблице')
+    parser.add_argument('--pending', type=int, default=10, help='Сколько постов в статусе "Ожидает"')
+    parser.add_argument('--cycles', type=int, default=50, help='Количество циклов опроса')
+    parser.add_argument('--latency', type=float, default=0.02, help='Задержка ответа API, сек')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 429')
+    args = parser.parse_args()
+
+    # Посты с датой в будущем, чтобы они оставались в статусе "Ожидает"
+    server = FakeSheetsServer(latency=args.latency, error_rate=args.error_rate).start()
+    server.spreadsheet.populate(args.rows, pending=args.pending)
+    for row in server.spreadsheet.sheets[server.spreadsheet.sheet_name][-args.pending:]:
+        row[0] = '31.12.2099'
+
+    # Клиент читает адрес API из окружения при импорте config
+    os.environ['GOOGLE_SHEETS_API_BASE_URL'] = server.url
+    os.environ.setdefault('SHEETS_READ_REQUESTS_PER_MINUTE', '100000')
+    os.environ.setdefault('SHEETS_WRITE_REQUESTS_PER_MINUTE', '100000')
+    from google_sheets_client import GoogleSheetsClient
+    from post_record import MOSCOW_TZ
+    from config import SHEETS_INCREMENTAL_READS, SHEETS_SPARSE_READS, SHEETS_CHANGE_PROBE
+
+    client = GoogleSheetsClient()
+    client.get_sheet_name()
+    server.reset_stats()
+
+    started = time.perf_counter()
+    for _ in range(args.cycles):
+        if client.has_changes(datetime.now(MOSCOW_TZ)):
+            client.get_pending_posts()
+        client.flush_status_updates()
+    elapsed = time.perf_counter() - started
+
+    print(f"Режим: incremental={SHEETS_INCREMENTAL_READS} sparse={SHEETS_SPARSE_READS} probe={SHEETS_CHANGE_PROBE}")
+    print(f"Строк: {args.rows}, ожидают: {args.pending}, циклов: {args.cycles}, задержка API: {args.latency} сек")
+    print(f"Время: {elapsed:.2f} сек ({elapsed / args.cycles * 1000:.1f} мс на цикл)")
+    print(f"Запросов: {sum(server.requests.values())} {dict(server.requests)}")
+    print(f"Получено байт: {server.bytes_sent} ({server.bytes_sent / args.cycles / 1024:.1f} КБ на цикл)")
+    print(f"Полных чтений: {client.read_stats['performed']}, пропущено: {client.read_stats['skipped']}")
+
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
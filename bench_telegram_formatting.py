@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Проверка и замер форматирования постов для Telegram
+
+На постах ~4000 символов с разметкой и без нее проверяет, что разбор за один
+проход (telegram_formatting.compile_post) дает правильно вложенный HTML и
+сущности, которые примет Bot API, а прежняя цепочка str.replace/re.sub - нет.
+Разбор на Python дороже прежней цепочки на постах с разметкой: это исправление
+корректности, а не ускорение. Поэтому разбор выполняется один раз на текст поста
+при чтении таблицы (render_cache), а при отправке берется готовый текст и
+строится только план (send_planner) - его стоимость замеряется отдельно.
+    python bench_telegram_formatting.py --posts 500 --cycles 5
+"""
+import argparse
+import logging
+import random
+import re
+import time
+from html.parser import HTMLParser
+
+from render_cache import RenderCache
+from send_planner import SendPlanner, FORMAT_ENTITIES, FORMAT_PARSE_MODE
+from telegram_formatting import compile_post, validate_entities
+
+
+def old_image_post_html(text: str) -> str:
+    """Прежний _process_text_for_image_posts + _validate_html_tags"""
+    for br in ('<br>', '<br/>', '<br />'):
+        text = text.replace(br, '\n')
+    for tag in ('<div>', '</div>', '<p>', '</p>', '<ul>', '</ul>', '<ol>', '</ol>'):
+        text = text.replace(tag, '')
+    text = text.replace('<li>', '• ')
+    text = text.replace('</li>', '\n')
+    for tag in ['b', 'i', 'u', 'strong', 'em']:
+        open_tags = text.count(f'<{tag}>')
+        close_tags = text.count(f'</{tag}>')
+        if open_tags > close_tags:
+            text += f'</{tag}>' * (open_tags - close_tags)
+        elif close_tags > open_tags:
+            for _ in range(close_tags - open_tags):
+                text = text.rsplit(f'</{tag}>', 1)[0] + text.rsplit(f'</{tag}>', 1)[1]
+    return text
+
+
+def old_markdown_to_html(text: str) -> str:
+    """Прежний format_text_for_telegram_html"""
+    text = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', text)
+    text = re.sub(r'\*(.*?)\*', r'<i>\1</i>', text)
+    text = re.sub(r'__(.*?)__', r'<u>\1</u>', text)
+    text = re.sub(r'~~(.*?)~~', r'<s>\1</s>', text)
+    text = re.sub(r'`(.*?)`', r'<code>\1</code>', text)
+    text = re.sub(r'```(.*?)```', r'<pre>\1</pre>', text, flags=re.DOTALL)
+    text = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'<a href="\2">\1</a>', text)
+    text = re.sub(r'^> (.+?)$', r'<blockquote>\1</blockquote>', text, flags=re.MULTILINE)
+    return text
+
+
+def old_markdown(text: str) -> str:
+    """Прежний format_text_for_telegram_markdown"""
+    for old, new in (('<b>', '**'), ('</b>', '**'), ('<i>', '*'), ('</i>', '*'), ('<u>', '__'), ('</u>', '__'),
+                     ('<br>', '\n'), ('<br/>', '\n'), ('<br />', '\n'),
+                     ('<div>', ''), ('</div>', ''), ('<p>', ''), ('</p>', '')):
+        text = text.replace(old, new)
+    return text
+
+
+_FRAGMENTS = [
+    "Доброе утро! ☀️ Сегодня разбираем, как планировать неделю. ",
+    "**Главное:** начинайте с одной задачи. ",
+    "*Совет дня* — записывайте мысли сразу. ",
+    "<b>Важно</b>: <i>не откладывайте</i> простые дела. ",
+    "Подробнее — [в статье](https://example.com/article?id=42). ",
+    "__Подчеркнутая__ мысль и ~~зачеркнутая~~ ошибка. ",
+    "Команда `make plan` собирает отчет. ",
+    "<strong>Жирный <em>вложенный</em></strong> текст. ",
+    "Цена: 5 * 3 = 15 ₽ & скидка 10%. ",
+    "<b>Незакрытый жирный ",
+    "лишний закрывающий</i> тег. ",
+    "🍽 Обед: суп, салат и компот. 😋 ",
+]
+_BLOCKS = [
+    "\n\n> Цитата дня: «Делай, что можешь».\n> — автор неизвестен\n\n",
+    "<ul><li>первый пункт</li><li>второй <b>пункт</b></li></ul>",
+    "<p>Абзац в HTML.</p><br>",
+    "\n\n```\nкод без **разметки**\n```\n\n",
+]
+
+
+def strip_markup(post: str) -> str:
+    """Тот же пост без символов разметки (так выглядят посты без форматирования)"""
+    return re.sub(r'[`<&\[*_~|>]', '', post)
+
+
+def generate_posts(count: int, size: int = 4000):
+    """Посты длиной ~size символов: смесь Markdown и HTML, как присылает генератор"""
+    rng = random.Random(42)
+    posts = []
+    for _ in range(count):
+        parts = []
+        length = 0
+        while length < size:
+            part = rng.choice(_BLOCKS) if rng.random() < 0.15 else rng.choice(_FRAGMENTS)
+            parts.append(part)
+            length += len(part)
+        posts.append(''.join(parts)[:size])
+    return posts
+
+
+class _NestingChecker(HTMLParser):
+    """Проверяет, что теги Telegram HTML закрыты в обратном порядке"""
+    
+    TAGS = {'b', 'strong', 'i', 'em', 'u', 's', 'code', 'pre', 'a', 'blockquote', 'tg-spoiler'}
+    
+    def __init__(self):
+        super().__init__()
+        self.stack = []
+        self.errors = 0
+        
+    def handle_starttag(self, tag, attrs):
+        if tag in self.TAGS:
+            self.stack.append(tag)
+            
+    def handle_endtag(self, tag):
+        if tag not in self.TAGS:
+            return
+        if not self.stack or self.stack[-1] != tag:
+            self.errors += 1
+            if tag in self.stack:
+                self.stack = self.stack[:len(self.stack) - 1 - self.stack[::-1].index(tag)]
+        else:
+            self.stack.pop()
+
+
+def is_balanced(html_text: str) -> bool:
+    checker = _NestingChecker()
+    checker.feed(html_text)
+    checker.close()
+    return checker.errors == 0 and not checker.stack
+
+
+def measure(formatter, posts, cycles: int) -> float:
+    started = time.perf_counter()
+    for _ in range(cycles):
+        for post in posts:
+            formatter(post)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк форматирования постов для Telegram')
+    parser.add_argument('--posts', type=int, default=500, help='Количество постов')
+    parser.add_argument('--size', type=int, default=4000, help='Длина поста в символах')
+    parser.add_argument('--cycles', type=int, default=5, help='Сколько раз форматировать те же посты')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.ERROR)
+    posts = generate_posts(args.posts, args.size)
+    
+    old_html_chain = lambda post: old_image_post_html(old_markdown_to_html(post))
+    new_html = lambda post: compile_post(post).render_html()
+    
+    old_broken = sum(1 for post in posts if not is_balanced(old_html_chain(post)))
+    new_broken = sum(1 for post in posts if not is_balanced(new_html(post)))
+    rejected = 0
+    for post in posts:
+        formatted = compile_post(post)
+        rejected += len(validate_entities(formatted.text, formatted.to_entities(), limit=len(formatted.text) * 2)[1])
+    print(f"Постов: {args.posts} x {args.size} символов, циклов: {args.cycles}")
+    print(f"Несбалансированный HTML: прежняя цепочка {old_broken}, compile_post {new_broken}")
+    print(f"Сущностей, которые отклонил бы Bot API (отбрасывает sanitize перед отправкой): {rejected}")
+    
+    # Разбор - один раз на текст поста, при чтении таблицы; на постах с разметкой он дороже
+    plain_posts = [strip_markup(post) for post in posts]
+    cases = [
+        ("HTML (Markdown -> HTML + проверка тегов)", old_html_chain, new_html, posts),
+        ("HTML для постов с изображениями", old_image_post_html, new_html, posts),
+        ("Markdown", old_markdown, lambda post: compile_post(post).render_markdown(), posts),
+        ("HTML, посты без разметки", old_html_chain, new_html, plain_posts),
+    ]
+    print("Разбор (один раз на текст поста):")
+    for title, old, new, sample in cases:
+        baseline = measure(old, sample, args.cycles)
+        compiled = measure(new, sample, args.cycles)
+        print(f"  {title}:")
+        print(f"    прежняя цепочка: {baseline * 1000:8.1f} мс")
+        print(f"    compile_post:    {compiled * 1000:8.1f} мс ({compiled / baseline:.2f} от прежней цепочки)")
+        
+    # Отправка: готовый текст из кэша и план вызовов Bot API
+    cache = RenderCache(':memory:')
+    cache.prepare_texts(posts)
+    images = {'без изображений': [], 'одно изображение': ['https://example.com/1.jpg'],
+              'медиагруппа': ['https://example.com/1.jpg', 'https://example.com/2.jpg']}
+    print("Отправка (готовый текст из RenderCache + план):")
+    for mode in (FORMAT_ENTITIES, FORMAT_PARSE_MODE):
+        planner = SendPlanner(mode)
+        for title, urls in images.items():
+            elapsed = measure(lambda post: planner.plan(cache.get(post).formatted, urls), posts, args.cycles)
+            print(f"  {mode}, {title}: {elapsed * 1000:8.1f} мс")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
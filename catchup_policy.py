@@ -0,0 +1,117 @@
+"""
+Политика догоняющей публикации после простоя
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from post_record import Post
+
+logger = logging.getLogger(__name__)
+
+# Режимы догоняющей публикации
+CATCHUP_OFF = "off"        # Публиковать все просроченные посты сразу (как раньше)
+CATCHUP_SPREAD = "spread"  # Растянуть просроченные посты на окно window
+CATCHUP_LATEST = "latest"  # Опубликовать только последние keep_latest, остальные пропустить
+CATCHUP_SKIP = "skip"      # Пропустить посты старше max_age, остальные опубликовать
+
+CATCHUP_MODES = (CATCHUP_OFF, CATCHUP_SPREAD, CATCHUP_LATEST, CATCHUP_SKIP)
+
+
+class CatchupPolicy:
+    """
+    Решает, что делать с постами, время которых наступило.
+    Посты, опоздавшие не больше чем на grace, публикуются сразу; остальные
+    (просроченные после простоя) обрабатываются по выбранному режиму.
+    План растягивания запоминается между циклами: уже запланированные
+    посты сохраняют свое время, новые просроченные встают в конец.
+    """
+    
+    def __init__(self, mode: str, grace: timedelta, window: timedelta, keep_latest: int,
+                 max_age: timedelta, send_interval: float):
+        if mode not in CATCHUP_MODES:
+            logger.warning(f"Неизвестный режим догоняющей публикации '{mode}', используем '{CATCHUP_OFF}'")
+            mode = CATCHUP_OFF
+        self.mode = mode
+        self.grace = grace
+        self.window = window
+        self.keep_latest = max(keep_latest, 1)
+        self.max_age = max_age
+        self.send_interval = send_interval
+        
+        self._planned: Dict[int, datetime] = {}
+        self._spacing = timedelta(0)
+        
+    @staticmethod
+    def _order(post: Post):
+        return (post.publish_at, post.row_index or 0)
+        
+    def _spread(self, overdue: List[Post], now: datetime) -> bool:
+        """
+        Назначает время публикации каждому просроченному посту (план сохраняется между циклами).
+        Возвращает True, если в план добавлены новые посты.
+        """
+        rows = {post.row_index for post in overdue}
+        # Забываем посты, которые уже опубликованы или исчезли из таблицы
+        self._planned = {row: at for row, at in self._planned.items() if row in rows}
+        
+        new_posts = [post for post in overdue if post.row_index not in self._planned]
+        if new_posts:
+            if not self._planned:
+                # Новый план: равномерно по окну, первый пост - сразу
+                self._spacing = self.window / len(new_posts)
+                tail = now - self._spacing
+            else:
+                tail = max(self._planned.values())
+            for post in new_posts:
+                tail = max(tail + self._spacing, now)
+                self._planned[post.row_index] = tail
+        return bool(new_posts)
+        
+    def plan(self, due_posts: List[Post], now: datetime) -> Dict[str, Any]:
+        """
+        Строит план публикации наступивших постов:
+        {'now': [...], 'deferred': [...], 'skipped': [...], 'planned': {строка: время},
+         'overdue': число просроченных, 'completion': ожидаемое время окончания,
+         'changed': план изменился в этом цикле (стоит сообщить администраторам)}
+        """
+        on_time, overdue = [], []
+        for post in sorted(due_posts, key=self._order):
+            (overdue if now - post.publish_at > self.grace else on_time).append(post)
+            
+        result = {'now': on_time, 'deferred': [], 'skipped': [], 'planned': {}, 'overdue': len(overdue),
+                  'changed': bool(overdue)}
+        
+        if not overdue or self.mode == CATCHUP_OFF:
+            result['now'] = sorted(on_time + overdue, key=self._order)
+        elif self.mode == CATCHUP_SKIP:
+            for post in overdue:
+                (result['skipped'] if now - post.publish_at > self.max_age else result['now']).append(post)
+        elif self.mode == CATCHUP_LATEST:
+            result['skipped'] = overdue[:-self.keep_latest]
+            result['now'] = on_time + overdue[-self.keep_latest:]
+        elif self.mode == CATCHUP_SPREAD:
+            result['changed'] = self._spread(overdue, now)
+            planned = self._planned
+            for post in overdue:
+                if planned[post.row_index] <= now:
+                    del planned[post.row_index]
+                    result['now'].append(post)
+                else:
+                    result['deferred'].append(post)
+                    result['planned'][post.row_index] = planned[post.row_index]
+        result['now'].sort(key=self._order)
+        
+        # Пачка "сейчас" отправляется с минимальным интервалом между сообщениями
+        completion = now + timedelta(seconds=max(len(result['now']) - 1, 0) * self.send_interval)
+        if result['planned']:
+            completion = max(completion, max(result['planned'].values()))
+        result['completion'] = completion
+        
+        if overdue:
+            logger.info(
+                f"Догоняющая публикация ({self.mode}): просрочено {len(overdue)}, сейчас {len(result['now'])}, "
+                f"позже {len(result['deferred'])}, пропущено {len(result['skipped'])}, "
+                f"окончание ~{completion.strftime('%H:%M:%S')}"
+            )
+        return result
@@ -0,0 +1,135 @@
+"""
+Публикация поста сразу в несколько каналов/групп с отдельным лимитом на каждый канал
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from post_record import Post
+from rate_limiter import backoff_delay
+from config import STATUS_PUBLISHED, STATUS_ERROR, STATUS_PARTIAL
+
+logger = logging.getLogger(__name__)
+
+# Отправка поста через клиент конкретного канала начиная с шага плана: TelegramClient.SendResult
+SendToFunc = Callable[[Post, Any, int], Awaitable[Any]]
+
+
+class ChannelFanout:
+    """
+    Рассылает пост по каналам параллельно.
+    Каналы берутся из колонки H строки, а если она пуста - из конфигурации.
+    У каждого канала свой результат; темп отправки в каждый чат выдерживает общая
+    очередь TelegramSendQueue. Повтор с экспоненциальной паузой - только если шаг плана
+    точно не дошел до Telegram, и продолжается с этого шага: уже отправленные сообщения
+    не дублируются. Каналы, уже отмеченные в колонке I как опубликованные
+    (например, после ручного повтора строки с ошибкой), пропускаются, а частично
+    отправленные продолжаются с шага из журнала публикаций.
+    """
+    
+    def __init__(self, telegram_client, default_destinations: List[str], max_attempts: int = 3):
+        self.telegram_client = telegram_client
+        self.default_destinations = list(default_destinations)
+        self.max_attempts = max(max_attempts, 1)
+        self._clients: Dict[str, Any] = {}
+        
+    def destinations_for(self, post: Post) -> List[str]:
+        """Каналы для поста (без повторов, в исходном порядке)"""
+        return list(dict.fromkeys(post.destinations or self.default_destinations))
+        
+    def _client(self, destination: str):
+        client = self._clients.get(destination)
+        if client is None:
+            client = self._clients[destination] = self.telegram_client.for_channel(destination)
+        return client
+        
+    async def _publish_to(self, post: Post, destination: str, send: SendToFunc,
+                          start: int = 0, message_ids: List[int] = None) -> Dict[str, Any]:
+        """
+        Отправляет пост в один канал, начиная с шага start (message_ids - уже отправленные
+        сообщения); повторяет только шаг, который точно не был отправлен
+        """
+        result = {'ok': False, 'message_ids': list(message_ids or []), 'steps': start, 'attempts': 0, 'error': None}
+        for attempt in range(self.max_attempts):
+            if attempt:
+                await asyncio.sleep(backoff_delay(attempt - 1))
+            result['attempts'] = attempt + 1
+            try:
+                sent = await send(post, self._client(destination), result['steps'])
+            except ValueError as e:
+                # План не построить (например, пустой пост) - повтор ничего не изменит
+                result['error'] = str(e)
+                return result
+            except Exception as e:
+                # Неизвестно, дошел ли запрос: повтор мог бы продублировать сообщения
+                logger.error(f"Канал {destination}: ошибка отправки поста из строки {post.row_index}: {e}")
+                result['error'] = str(e)
+                return result
+            result['message_ids'].extend(sent.message_ids)
+            result['steps'] = sent.steps_done
+            if sent.ok:
+                result['ok'] = True
+                result['error'] = None
+                return result
+            result['error'] = sent.error
+            if not sent.retryable:
+                break
+            logger.warning(
+                f"Канал {destination}: попытка {attempt + 1}/{self.max_attempts} отправки поста "
+                f"из строки {post.row_index} не удалась на шаге {sent.steps_done + 1} из {sent.total_steps}"
+            )
+        result['error'] = result['error'] or "Ошибка отправки в Telegram"
+        return result
+        
+    async def publish(self, post: Post, send: SendToFunc, resume: Optional[Dict[str, dict]] = None) -> Dict[str, Any]:
+        """
+        Публикует пост во все его каналы одновременно.
+        resume - частичная отправка из журнала публикаций (PublishOutbox.get_partial).
+        Возвращает {'ok': все каналы успешны, 'partial': часть сообщений уже в канале,
+        'destinations': {канал: {'ok', 'message_ids', 'steps', 'attempts', 'error'}},
+        'statuses': строка для колонки I}
+        """
+        sent_before = (resume or {}).get('message_ids') or {}
+        progress = (resume or {}).get('progress') or {}
+        done = {
+            destination for destination, status in post.destination_statuses.items()
+            if status == STATUS_PUBLISHED
+        }
+        # Каналы, куда пост ушел полностью до ошибки в другом канале
+        done |= {destination for destination in sent_before if destination not in progress}
+        destinations = self.destinations_for(post)
+        if not destinations:
+            raise RuntimeError("не заданы каналы для публикации (колонка H или TELEGRAM_CHANNEL_IDS)")
+        targets = [destination for destination in destinations if destination not in done]
+        if len(targets) < len(destinations):
+            logger.info(f"Пост из строки {post.row_index} уже опубликован в {len(destinations) - len(targets)} "
+                        f"из {len(destinations)} каналов - отправляем только в оставшиеся")
+        
+        if progress:
+            logger.info(f"Пост из строки {post.row_index} отправлен частично - продолжаем с места ошибки: {progress}")
+        
+        results = await asyncio.gather(*(
+            self._publish_to(post, destination, send, progress.get(destination, 0), sent_before.get(destination))
+            for destination in targets
+        ))
+        
+        per_destination = {
+            destination: {'ok': True, 'message_ids': sent_before.get(destination, []), 'steps': 0,
+                          'attempts': 0, 'error': None}
+            for destination in destinations if destination in done
+        }
+        per_destination.update(zip(targets, results))
+        statuses = '; '.join(
+            f"{destination}: {self._status(per_destination[destination])}" for destination in destinations
+        )
+        ok = all(result['ok'] for result in per_destination.values())
+        partial = any(not result['ok'] and result['message_ids'] for result in per_destination.values())
+        if len(destinations) > 1:
+            logger.info(f"Пост из строки {post.row_index} по каналам: {statuses}")
+        return {'ok': ok, 'partial': partial, 'destinations': per_destination, 'statuses': statuses}
+        
+    @staticmethod
+    def _status(result: Dict[str, Any]) -> str:
+        if result['ok']:
+            return STATUS_PUBLISHED
+        return STATUS_PARTIAL if result['message_ids'] else STATUS_ERROR
@@ -8,6 +8,9 @@ from typing import Dict, Any
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "YOUR_TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHANNEL_ID = os.getenv("TELEGRAM_CHANNEL_ID", "-1002907282373")  # Основной канал для постов
 TELEGRAM_CHANNEL_USERNAME = os.getenv("TELEGRAM_CHANNEL_USERNAME", "@sovpalitest")
+# Каналы/группы для публикации через запятую (по умолчанию - основной канал).
+# Для отдельного поста список можно задать в колонке H таблицы
+TELEGRAM_CHANNEL_IDS = [c.strip() for c in os.getenv("TELEGRAM_CHANNEL_IDS", TELEGRAM_CHANNEL_ID).split(',') if c.strip()]
 ADMIN_CHAT_ID = os.getenv("ADMIN_CHAT_ID", "-1003089435390")  # Группа для уведомлений об ошибках
 ALERT_ADMIN_CHANNEL = os.getenv("ALERT_ADMIN_CHANNEL", "-1003089435390")  # Группа AlertChanel для команд
 NOTIFICATION_CHANNEL_ID = os.getenv("NOTIFICATION_CHANNEL_ID", "-1003089435390")  # Группа для системных уведомлений
@@ -16,6 +19,21 @@ COMMAND_CHANNEL_ID = os.getenv("COMMAND_CHANNEL_ID", "-1003089435390")  # Гру
 # Google Sheets настройки
 GOOGLE_SHEET_ID = os.getenv("GOOGLE_SHEET_ID", "YOUR_GOOGLE_SHEET_ID")
 GOOGLE_SHEET_NAME = os.getenv("GOOGLE_SHEET_NAME", "Sheet1")
+# Адрес Sheets API (пусто - настоящий Google; для локального fake_sheets_server.py: http://127.0.0.1:8085/)
+GOOGLE_SHEETS_API_BASE_URL = os.getenv("GOOGLE_SHEETS_API_BASE_URL", "")
+
+# Инкрементальное чтение таблицы: читаем только строки начиная с первого неопубликованного поста
+SHEETS_INCREMENTAL_READS = os.getenv("SHEETS_INCREMENTAL_READS", "true").lower() in ("1", "true", "yes")
+SHEETS_FULL_RESYNC_MINUTES = int(os.getenv("SHEETS_FULL_RESYNC_MINUTES", "60"))  # Полное перечитывание раз в N минут
+# Разреженное чтение: сначала колонка статусов G, затем полные строки только для ожидающих постов
+SHEETS_SPARSE_READS = os.getenv("SHEETS_SPARSE_READS", "true").lower() in ("1", "true", "yes")
+# Проверка изменений (хэш колонок даты/времени/статуса) перед полным чтением
+SHEETS_CHANGE_PROBE = os.getenv("SHEETS_CHANGE_PROBE", "true").lower() in ("1", "true", "yes")
+SHEETS_PROBE_MAX_SKIPS = int(os.getenv("SHEETS_PROBE_MAX_SKIPS", "15"))  # Максимум пропусков подряд
+# Квоты Sheets API (запросов в минуту) и общий дедлайн повторов при 429/5xx
+SHEETS_READ_REQUESTS_PER_MINUTE = int(os.getenv("SHEETS_READ_REQUESTS_PER_MINUTE", "60"))
+SHEETS_WRITE_REQUESTS_PER_MINUTE = int(os.getenv("SHEETS_WRITE_REQUESTS_PER_MINUTE", "60"))
+SHEETS_RETRY_DEADLINE_SECONDS = int(os.getenv("SHEETS_RETRY_DEADLINE_SECONDS", "60"))
 
 # Google Service Account настройки (для Railway)
 # Эти переменные нужно настроить в Railway Dashboard
@@ -30,7 +48,52 @@ CHECK_TIMES = [
     "08:01", "09:01", "10:01", "11:01", "12:01", "13:01", "14:01", 
     "15:01", "16:01", "17:01", "18:01", "19:01", "20:01", "21:01", "22:01"
 ]
-CHECK_INTERVAL_MINUTES = 2  # Интервал проверки каждые 2 минуты
+CHECK_INTERVAL_MINUTES = 2  # НЕ ИСПОЛЬЗУЕТСЯ - теперь проверки идут по времени постов (см. SCHEDULER_RESYNC_MINUTES)
+# Публикация идет точно по времени постов, а таблица перечитывается реже - раз в N минут
+SCHEDULER_RESYNC_MINUTES = int(os.getenv("SCHEDULER_RESYNC_MINUTES", "10"))
+# Минимальный интервал между отправками в один чат (Telegram: не чаще ~1 сообщения в секунду)
+TELEGRAM_CHAT_MIN_INTERVAL_SECONDS = float(os.getenv("TELEGRAM_CHAT_MIN_INTERVAL_SECONDS", "1"))
+# Лимиты Bot API для общей очереди отправки: сообщений в секунду на бота и в минуту на чат
+TELEGRAM_GLOBAL_MESSAGES_PER_SECOND = float(os.getenv("TELEGRAM_GLOBAL_MESSAGES_PER_SECOND", "30"))
+TELEGRAM_CHAT_MESSAGES_PER_MINUTE = int(os.getenv("TELEGRAM_CHAT_MESSAGES_PER_MINUTE", "20"))
+# Сколько раз пробовать отправить пост в один канал (с экспоненциальной паузой между попытками)
+TELEGRAM_SEND_MAX_ATTEMPTS = int(os.getenv("TELEGRAM_SEND_MAX_ATTEMPTS", "3"))
+# Таймаут одного запроса к Bot API и размер пула соединений общей HTTP-сессии бота
+TELEGRAM_REQUEST_TIMEOUT_SECONDS = int(os.getenv("TELEGRAM_REQUEST_TIMEOUT_SECONDS", "60"))
+TELEGRAM_CONNECTION_LIMIT = int(os.getenv("TELEGRAM_CONNECTION_LIMIT", "50"))
+# Способ передачи форматирования: "entities" - чистый текст + MessageEntity, "parse_mode" - Telegram HTML.
+# В обоих случаях пост отправляется по заранее составленному плану (send_planner), без запасных попыток
+TELEGRAM_FORMAT_MODE = os.getenv("TELEGRAM_FORMAT_MODE", "entities")
+# Предзагрузка изображений постов и кэш file_id Telegram (SQLite).
+# Изображения постов, до которых осталось меньше MEDIA_PREFETCH_LEAD_MINUTES, скачиваются и проверяются заранее
+# (должно быть больше SCHEDULER_RESYNC_MINUTES, чтобы каждый пост попал хотя бы в одну синхронизацию)
+MEDIA_CACHE_PATH = os.getenv("MEDIA_CACHE_PATH", "media_cache.db")
+MEDIA_PREFETCH_LEAD_MINUTES = int(os.getenv("MEDIA_PREFETCH_LEAD_MINUTES", "15"))
+MEDIA_DOWNLOAD_TIMEOUT_SECONDS = int(os.getenv("MEDIA_DOWNLOAD_TIMEOUT_SECONDS", "20"))
+# Кэш готовых к отправке текстов постов (SQLite): рендер при чтении таблицы и после генерации, а не при публикации
+RENDER_CACHE_PATH = os.getenv("RENDER_CACHE_PATH", "render_cache.db")
+# Журнал публикаций (SQLite) - защита от повторной публикации после падения/перезапуска.
+# На Railway путь должен указывать на подключенный volume, иначе журнал не переживет редеплой
+PUBLISH_OUTBOX_PATH = os.getenv("PUBLISH_OUTBOX_PATH", "publish_outbox.db")
+
+# Выбор ведущего экземпляра: расписание и обработчик команд работают только у ведущей реплики.
+# file - блокировка файла (только реплики на одном хосте), sqlite - аренда в SQLite на общем томе, none - выключено.
+# По умолчанию sqlite, если задан LEADER_LEASE_PATH (путь на общем томе), иначе file
+LEADER_LOCK_PATH = os.getenv("LEADER_LOCK_PATH", "telegram_automation.lock")
+LEADER_LEASE_PATH = os.getenv("LEADER_LEASE_PATH", "leader_lease.db")
+LEADER_ELECTION_BACKEND = os.getenv("LEADER_ELECTION_BACKEND", "sqlite" if os.getenv("LEADER_LEASE_PATH") else "file")
+# Реплика Railway (переменную задает платформа): реплики работают на разных хостах
+RAILWAY_REPLICA_ID = os.getenv("RAILWAY_REPLICA_ID", "")
+LEADER_LEASE_NAME = os.getenv("LEADER_LEASE_NAME", "scheduler")
+LEADER_LEASE_TTL_SECONDS = float(os.getenv("LEADER_LEASE_TTL_SECONDS", "15"))  # Переключение при падении ведущего
+
+# Догоняющая публикация после простоя: off - все сразу (по умолчанию, как раньше), spread - растянуть на окно,
+# latest - только последние N, skip - пропустить старше порога
+CATCHUP_MODE = os.getenv("CATCHUP_MODE", "off")
+CATCHUP_GRACE_MINUTES = int(os.getenv("CATCHUP_GRACE_MINUTES", "15"))  # Опоздание, которое не считается простоем
+CATCHUP_WINDOW_MINUTES = int(os.getenv("CATCHUP_WINDOW_MINUTES", "60"))  # Окно для режима spread
+CATCHUP_KEEP_LATEST = int(os.getenv("CATCHUP_KEEP_LATEST", "3"))  # Сколько постов оставить в режиме latest
+CATCHUP_MAX_AGE_HOURS = float(os.getenv("CATCHUP_MAX_AGE_HOURS", "6"))  # Порог для режима skip
 LOOKBACK_MINUTES = 5  # НЕ ИСПОЛЬЗУЕТСЯ - теперь публикуем все посты до текущего времени
 
 # Настройки для обработки изображений
@@ -44,6 +107,8 @@ SUPPORTED_IMAGE_FORMATS = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
 STATUS_PENDING = "Ожидает"
 STATUS_PUBLISHED = "Опубликовано"
 STATUS_ERROR = "Ошибка"
+STATUS_PARTIAL = "Частично опубликовано"  # Часть сообщений поста в канале; повтор строки продолжит с места ошибки
+STATUS_SKIPPED = "Пропущено"  # Просроченный пост пропущен политикой догоняющей публикации
 
 # Названия колонок в Google Sheets
 COLUMNS = {
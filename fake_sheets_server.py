@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Локальная замена Google Sheets API v4 для офлайн-тестов и бенчмарков
+
+Поддерживает values.get / update / append / clear / batchGet / batchUpdate
+и spreadsheets.get. Позволяет задать задержку ответа, долю ошибок квоты
+(429), поминутную квоту и размер таблицы.
+
+Чтобы направить клиентов на сервер, задайте переменную окружения:
+    GOOGLE_SHEETS_API_BASE_URL=http://127.0.0.1:8085/
+"""
+import argparse
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque, Counter
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse, unquote, parse_qs
+
+logger = logging.getLogger(__name__)
+
+HEADERS = ['Дата', 'Время', 'Пост', 'Промпт RU', 'Промпт EN', 'Изображение', 'Статус', 'Каналы', 'Статус по каналам']
+
+_A1_RE = re.compile(r'^(?:(?P<sheet>\'[^\']+\'|[^!]+)!)?(?P<c1>[A-Z]*)(?P<r1>\d*)(?::(?P<c2>[A-Z]*)(?P<r2>\d*))?$')
+
+
+def _column_index(letters: str) -> int:
+    """Номер колонки (0 для A) по буквенному обозначению"""
+    index = 0
+    for char in letters:
+        index = index * 26 + (ord(char) - ord('A') + 1)
+    return index - 1
+
+
+def _column_letters(index: int) -> str:
+    """Буквенное обозначение колонки по номеру (0 для A)"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+class FakeSpreadsheet:
+    """Данные таблицы в памяти: {имя листа: список строк}, строка 1 - заголовки"""
+
+    def __init__(self, sheet_name: str = 'Sheet1'):
+        self.sheet_name = sheet_name
+        self.sheets = {sheet_name: [list(HEADERS)]}
+        self.lock = threading.Lock()
+
+    def populate(self, rows: int, pending: int = 10, text_length: int = 1500, start: datetime = None):
+        """Заполняет лист rows постами: последние pending - в статусе 'Ожидает', остальные опубликованы"""
+        start = start or datetime.now() - timedelta(hours=rows)
+        body = ('Текст поста для проверки нагрузки. ' * (text_length // 34 + 1))[:text_length]
+        data = [list(HEADERS)]
+        for i in range(rows):
+            post_time = start + timedelta(hours=i)
+            status = 'Ожидает' if i >= rows - pending else 'Опубликовано'
+            image = 'https://picsum.photos/800/600?random=1' if i % 3 == 1 else ''
+            data.append([
+                post_time.strftime('%d.%m.%y'), post_time.strftime('%H:%M'),
+                f"**Пост {i + 2}**\n{body}", '', '', image, status
+            ])
+        with self.lock:
+            self.sheets[self.sheet_name] = data
+
+    def parse_range(self, a1_range: str) -> Tuple[str, int, Optional[int], int, Optional[int]]:
+        """Разбирает A1-диапазон: (лист, первая строка, последняя строка, первая колонка, последняя колонка)"""
+        match = _A1_RE.match(a1_range)
+        if not match:
+            raise ValueError(f"Unable to parse range: {a1_range}")
+        sheet = (match.group('sheet') or self.sheet_name).strip("'")
+        if sheet not in self.sheets:
+            raise ValueError(f"Unable to parse range: {a1_range}")
+        c1, r1, c2, r2 = match.group('c1'), match.group('r1'), match.group('c2'), match.group('r2')
+        is_single = match.group(0).find(':') == -1
+        first_row = int(r1) if r1 else 1
+        first_col = _column_index(c1) if c1 else 0
+        if is_single:
+            last_row = first_row if r1 else None
+            last_col = first_col if c1 else None
+        else:
+            last_row = int(r2) if r2 else None
+            last_col = _column_index(c2) if c2 else None
+        return sheet, first_row, last_row, first_col, last_col
+
+    @staticmethod
+    def _format_range(sheet: str, first_row: int, last_row: int, first_col: int, last_col: int) -> str:
+        """Формирует A1-диапазон ответа (одна ячейка - без двоеточия, как в Google)"""
+        if first_row == last_row and first_col == last_col:
+            return f"{sheet}!{_column_letters(first_col)}{first_row}"
+        return f"{sheet}!{_column_letters(first_col)}{first_row}:{_column_letters(last_col)}{last_row}"
+
+    def get(self, a1_range: str) -> dict:
+        sheet, first_row, last_row, first_col, last_col = self.parse_range(a1_range)
+        with self.lock:
+            data = self.sheets[sheet]
+            last_row = min(last_row or len(data), len(data))
+            end_col = (last_col + 1) if last_col is not None else None
+            values = []
+            for row in data[first_row - 1:last_row]:
+                cells = row[first_col:end_col]
+                while cells and cells[-1] == '':
+                    cells = cells[:-1]
+                values.append(list(cells))
+        while values and not values[-1]:
+            values.pop()
+        result = {
+            'range': self._format_range(sheet, first_row, max(last_row, first_row), first_col,
+                                        last_col if last_col is not None else len(HEADERS) - 1),
+            'majorDimension': 'ROWS'
+        }
+        if values:
+            result['values'] = values
+        return result
+
+    def _write(self, sheet: str, first_row: int, first_col: int, values: List[List[str]]) -> dict:
+        data = self.sheets[sheet]
+        for offset, row_values in enumerate(values):
+            row_index = first_row - 1 + offset
+            while len(data) <= row_index:
+                data.append([])
+            row = data[row_index]
+            needed = first_col + len(row_values)
+            if len(row) < needed:
+                row.extend([''] * (needed - len(row)))
+            for col_offset, value in enumerate(row_values):
+                row[first_col + col_offset] = '' if value is None else str(value)
+        width = max((len(row_values) for row_values in values), default=0)
+        last_row = first_row + len(values) - 1
+        return {
+            'updatedRange': self._format_range(sheet, first_row, last_row, first_col, first_col + max(width, 1) - 1),
+            'updatedRows': len(values),
+            'updatedColumns': width,
+            'updatedCells': sum(len(row_values) for row_values in values)
+        }
+
+    def update(self, a1_range: str, values: List[List[str]]) -> dict:
+        sheet, first_row, _, first_col, _ = self.parse_range(a1_range)
+        with self.lock:
+            return self._write(sheet, first_row, first_col, values)
+
+    def append(self, a1_range: str, values: List[List[str]]) -> dict:
+        sheet, _, _, first_col, _ = self.parse_range(a1_range)
+        with self.lock:
+            data = self.sheets[sheet]
+            last_filled = max((i for i, row in enumerate(data) if any(row)), default=-1)
+            updates = self._write(sheet, last_filled + 2, first_col, values)
+        return {'tableRange': a1_range, 'updates': updates}
+
+    def clear(self, a1_range: str) -> dict:
+        sheet, first_row, last_row, first_col, last_col = self.parse_range(a1_range)
+        with self.lock:
+            data = self.sheets[sheet]
+            for row in data[first_row - 1:last_row or len(data)]:
+                end_col = (last_col + 1) if last_col is not None else len(row)
+                for col in range(first_col, min(end_col, len(row))):
+                    row[col] = ''
+        return {'clearedRange': a1_range}
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        """Не засоряем вывод разрывами keep-alive соединений клиентом"""
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeSheetsServer:
+    """HTTP-сервер, имитирующий Google Sheets API v4 на localhost"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, sheet_name: str = 'Sheet1',
+                 latency: float = 0.0, error_rate: float = 0.0, error_status: int = 429,
+                 quota_per_minute: int = 0):
+        self.spreadsheet = FakeSpreadsheet(sheet_name)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.quota_per_minute = quota_per_minute
+
+        # Статистика запросов для бенчмарков
+        self.requests = Counter()
+        self.bytes_sent = 0
+        self._recent = deque()
+        self._stats_lock = threading.Lock()
+
+        self._httpd = _HTTPServer((host, port), self._make_handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> 'FakeSheetsServer':
+        """Запускает сервер в фоновом потоке"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Фейковый Google Sheets API запущен: {self.url}")
+        return self
+
+    def stop(self):
+        """Останавливает сервер"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.requests.clear()
+            self.bytes_sent = 0
+
+    def _over_quota(self) -> bool:
+        """Проверяет поминутную квоту (скользящее окно 60 сек)"""
+        if not self.quota_per_minute:
+            return False
+        now = time.monotonic()
+        with self._stats_lock:
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            if len(self._recent) >= self.quota_per_minute:
+                return True
+            self._recent.append(now)
+        return False
+
+    def _dispatch(self, method: str, path: str, query: dict, body: dict) -> Tuple[int, dict, str]:
+        """Выполняет запрос, возвращает (HTTP-статус, ответ, имя операции)"""
+        match = re.match(r'^/v4/spreadsheets/([^/:]+)(.*)$', path)
+        if not match:
+            return 404, {'error': {'code': 404, 'message': 'Not found', 'status': 'NOT_FOUND'}}, 'unknown'
+        spreadsheet_id, rest = match.group(1), match.group(2)
+        sheet = self.spreadsheet
+
+        if rest == '' and method == 'GET':
+            sheets = [{'properties': {'sheetId': i, 'title': title, 'index': i}}
+                      for i, title in enumerate(sheet.sheets)]
+            return 200, {'spreadsheetId': spreadsheet_id, 'sheets': sheets}, 'spreadsheets.get'
+        if rest == '/values:batchGet' and method == 'GET':
+            value_ranges = [sheet.get(a1_range) for a1_range in query.get('ranges', [])]
+            return 200, {'spreadsheetId': spreadsheet_id, 'valueRanges': value_ranges}, 'values.batchGet'
+        if rest == '/values:batchUpdate' and method == 'POST':
+            responses = [dict(sheet.update(item['range'], item.get('values', [])), spreadsheetId=spreadsheet_id)
+                         for item in body.get('data', [])]
+            return 200, {'spreadsheetId': spreadsheet_id, 'responses': responses,
+                         'totalUpdatedCells': sum(r['updatedCells'] for r in responses)}, 'values.batchUpdate'
+
+        # Диапазон может прийти как закодированным (%21, %3A), так и нет
+        match = re.match(r'^/values/(.+?)(:append|:clear)?$', rest)
+        if match:
+            a1_range, action = unquote(match.group(1)), match.group(2)
+            if action == ':append' and method == 'POST':
+                return 200, sheet.append(a1_range, body.get('values', [])), 'values.append'
+            if action == ':clear' and method == 'POST':
+                return 200, sheet.clear(a1_range), 'values.clear'
+            if action is None and method == 'PUT':
+                return 200, sheet.update(a1_range, body.get('values', [])), 'values.update'
+            if action is None and method == 'GET':
+                return 200, sheet.get(a1_range), 'values.get'
+
+        return 404, {'error': {'code': 404, 'message': 'Not found', 'status': 'NOT_FOUND'}}, 'unknown'
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def _handle(self, method: str):
+                parsed = urlparse(self.path)
+                query = parse_qs(parsed.query)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}') if length else {}
+
+                if server.latency:
+                    time.sleep(server.latency)
+
+                if server._over_quota() or (server.error_rate and random.random() < server.error_rate):
+                    status = server.error_status
+                    payload = {'error': {'code': status, 'message': 'Quota exceeded (fake)',
+                                         'status': 'RESOURCE_EXHAUSTED' if status == 429 else 'UNAVAILABLE'}}
+                    operation = 'error'
+                else:
+                    try:
+                        status, payload, operation = server._dispatch(method, parsed.path, query, body)
+                    except ValueError as e:
+                        status, operation = 400, 'error'
+                        payload = {'error': {'code': 400, 'message': str(e), 'status': 'INVALID_ARGUMENT'}}
+
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                with server._stats_lock:
+                    server.requests[operation] += 1
+                    server.bytes_sent += len(data)
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_PUT(self):
+                self._handle('PUT')
+
+            def do_POST(self):
+                self._handle('POST')
+
+        return Handler
+
+
+def main():
+    """Запуск фейкового сервера из командной строки"""
+    parser = argparse.ArgumentParser(description='Локальная замена Google Sheets API v4')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8085)
+    parser.add_argument('--rows', type=int, default=0, help='Количество постов в таблице')
+    parser.add_argument('--pending', type=int, default=10, help='Сколько последних постов в статусе "Ожидает"')
+    parser.add_argument('--text-length', type=int, default=1500, help='Длина текста поста')
+    parser.add_argument('--latency', type=float, default=0.0, help='Задержка ответа, сек')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов с ошибкой')
+    parser.add_argument('--error-status', type=int, default=429, help='HTTP-статус ошибки')
+    parser.add_argument('--quota', type=int, default=0, help='Квота запросов в минуту (0 - без квоты)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    server = FakeSheetsServer(args.host, args.port, latency=args.latency, error_rate=args.error_rate,
+                              error_status=args.error_status, quota_per_minute=args.quota)
+    if args.rows:
+        server.spreadsheet.populate(args.rows, pending=args.pending, text_length=args.text_length)
+    server.start()
+    logger.info(f"Для клиентов: GOOGLE_SHEETS_API_BASE_URL={server.url}")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
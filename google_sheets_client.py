@@ -2,132 +2,409 @@
 Клиент для работы с Google Sheets API
 """
 import os
+import re
+import json
+import atexit
 import logging
-from typing import List, Dict, Any, Optional
+import hashlib
+import threading
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+import httplib2
+import google_auth_httplib2
 from googleapiclient.discovery import build
 from google.oauth2 import service_account
+from google.auth.credentials import AnonymousCredentials
 from googleapiclient.errors import HttpError
-from config import GOOGLE_SHEET_ID, GOOGLE_SHEET_NAME, STATUS_PUBLISHED, STATUS_PENDING
+from post_record import Post, SHEET_HEADERS
+from rate_limiter import TokenBucket, backoff_delay
+from config import (
+    GOOGLE_SHEET_ID, GOOGLE_SHEET_NAME, GOOGLE_SHEETS_API_BASE_URL, STATUS_PUBLISHED, STATUS_PENDING, STATUS_SKIPPED,
+    SHEETS_INCREMENTAL_READS, SHEETS_FULL_RESYNC_MINUTES, SHEETS_SPARSE_READS,
+    SHEETS_CHANGE_PROBE, SHEETS_PROBE_MAX_SKIPS,
+    SHEETS_READ_REQUESTS_PER_MINUTE, SHEETS_WRITE_REQUESTS_PER_MINUTE, SHEETS_RETRY_DEADLINE_SECONDS
+)
 
 logger = logging.getLogger(__name__)
 
-class GoogleSheetsClient:
-    """Клиент для работы с Google Sheets API"""
+# Первая строка с данными (строка 1 - заголовки)
+FIRST_DATA_ROW = 2
+
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+
+# HTTP-статусы, при которых запрос имеет смысл повторить
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class SheetsUnavailableError(Exception):
+    """Таблица временно недоступна (квота, 5xx или сеть) - повторы не помогли до дедлайна"""
+
+
+def create_service_account_credentials(scopes: List[str] = SCOPES) -> service_account.Credentials:
+    """Создает Service Account credentials из переменных окружения"""
+    service_account_info = {
+        "type": "service_account",
+        "project_id": os.getenv("GOOGLE_PROJECT_ID", "YOUR_GOOGLE_PROJECT_ID"),
+        "private_key_id": os.getenv("GOOGLE_PRIVATE_KEY_ID", "YOUR_PRIVATE_KEY_ID"),
+        "private_key": os.getenv("GOOGLE_PRIVATE_KEY", "YOUR_PRIVATE_KEY").replace('\\n', '\n'),
+        "client_email": os.getenv("GOOGLE_CLIENT_EMAIL", "YOUR_CLIENT_EMAIL"),
+        "client_id": os.getenv("GOOGLE_CLIENT_ID", "YOUR_GOOGLE_CLIENT_ID"),
+        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+        "token_uri": "https://oauth2.googleapis.com/token",
+        "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
+        "client_x509_cert_url": os.getenv("GOOGLE_CLIENT_X509_CERT_URL", "YOUR_CLIENT_X509_CERT_URL")
+    }
+    return service_account.Credentials.from_service_account_info(service_account_info, scopes=scopes)
+
+
+class SheetsServiceRegistry:
+    """
+    Общий для процесса реестр Sheets API.
+    Сервис строится один раз из встроенного (статического) discovery-документа,
+    credentials и access token переиспользуются всеми клиентами, а имя листа
+    определяется один раз. Для потокобезопасности каждый поток выполняет
+    запросы через собственный AuthorizedHttp (httplib2 не потокобезопасен).
+    """
     
     def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._initialized = False
+        self.credentials = None
         self.service = None
-        self.SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
-        self._authenticate()
+        self.sheet_name: Optional[str] = None
+        self.anonymous = False
         
-        # Кэш для имени листа
-        self._sheet_name = None
+        # Общие для процесса лимиты под поминутные квоты Sheets API
+        self.read_limiter = TokenBucket.per_minute(SHEETS_READ_REQUESTS_PER_MINUTE, name="sheets-read")
+        self.write_limiter = TokenBucket.per_minute(SHEETS_WRITE_REQUESTS_PER_MINUTE, name="sheets-write")
     
-    def _authenticate(self):
-        """Аутентификация в Google Sheets API через Service Account"""
+    def _initialize(self):
+        """Создает credentials и сервис (вызывается под блокировкой)"""
+        self._initialized = True
         try:
-            # Получаем Service Account credentials из переменных окружения
-            service_account_info = {
-                "type": "service_account",
-                "project_id": os.getenv("GOOGLE_PROJECT_ID", "YOUR_GOOGLE_PROJECT_ID"),
-                "private_key_id": os.getenv("GOOGLE_PRIVATE_KEY_ID", "YOUR_PRIVATE_KEY_ID"),
-                "private_key": os.getenv("GOOGLE_PRIVATE_KEY", "YOUR_PRIVATE_KEY").replace('\\n', '\n'),
-                "client_email": os.getenv("GOOGLE_CLIENT_EMAIL", "YOUR_CLIENT_EMAIL"),
-                "client_id": os.getenv("GOOGLE_CLIENT_ID", "YOUR_GOOGLE_CLIENT_ID"),
-                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
-                "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
-                "client_x509_cert_url": os.getenv("GOOGLE_CLIENT_X509_CERT_URL", "YOUR_CLIENT_X509_CERT_URL")
-            }
-            
-            # Создаем credentials из Service Account
-            credentials = service_account.Credentials.from_service_account_info(
-                service_account_info, scopes=self.SCOPES
+            if GOOGLE_SHEETS_API_BASE_URL:
+                # Локальная замена API (fake_sheets_server.py) - без авторизации
+                self.anonymous = True
+                self.credentials = AnonymousCredentials()
+                self.service = build(
+                    'sheets', 'v4',
+                    credentials=self.credentials,
+                    static_discovery=True,
+                    cache_discovery=False,
+                    client_options={'api_endpoint': GOOGLE_SHEETS_API_BASE_URL.rstrip('/') + '/'}
+                )
+                logger.info(f"Google Sheets API направлен на {GOOGLE_SHEETS_API_BASE_URL}")
+                return
+            
+            self.credentials = create_service_account_credentials(SCOPES)
+            self.service = build(
+                'sheets', 'v4',
+                credentials=self.credentials,
+                static_discovery=True,
+                cache_discovery=False
             )
-            
-            # Создаем сервис
-            self.service = build('sheets', 'v4', credentials=credentials)
             logger.info("Google Sheets API инициализирован успешно через Service Account")
-            
         except Exception as e:
             logger.error(f"Ошибка Service Account аутентификации: {e}")
             logger.warning("Google Sheets API не инициализирован - система будет работать без него")
+            self.credentials = None
             self.service = None
+    
+    def get_service(self):
+        """Возвращает общий сервис Sheets API (или None, если аутентификация не удалась)"""
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    self._initialize()
+        return self.service
+    
+    def get_credentials(self):
+        """Возвращает общие credentials"""
+        self.get_service()
+        return self.credentials
+    
+    def http(self) -> google_auth_httplib2.AuthorizedHttp:
+        """Возвращает HTTP-транспорт текущего потока с общими credentials"""
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=30))
+            self._local.http = http
+        return http
+
+
+_service_registry = SheetsServiceRegistry()
+
+
+def get_service_registry() -> SheetsServiceRegistry:
+    """Возвращает общий для процесса реестр Sheets API"""
+    return _service_registry
+
+
+class SheetSnapshot:
+    """
+    Снимок строк таблицы в памяти для инкрементального чтения.
+    Хранит хэши содержимого строк начиная с "водяной отметки" - первой
+    строки, статус которой не "Опубликовано". Все строки выше отметки
+    считаются окончательными и повторно не читаются. Строка прямо над
+    отметкой служит якорем: если ее дата, время или статус изменились,
+    выше отметки удалили или вставили строки и номера строк снимка сдвинулись.
+    """
+    
+    def __init__(self):
+        self.watermark = FIRST_DATA_ROW
+        self.row_hashes: Dict[int, str] = {}
+        self.posts: Dict[int, Post] = {}
+        self.anchor: Optional[Tuple[str, str, str]] = None
+    
+    @staticmethod
+    def _hash_row(row: List[str]) -> str:
+        """Считает хэш содержимого строки"""
+        return hashlib.sha1('\x1f'.join(row).encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def anchor_key(row: List[str]) -> Tuple[str, str, str]:
+        """Дата, время и статус строки - по ним узнаем якорь после повторного чтения"""
+        row = list(row) + [''] * (7 - len(row))
+        return row[0], row[1], row[6]
+    
+    def reset(self):
+        """Сбрасывает снимок (следующее чтение будет полным)"""
+        self.watermark = FIRST_DATA_ROW
+        self.row_hashes.clear()
+        self.posts.clear()
+        self.anchor = None
+    
+    def shifted(self, anchor_row: List[str]) -> bool:
+        """Сдвинулись ли строки выше отметки (anchor_row - свежее чтение строки watermark - 1)"""
+        if self.watermark <= FIRST_DATA_ROW or self.anchor is None:
+            return False
+        return self.anchor_key(anchor_row) != self.anchor
+    
+    def apply(self, start_row: int, values: List[List[str]]) -> Dict[str, List[int]]:
+        """
+        Применяет свежее окно строк (начиная со start_row) к снимку.
+        Возвращает номера добавленных, измененных и удаленных строк.
+        """
+        added, changed, removed = [], [], []
+        seen = set()
+        
+        for row_index, row in enumerate(values, start=start_row):
+            if not row:
+                continue
+            seen.add(row_index)
+            row_hash = self._hash_row(row)
+            old_hash = self.row_hashes.get(row_index)
+            if old_hash == row_hash:
+                continue
+            if old_hash is None:
+                added.append(row_index)
+            else:
+                changed.append(row_index)
+            self.row_hashes[row_index] = row_hash
+            self.posts[row_index] = Post.from_row(row, row_index)
+        
+        # Строки окна, которых больше нет в таблице
+        for row_index in [i for i in self.row_hashes if i >= start_row and i not in seen]:
+            removed.append(row_index)
+            del self.row_hashes[row_index]
+            self.posts.pop(row_index, None)
         
-        # Кэш для имени листа
-        self._sheet_name = None
+        # Сдвигаем отметку до первой неопубликованной строки
+        last_row = start_row + len(values)
+        watermark = last_row
+        for row_index in range(start_row, last_row):
+            post = self.posts.get(row_index)
+            if post and post.status not in (STATUS_PUBLISHED, STATUS_SKIPPED):
+                watermark = row_index
+                break
+        self.watermark = max(watermark, FIRST_DATA_ROW)
+        if self.watermark == FIRST_DATA_ROW:
+            self.anchor = None
+        elif self.watermark > start_row:
+            self.anchor = self.anchor_key(values[self.watermark - 1 - start_row])
+        
+        # Строки выше отметки больше не отслеживаем
+        for row_index in [i for i in self.row_hashes if i < self.watermark]:
+            del self.row_hashes[row_index]
+            self.posts.pop(row_index, None)
+        
+        return {'added': added, 'changed': changed, 'removed': removed}
+
+
+class GoogleSheetsClient:
+    """Клиент для работы с Google Sheets API"""
+    
+    def __init__(self):
+        self.service = None
+        self.SCOPES = SCOPES
+        self._authenticate()
+        
+        # Снимок для инкрементального чтения
+        self._snapshot = SheetSnapshot()
+        self._last_full_sync = time.monotonic()
+        
+        # Буфер обновлений статусов (сбрасывается одним batchUpdate)
+        self._status_buffer: Dict[int, Tuple[str, Optional[str], Optional[str]]] = {}
+        self._status_buffer_lock = threading.Lock()
+        atexit.register(self.close)
+        
+        # Дешевая проверка изменений перед полным чтением
+        self._probe_hash: Optional[str] = None
+        self._last_pending: Optional[List[Post]] = None
+        self._skips_since_read = 0
+        self.read_stats = {'performed': 0, 'skipped': 0}
+    
+    def _authenticate(self):
+        """Аутентификация в Google Sheets API (общий сервис из реестра процесса)"""
+        self._registry = get_service_registry()
+        self.service = self._registry.get_service()
+    
+    def _execute(self, request, idempotent: bool = True):
+        """
+        Выполняет запрос через HTTP-транспорт текущего потока.
+        Перед запросом ждет токен общего лимитера (чтение/запись), при 429/5xx
+        и сетевых ошибках повторяет с экспоненциальной задержкой до дедлайна,
+        после чего выбрасывает SheetsUnavailableError.
+        Неидемпотентный запрос (append) повторяется только после 429: при 5xx
+        и сетевой ошибке он мог быть выполнен, и повтор записал бы строки дважды.
+        """
+        is_write = request.method != 'GET'
+        limiter = self._registry.write_limiter if is_write else self._registry.read_limiter
+        deadline = time.monotonic() + SHEETS_RETRY_DEADLINE_SECONDS
+        attempt = 0
+        
+        while True:
+            limiter.acquire()
+            try:
+                return request.execute(http=self._registry.http())
+            except HttpError as e:
+                if e.resp.status not in RETRYABLE_STATUSES:
+                    raise
+                error = e
+                reason = f"HTTP {e.resp.status}"
+                rejected = e.resp.status == 429
+            except (OSError, httplib2.HttpLib2Error) as e:
+                error = e
+                reason = type(e).__name__
+                rejected = False
+            
+            if not idempotent and not rejected:
+                logger.error(f"Google Sheets ответила {reason} на запись, которую нельзя повторять - она могла быть выполнена")
+                raise SheetsUnavailableError(f"Google Sheets не подтвердила запись ({reason}), проверьте таблицу") from error
+            
+            delay = backoff_delay(attempt)
+            if time.monotonic() + delay > deadline:
+                logger.error(f"Google Sheets недоступна ({reason}), повторы исчерпаны за {SHEETS_RETRY_DEADLINE_SECONDS} сек")
+                raise SheetsUnavailableError(f"Google Sheets временно недоступна: {reason}") from error
+            
+            attempt += 1
+            logger.warning(f"Google Sheets ответила {reason}, повтор #{attempt} через {delay:.1f} сек")
+            time.sleep(delay)
     
     def get_sheet_name(self) -> str:
         """Получает имя первого доступного листа"""
         if not self.service:
             return GOOGLE_SHEET_NAME
         
-        if self._sheet_name:
-            return self._sheet_name
+        if self._registry.sheet_name:
+            return self._registry.sheet_name
         
         try:
-            # Получаем информацию о таблице
-            result = self.service.spreadsheets().get(spreadsheetId=GOOGLE_SHEET_ID).execute()
+            # Получаем информацию о таблице (только названия листов)
+            result = self._execute(self.service.spreadsheets().get(
+                spreadsheetId=GOOGLE_SHEET_ID,
+                fields='sheets.properties.title'
+            ))
             sheets = result.get('sheets', [])
             
             if sheets:
                 # Берем первый лист
                 first_sheet = sheets[0].get('properties', {}).get('title', GOOGLE_SHEET_NAME)
-                self._sheet_name = first_sheet
+                self._registry.sheet_name = first_sheet
                 logger.info(f"📋 Используем лист: '{first_sheet}'")
                 return first_sheet
             else:
                 logger.warning("⚠️ В таблице нет листов, используем значение по умолчанию")
                 return GOOGLE_SHEET_NAME
                 
+        except SheetsUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"❌ Ошибка получения имени листа: {e}")
             logger.info(f"📋 Используем значение по умолчанию: '{GOOGLE_SHEET_NAME}'")
             return GOOGLE_SHEET_NAME
     
+    @staticmethod
+    def _post_to_row(post_data: Dict[str, Any]) -> List[str]:
+        """Подготавливает данные поста для записи (правильный порядок колонок)"""
+        return [
+            post_data.get('date', ''),
+            post_data.get('time', ''),
+            post_data.get('text', ''),
+            post_data.get('prompt_ru', ''),
+            post_data.get('prompt_en', ''),
+            post_data.get('image_urls', ''),
+            STATUS_PUBLISHED
+        ]
+    
+    @staticmethod
+    def _rows_from_range(a1_range: str) -> List[int]:
+        """Возвращает номера строк из диапазона вида 'Sheet1!A10:G18'"""
+        match = re.search(r'!?[A-Z]*(\d+)(?::[A-Z]*(\d+))?$', a1_range or '')
+        if not match:
+            return []
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        return list(range(first, last + 1))
+    
     def add_post(self, post_data: Dict[str, Any]) -> bool:
         """Добавляет пост в Google Sheets"""
+        return self.add_posts([post_data]) is not None
+    
+    def add_posts(self, posts: List[Dict[str, Any]]) -> Optional[List[int]]:
+        """
+        Добавляет несколько постов в Google Sheets одним запросом append.
+        Запись атомарна: либо добавлены все строки, либо ни одной.
+        Возвращает номера добавленных строк или None при ошибке.
+        """
         if not self.service:
-            logger.warning("Google Sheets API не инициализирован, пропускаем добавление поста")
-            return True
+            logger.warning("Google Sheets API не инициализирован, пропускаем добавление постов")
+            return []
+        
+        if not posts:
+            return []
             
         try:
-            # Подготавливаем данные для записи (правильный порядок колонок)
-            values = [
-                [
-                    post_data.get('date', ''),
-                    post_data.get('time', ''),
-                    post_data.get('text', ''),
-                    post_data.get('prompt_ru', ''),
-                    post_data.get('prompt_en', ''),
-                    post_data.get('image_urls', ''),
-                    STATUS_PUBLISHED
-                ]
-            ]
+            values = [self._post_to_row(post_data) for post_data in posts]
             
             # Получаем имя листа
             sheet_name = self.get_sheet_name()
             
-            # Добавляем строку в конец таблицы
+            # Добавляем все строки в конец таблицы одним запросом
             body = {'values': values}
-            result = self.service.spreadsheets().values().append(
+            result = self._execute(self.service.spreadsheets().values().append(
                 spreadsheetId=GOOGLE_SHEET_ID,
                 range=f'{sheet_name}!A:G',
                 valueInputOption='RAW',
                 insertDataOption='INSERT_ROWS',
                 body=body
-            ).execute()
+            ), idempotent=False)
             
-            logger.info(f"Пост добавлен в Google Sheets: {result.get('updates', {}).get('updatedRows', 0)} строк")
-            return True
+            updates = result.get('updates', {})
+            row_indices = self._rows_from_range(updates.get('updatedRange', ''))
+            logger.info(f"Добавлено {updates.get('updatedRows', 0)} строк в Google Sheets: {row_indices}")
+            return row_indices
             
         except HttpError as e:
             logger.error(f"Ошибка Google Sheets API: {e}")
-            return False
+            return None
         except Exception as e:
-            logger.error(f"Ошибка добавления поста: {e}")
-            return False
+            logger.error(f"Ошибка добавления постов: {e}")
+            return None
     
-    def get_posts(self, limit: int = 10) -> List[Dict[str, Any]]:
+    def get_posts(self, limit: int = 10) -> List[Post]:
         """Получает последние посты из Google Sheets"""
         if not self.service:
             logger.warning("Google Sheets API не инициализирован, возвращаем пустой список")
@@ -138,34 +415,29 @@ class GoogleSheetsClient:
             sheet_name = self.get_sheet_name()
             
             # Получаем данные из таблицы
-            result = self.service.spreadsheets().values().get(
+            result = self._execute(self.service.spreadsheets().values().get(
                 spreadsheetId=GOOGLE_SHEET_ID,
-                range=f'{sheet_name}!A:G'
-            ).execute()
+                range=f'{sheet_name}!A:I'
+            ))
             
             values = result.get('values', [])
             if not values:
                 logger.info("Таблица пуста")
                 return []
             
-            # Пропускаем заголовок, берем последние записи
-            posts = []
-            for row in values[1:][-limit:]:  # Пропускаем заголовок, берем последние limit записей
-                if len(row) >= 5:  # Проверяем, что строка содержит основные колонки
-                    post = {
-                        'date': row[0] if len(row) > 0 else '',
-                        'time': row[1] if len(row) > 1 else '',
-                        'text': row[2] if len(row) > 2 else '',
-                        'prompt_ru': row[3] if len(row) > 3 else '',
-                        'prompt_en': row[4] if len(row) > 4 else '',
-                        'image_urls': row[5] if len(row) > 5 else '',
-                        'status': row[6] if len(row) > 6 else ''
-                    }
-                    posts.append(post)
+            # Пропускаем заголовок, берем последние limit записей
+            first_row = max(len(values) - limit, 1)
+            posts = [
+                Post.from_row(row, i)
+                for i, row in enumerate(values[first_row:], start=first_row + 1)
+                if len(row) >= 5  # Проверяем, что строка содержит основные колонки
+            ]
             
             logger.info(f"Получено {len(posts)} постов из Google Sheets")
             return posts
             
+        except SheetsUnavailableError:
+            raise
         except HttpError as e:
             logger.error(f"Ошибка Google Sheets API: {e}")
             return []
@@ -173,51 +445,245 @@ class GoogleSheetsClient:
             logger.error(f"Ошибка получения постов: {e}")
             return []
     
-    def get_pending_posts(self) -> List[Dict[str, Any]]:
-        """Получает посты со статусом 'Ожидает' для публикации"""
+    def _exclude_buffered(self, posts: List[Post]) -> List[Post]:
+        """Исключает посты, новый статус которых еще не записан в таблицу"""
+        with self._status_buffer_lock:
+            if not self._status_buffer:
+                return posts
+            return [post for post in posts if post.row_index not in self._status_buffer]
+    
+    @staticmethod
+    def _merge_row_ranges(row_indices: List[int]) -> List[Tuple[int, int]]:
+        """Объединяет соседние номера строк в непрерывные диапазоны"""
+        ranges = []
+        for row_index in sorted(row_indices):
+            if ranges and row_index == ranges[-1][1] + 1:
+                ranges[-1] = (ranges[-1][0], row_index)
+            else:
+                ranges.append((row_index, row_index))
+        return ranges
+    
+    def _read_window(self, sheet_name: str, start_row: int) -> List[List[str]]:
+        """
+        Читает строки A:I начиная со start_row.
+        В разреженном режиме сначала читаются только колонки даты, времени
+        и статуса (A:B и G), а затем одним values.batchGet - полные строки постов
+        со статусом "Ожидает". Для остальных строк возвращается заглушка
+        с датой, временем и статусом.
+        """
+        if not SHEETS_SPARSE_READS:
+            result = self._execute(self.service.spreadsheets().values().get(
+                spreadsheetId=GOOGLE_SHEET_ID,
+                range=f'{sheet_name}!A{start_row}:I'
+            ))
+            return result.get('values', [])
+        
+        # Фаза 1: только дата, время и статус
+        result = self._execute(self.service.spreadsheets().values().batchGet(
+            spreadsheetId=GOOGLE_SHEET_ID,
+            ranges=[f'{sheet_name}!A{start_row}:B', f'{sheet_name}!G{start_row}:G']
+        ))
+        value_ranges = result.get('valueRanges', [])
+        dates = value_ranges[0].get('values', []) if value_ranges else []
+        statuses = [row[0] if row else '' for row in (value_ranges[1].get('values', []) if len(value_ranges) > 1 else [])]
+        values = []
+        for i, status in enumerate(statuses):
+            date_time = (list(dates[i]) if i < len(dates) else []) + ['', '']
+            values.append(date_time[:2] + [''] * 4 + [status] if status else [])
+        
+        pending_rows = [
+            row_index for row_index, status in enumerate(statuses, start=start_row)
+            if status == STATUS_PENDING
+        ]
+        if not pending_rows:
+            return values
+        
+        # Фаза 2: полные строки только для ожидающих постов
+        row_ranges = self._merge_row_ranges(pending_rows)
+        result = self._execute(self.service.spreadsheets().values().batchGet(
+            spreadsheetId=GOOGLE_SHEET_ID,
+            ranges=[f'{sheet_name}!A{first}:I{last}' for first, last in row_ranges]
+        ))
+        
+        for (first, last), value_range in zip(row_ranges, result.get('valueRanges', [])):
+            for row_index, row in enumerate(value_range.get('values', []), start=first):
+                if row_index <= last:
+                    values[row_index - start_row] = row
+        
+        logger.info(
+            f"Разреженное чтение: {len(statuses)} статусов, "
+            f"{len(pending_rows)} полных строк в {len(row_ranges)} диапазонах"
+        )
+        return values
+    
+    def sync_incremental(self, full: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Инкрементально синхронизирует снимок таблицы.
+        Читает только окно от первой неопубликованной строки до конца листа
+        и возвращает изменения с прошлого цикла (в разреженном режиме для строк
+        не в статусе "Ожидает" отслеживается только статус):
+        {'added': [...], 'changed': [...], 'removed': [...], 'pending': [посты]}
+        При ошибке API возвращает None, при временной недоступности
+        выбрасывает SheetsUnavailableError.
+        """
+        if not self.service:
+            logger.warning("Google Sheets API не инициализирован, пропускаем синхронизацию")
+            return None
+        
+        # Периодически перечитываем таблицу целиком (ловим правки выше отметки)
+        if full or self._full_resync_due():
+            self._snapshot.reset()
+            self._last_full_sync = time.monotonic()
+        
+        try:
+            sheet_name = self.get_sheet_name()
+            start_row = self._snapshot.watermark
+            
+            if start_row > FIRST_DATA_ROW:
+                # Читаем и якорь над отметкой - тем же запросом, что и окно
+                values = self._read_window(sheet_name, start_row - 1)
+                anchor_row, values = (values[0] if values else []), values[1:]
+                if self._snapshot.shifted(anchor_row):
+                    logger.warning(
+                        f"Строки выше отметки {start_row} сдвинулись (удаление или вставка строк), "
+                        f"перечитываем таблицу целиком"
+                    )
+                    self._snapshot.reset()
+                    self._last_full_sync = time.monotonic()
+                    start_row = FIRST_DATA_ROW
+                    values = self._read_window(sheet_name, start_row)
+            else:
+                values = self._read_window(sheet_name, start_row)
+            delta = self._snapshot.apply(start_row, values)
+            
+            delta['pending'] = [
+                post for _, post in sorted(self._snapshot.posts.items())
+                if post.status == STATUS_PENDING
+            ]
+            
+            logger.info(
+                f"Инкрементальное чтение с строки {start_row}: прочитано {len(values)} строк, "
+                f"добавлено {len(delta['added'])}, изменено {len(delta['changed'])}, "
+                f"удалено {len(delta['removed'])}, новая отметка: {self._snapshot.watermark}"
+            )
+            return delta
+            
+        except SheetsUnavailableError:
+            raise
+        except HttpError as e:
+            logger.error(f"Ошибка Google Sheets API: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Ошибка инкрементального чтения таблицы: {e}")
+            return None
+    
+    def _full_resync_due(self) -> bool:
+        """Пора ли перечитать таблицу целиком (по времени, а не по числу чтений)"""
+        return time.monotonic() - self._last_full_sync >= SHEETS_FULL_RESYNC_MINUTES * 60
+    
+    def _probe_signature(self) -> str:
+        """
+        Считает хэш колонок даты, времени и статуса (A:B и G) от якоря над отметкой
+        до конца листа. Это на порядки меньше полного чтения, т.к. не включает тексты постов.
+        """
+        sheet_name = self.get_sheet_name()
+        start_row = max(self._snapshot.watermark - 1, FIRST_DATA_ROW) if SHEETS_INCREMENTAL_READS else FIRST_DATA_ROW
+        result = self._execute(self.service.spreadsheets().values().batchGet(
+            spreadsheetId=GOOGLE_SHEET_ID,
+            ranges=[f'{sheet_name}!A{start_row}:B', f'{sheet_name}!G{start_row}:G']
+        ))
+        payload = [start_row] + [value_range.get('values', []) for value_range in result.get('valueRanges', [])]
+        return hashlib.sha1(json.dumps(payload, ensure_ascii=False).encode('utf-8')).hexdigest()
+    
+    def has_changes(self, current_time: datetime) -> bool:
+        """
+        Решает, нужно ли полное чтение таблицы в этом цикле.
+        Чтение пропускается, если хэш колонок даты/времени/статуса не изменился
+        и ни один из известных ожидающих постов еще не наступил.
+        Счетчики выполненных и пропущенных чтений - в self.read_stats.
+        """
+        if not SHEETS_CHANGE_PROBE or not self.service or self._last_pending is None:
+            return True
+        
+        # Известный пост наступил - нужен свежий текст перед публикацией
+        if any(post.publish_at and post.publish_at <= current_time for post in self._last_pending):
+            return True
+        
+        # Не пропускаем слишком долго (правки текста не видны по хэшу)
+        if self._skips_since_read >= SHEETS_PROBE_MAX_SKIPS:
+            return True
+        
+        # Подошло время полного перечитывания - хэш правки выше отметки не видит
+        if SHEETS_INCREMENTAL_READS and self._full_resync_due():
+            return True
+        
+        try:
+            signature = self._probe_signature()
+        except Exception as e:
+            logger.warning(f"Не удалось проверить изменения таблицы, выполняем полное чтение: {e}")
+            return True
+        
+        if signature != self._probe_hash:
+            self._probe_hash = signature
+            return True
+        
+        self._skips_since_read += 1
+        self.read_stats['skipped'] += 1
+        logger.info(
+            f"Таблица не изменилась - чтение пропущено "
+            f"(выполнено: {self.read_stats['performed']}, пропущено: {self.read_stats['skipped']})"
+        )
+        return False
+    
+    def _remember_read(self, pending_posts: List[Post]):
+        """Запоминает результат полного чтения для проверки изменений"""
+        self._last_pending = pending_posts
+        self._skips_since_read = 0
+        self.read_stats['performed'] += 1
+    
+    def get_pending_posts(self) -> List[Post]:
+        """
+        Получает посты со статусом 'Ожидает' для публикации.
+        Пустой список означает, что ожидающих постов нет; если таблица временно
+        недоступна, выбрасывается SheetsUnavailableError.
+        """
         if not self.service:
             logger.warning("Google Sheets API не инициализирован, возвращаем пустой список")
             return []
+        
+        if SHEETS_INCREMENTAL_READS:
+            delta = self.sync_incremental()
+            if delta is None:
+                return []
+            pending_posts = self._exclude_buffered(delta['pending'])
+            self._remember_read(pending_posts)
+            logger.info(f"Найдено {len(pending_posts)} постов для публикации")
+            return pending_posts
             
         try:
             # Получаем имя листа
             sheet_name = self.get_sheet_name()
             
-            # Получаем данные из таблицы
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=GOOGLE_SHEET_ID,
-                range=f'{sheet_name}!A:G'
-            ).execute()
-            
-            values = result.get('values', [])
+            # Получаем данные из таблицы (без заголовка)
+            values = self._read_window(sheet_name, FIRST_DATA_ROW)
             if not values:
                 logger.info("Таблица пуста")
+                self._remember_read([])
                 return []
             
             # Фильтруем посты со статусом "Ожидает"
             pending_posts = []
-            for i, row in enumerate(values[1:], start=2):  # Пропускаем заголовок, начинаем с строки 2
+            for i, row in enumerate(values, start=FIRST_DATA_ROW):
                 if len(row) >= 7 and row[6] == STATUS_PENDING:  # Проверяем статус в колонке G (7-я колонка)
-                    # Парсим URL изображений
-                    image_urls = []
-                    if len(row) > 5 and row[5]:  # Если есть URL изображений в колонке F (6-я колонка)
-                        image_urls = [url.strip() for url in row[5].split(',') if url.strip()]
-                    
-                    post = {
-                        'date': row[0] if len(row) > 0 else '',
-                        'time': row[1] if len(row) > 1 else '',
-                        'text': row[2] if len(row) > 2 else '',
-                        'prompt_ru': row[3] if len(row) > 3 else '',
-                        'prompt_en': row[4] if len(row) > 4 else '',
-                        'image_urls': image_urls,
-                        'status': row[6] if len(row) > 6 else '',
-                        'row_index': i  # Добавляем индекс строки для обновления статуса
-                    }
-                    pending_posts.append(post)
+                    pending_posts.append(Post.from_row(row, i))
+            pending_posts = self._exclude_buffered(pending_posts)
+            self._remember_read(pending_posts)
             
             logger.info(f"Найдено {len(pending_posts)} постов для публикации")
             return pending_posts
             
+        except SheetsUnavailableError:
+            raise
         except HttpError as e:
             logger.error(f"Ошибка Google Sheets API: {e}")
             return []
@@ -225,7 +691,7 @@ class GoogleSheetsClient:
             logger.error(f"Ошибка получения постов для публикации: {e}")
             return []
     
-    def get_all_posts(self) -> List[Dict[str, Any]]:
+    def get_all_posts(self) -> List[Post]:
         """Получает все посты из Google Sheets"""
         if not self.service:
             logger.warning("Google Sheets API не инициализирован, возвращаем пустой список")
@@ -236,40 +702,28 @@ class GoogleSheetsClient:
             sheet_name = self.get_sheet_name()
             
             # Получаем данные из таблицы
-            result = self.service.spreadsheets().values().get(
+            result = self._execute(self.service.spreadsheets().values().get(
                 spreadsheetId=GOOGLE_SHEET_ID,
-                range=f'{sheet_name}!A:G'
-            ).execute()
+                range=f'{sheet_name}!A:I'
+            ))
             
             values = result.get('values', [])
             if not values:
                 logger.info("Таблица пуста")
                 return []
             
-            # Обрабатываем все посты
-            posts = []
-            for i, row in enumerate(values[1:], start=2):  # Пропускаем заголовок
-                if len(row) >= 5:  # Проверяем, что строка содержит основные колонки
-                    # Парсим URL изображений
-                    image_urls = []
-                    if len(row) > 5 and row[5]:  # Если есть URL изображений в колонке F (6-я колонка)
-                        image_urls = [url.strip() for url in row[5].split(',') if url.strip()]
-                    
-                    post = {
-                        'date': row[0] if len(row) > 0 else '',
-                        'time': row[1] if len(row) > 1 else '',
-                        'text': row[2] if len(row) > 2 else '',
-                        'prompt_ru': row[3] if len(row) > 3 else '',
-                        'prompt_en': row[4] if len(row) > 4 else '',
-                        'image_urls': image_urls,
-                        'status': row[6] if len(row) > 6 else '',
-                        'row_index': i  # Добавляем индекс строки для обновления статуса
-                    }
-                    posts.append(post)
+            # Обрабатываем все посты (пропускаем заголовок)
+            posts = [
+                Post.from_row(row, i)
+                for i, row in enumerate(values[1:], start=2)
+                if len(row) >= 5  # Проверяем, что строка содержит основные колонки
+            ]
             
             logger.info(f"Получено {len(posts)} постов из Google Sheets")
             return posts
             
+        except SheetsUnavailableError:
+            raise
         except HttpError as e:
             logger.error(f"Ошибка Google Sheets API: {e}")
             return []
@@ -277,8 +731,18 @@ class GoogleSheetsClient:
             logger.error(f"Ошибка получения всех постов: {e}")
             return []
     
-    def update_post_status(self, row_index: int, status: str, error_msg: str = None) -> bool:
-        """Обновляет статус поста в Google Sheets"""
+    @staticmethod
+    def _status_data(sheet_name: str, row_index: int, status: str,
+                     destination_statuses: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Диапазоны для записи статуса: колонка G и, если задано, статусы по каналам в колонке I"""
+        data = [{'range': f'{sheet_name}!G{row_index}', 'values': [[status]]}]
+        if destination_statuses is not None:
+            data.append({'range': f'{sheet_name}!I{row_index}', 'values': [[destination_statuses]]})
+        return data
+    
+    def update_post_status(self, row_index: int, status: str, error_msg: str = None,
+                           destination_statuses: Optional[str] = None) -> bool:
+        """Обновляет статус поста (и, если задано, статусы по каналам) в Google Sheets"""
         if not self.service:
             logger.warning("Google Sheets API не инициализирован, пропускаем обновление")
             return True
@@ -287,13 +751,21 @@ class GoogleSheetsClient:
             # Получаем имя листа
             sheet_name = self.get_sheet_name()
             
-            # Обновляем статус в колонке G (7-я колонка)
-            result = self.service.spreadsheets().values().update(
-                spreadsheetId=GOOGLE_SHEET_ID,
-                range=f'{sheet_name}!G{row_index}',
-                valueInputOption='RAW',
-                body={'values': [[status]]}
-            ).execute()
+            if destination_statuses is None:
+                # Обновляем статус в колонке G (7-я колонка)
+                result = self._execute(self.service.spreadsheets().values().update(
+                    spreadsheetId=GOOGLE_SHEET_ID,
+                    range=f'{sheet_name}!G{row_index}',
+                    valueInputOption='RAW',
+                    body={'values': [[status]]}
+                ))
+            else:
+                # Статус в G и статусы по каналам в I (колонку H с каналами не трогаем)
+                result = self._execute(self.service.spreadsheets().values().batchUpdate(
+                    spreadsheetId=GOOGLE_SHEET_ID,
+                    body={'valueInputOption': 'RAW',
+                          'data': self._status_data(sheet_name, row_index, status, destination_statuses)}
+                ))
             
             if error_msg:
                 logger.info(f"Статус поста в строке {row_index} обновлен на '{status}': {error_msg}")
@@ -308,6 +780,93 @@ class GoogleSheetsClient:
             logger.error(f"Ошибка обновления статуса поста: {e}")
             return False
     
+    def queue_status_update(self, row_index: int, status: str, error_msg: str = None,
+                            destination_statuses: Optional[str] = None):
+        """
+        Ставит обновление статуса в буфер. Запись в таблицу произойдет
+        при вызове flush_status_updates() одним запросом на все строки.
+        destination_statuses - статусы по каналам для колонки I (None - не менять).
+        """
+        with self._status_buffer_lock:
+            self._status_buffer[row_index] = (status, error_msg, destination_statuses)
+        logger.debug(f"Статус строки {row_index} '{status}' поставлен в очередь записи")
+    
+    def flush_status_updates(self) -> Dict[str, List[int]]:
+        """
+        Записывает все накопленные статусы одним values.batchUpdate.
+        Возвращает {'updated': [строки], 'failed': [строки]}.
+        Строки, которые не удалось записать, остаются в буфере до следующего сброса.
+        """
+        with self._status_buffer_lock:
+            pending = dict(self._status_buffer)
+            self._status_buffer.clear()
+        
+        report = {'updated': [], 'failed': []}
+        if not pending:
+            return report
+        
+        if not self.service:
+            logger.warning("Google Sheets API не инициализирован, пропускаем запись статусов")
+            report['updated'] = sorted(pending)
+            return report
+        
+        try:
+            sheet_name = self.get_sheet_name()
+            data = [
+                item
+                for row_index, (status, _, destination_statuses) in sorted(pending.items())
+                for item in self._status_data(sheet_name, row_index, status, destination_statuses)
+            ]
+            
+            result = self._execute(self.service.spreadsheets().values().batchUpdate(
+                spreadsheetId=GOOGLE_SHEET_ID,
+                body={'valueInputOption': 'RAW', 'data': data}
+            ))
+            
+            # Проверяем, какие диапазоны реально обновлены
+            updated_ranges = {
+                response.get('updatedRange', '').split('!')[-1]
+                for response in result.get('responses', [])
+                if response.get('updatedCells')
+            }
+            for row_index, (status, error_msg, _) in sorted(pending.items()):
+                if f'G{row_index}' in updated_ranges:
+                    report['updated'].append(row_index)
+                    if error_msg:
+                        logger.info(f"Статус поста в строке {row_index} обновлен на '{status}': {error_msg}")
+                    else:
+                        logger.info(f"Статус поста в строке {row_index} обновлен на '{status}'")
+                else:
+                    report['failed'].append(row_index)
+            
+        except HttpError as e:
+            logger.error(f"Ошибка Google Sheets API при пакетной записи статусов: {e}")
+            # Пакет отклонен целиком - пробуем записать строки по одной, чтобы узнать, какие не проходят
+            for row_index, (status, error_msg, destination_statuses) in sorted(pending.items()):
+                if self.update_post_status(row_index, status, error_msg, destination_statuses):
+                    report['updated'].append(row_index)
+                else:
+                    report['failed'].append(row_index)
+        except Exception as e:
+            logger.error(f"Ошибка пакетной записи статусов: {e}")
+            report['failed'] = sorted(pending)
+        
+        if report['failed']:
+            # Возвращаем неудачные строки в буфер, не перетирая более свежие статусы
+            with self._status_buffer_lock:
+                for row_index in report['failed']:
+                    self._status_buffer.setdefault(row_index, pending[row_index])
+            logger.error(f"Не удалось записать статусы строк: {report['failed']}")
+        
+        logger.info(f"Пакетная запись статусов: обновлено {len(report['updated'])}, ошибок {len(report['failed'])}")
+        return report
+    
+    def close(self):
+        """Сбрасывает буфер статусов перед завершением работы"""
+        if self._status_buffer:
+            logger.info(f"Сбрасываем {len(self._status_buffer)} отложенных статусов перед завершением")
+            self.flush_status_updates()
+    
     def clear_sheet(self) -> bool:
         """Очищает таблицу (удаляет все данные кроме заголовков)"""
         if not self.service:
@@ -319,11 +878,12 @@ class GoogleSheetsClient:
             sheet_name = self.get_sheet_name()
             
             # Очищаем данные (оставляем заголовки)
-            result = self.service.spreadsheets().values().clear(
+            result = self._execute(self.service.spreadsheets().values().clear(
                 spreadsheetId=GOOGLE_SHEET_ID,
-                range=f'{sheet_name}!A2:G'
-            ).execute()
+                range=f'{sheet_name}!A2:I'
+            ))
             
+            self._snapshot.reset()
             logger.info("Таблица очищена (заголовки сохранены)")
             return True
             
@@ -345,13 +905,13 @@ class GoogleSheetsClient:
             sheet_name = self.get_sheet_name()
             
             # Устанавливаем заголовки (правильный порядок)
-            headers = [['Дата', 'Время', 'Пост', 'Промпт RU', 'Промпт EN', 'Изображение', 'Статус']]
-            result = self.service.spreadsheets().values().update(
+            headers = [SHEET_HEADERS]
+            result = self._execute(self.service.spreadsheets().values().update(
                 spreadsheetId=GOOGLE_SHEET_ID,
-                range=f'{sheet_name}!A1:G1',
+                range=f'{sheet_name}!A1:I1',
                 valueInputOption='RAW',
                 body={'values': headers}
-            ).execute()
+            ))
             
             logger.info("Заголовки таблицы настроены")
             return True
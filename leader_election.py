@@ -0,0 +1,298 @@
+"""
+Выбор ведущего экземпляра (leader election) для запуска нескольких реплик
+"""
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Callable, List, Optional
+
+from config import (
+    LEADER_ELECTION_BACKEND, LEADER_LOCK_PATH, LEADER_LEASE_PATH, LEADER_LEASE_NAME, LEADER_LEASE_TTL_SECONDS,
+    RAILWAY_REPLICA_ID
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows - файловая блокировка недоступна
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class LeadershipLostError(RuntimeError):
+    """Экземпляр перестал быть ведущим - публиковать нельзя"""
+
+
+class LeaseBackend(ABC):
+    """
+    Хранилище аренды лидерства.
+    acquire() захватывает или продлевает аренду для holder на ttl секунд и
+    возвращает True, если holder - ведущий. Для общих хранилищ (Redis, Postgres,
+    etcd) достаточно реализовать acquire() и release(); без них бэкенд не создается.
+    """
+    
+    @abstractmethod
+    def acquire(self, holder: str, ttl: float) -> bool:
+        """Захватывает или продлевает аренду; True - holder ведущий"""
+        
+    @abstractmethod
+    def release(self, holder: str):
+        """Освобождает аренду, если ее держит holder"""
+        
+    def current_holder(self) -> Optional[str]:
+        """Текущий ведущий (None, если аренда свободна или неизвестна)"""
+        return None
+        
+    def close(self):
+        pass
+
+
+class FileLockBackend(LeaseBackend):
+    """
+    Блокировка файла (flock) для реплик на одном хосте: между хостами flock не действует.
+    Блокировку держит ядро: при падении процесса она снимается сразу,
+    поэтому ttl не используется и переключение почти мгновенное.
+    """
+    
+    def __init__(self, path: str):
+        if fcntl is None:
+            raise RuntimeError("Файловая блокировка (fcntl) недоступна на этой платформе")
+        self.path = path
+        self._fd: Optional[int] = None
+        self._holder: Optional[str] = None
+        self._lock = threading.Lock()
+        
+    def acquire(self, holder: str, ttl: float) -> bool:
+        with self._lock:
+            if self._fd is not None:
+                return self._holder == holder
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            # Записываем владельца - для диагностики
+            os.ftruncate(fd, 0)
+            os.write(fd, holder.encode('utf-8'))
+            self._fd, self._holder = fd, holder
+            return True
+            
+    def release(self, holder: str):
+        with self._lock:
+            if self._fd is None or self._holder != holder:
+                return
+            try:
+                os.ftruncate(self._fd, 0)
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+                self._fd, self._holder = None, None
+                
+    def current_holder(self) -> Optional[str]:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+            
+    def close(self):
+        if self._holder:
+            self.release(self._holder)
+
+
+class SqliteLeaseBackend(LeaseBackend):
+    """
+    Аренда с истечением срока в SQLite (файл на общем томе).
+    Ведущий продлевает аренду раньше, чем она истечет; если он упал,
+    другая реплика захватит аренду не позже чем через ttl секунд.
+    """
+    
+    def __init__(self, path: str, name: str = "scheduler"):
+        self.path = path
+        self.name = name
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " name TEXT PRIMARY KEY,"
+            " holder TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        
+    def acquire(self, holder: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE: чтение и запись аренды - одна транзакция под блокировкой записи
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT holder, expires_at FROM leases WHERE name = ?", (self.name,)
+                ).fetchone()
+                if row and row[0] != holder and row[1] > now:
+                    self._conn.execute("ROLLBACK")
+                    return False
+                self._conn.execute(
+                    "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at",
+                    (self.name, holder, now + ttl)
+                )
+                self._conn.execute("COMMIT")
+                return True
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+                
+    def release(self, holder: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, holder))
+            
+    def current_holder(self) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT holder FROM leases WHERE name = ? AND expires_at > ?", (self.name, time.time())
+            ).fetchone()
+        return row[0] if row else None
+        
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LeaderElector:
+    """
+    Фоновый поток, который захватывает и продлевает аренду лидерства.
+    Ведущий продлевает аренду каждые ttl/3 секунд; ведомые с той же частотой
+    пытаются ее захватить. Если продлить аренду не удалось дольше ttl
+    (хранилище недоступно), экземпляр сам слагает полномочия - лучше
+    пропустить цикл, чем опубликовать пост дважды.
+    """
+    
+    def __init__(self, backend: LeaseBackend, ttl: float = 15.0, holder_id: Optional[str] = None):
+        self.backend = backend
+        self.ttl = ttl
+        self.renew_interval = max(ttl / 3, 0.1)
+        self.holder_id = holder_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        
+        self._leader = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_renewed = 0.0
+        self._on_elected: List[Callable[[], None]] = []
+        self._on_revoked: List[Callable[[], None]] = []
+        
+    @property
+    def is_leader(self) -> bool:
+        return self._leader.is_set()
+        
+    def on_elected(self, callback: Callable[[], None]):
+        """Вызывается (из потока выбора) при получении лидерства"""
+        self._on_elected.append(callback)
+        
+    def on_revoked(self, callback: Callable[[], None]):
+        """Вызывается (из потока выбора) при потере лидерства"""
+        self._on_revoked.append(callback)
+        
+    def wait_for_leadership(self, timeout: Optional[float] = None) -> bool:
+        """Ждет лидерства; False - по таймауту или после остановки"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._stopped.is_set():
+            remaining = self.renew_interval if deadline is None else min(self.renew_interval, deadline - time.monotonic())
+            if remaining <= 0:
+                return False
+            if self._leader.wait(remaining):
+                return True
+        return False
+        
+    def _notify(self, callbacks: List[Callable[[], None]]):
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Ошибка обработчика смены лидерства: {e}")
+                
+    def _set_leader(self, leader: bool):
+        if leader == self.is_leader:
+            return
+        if leader:
+            self._leader.set()
+            logger.info(f"👑 Экземпляр {self.holder_id} стал ведущим")
+            self._notify(self._on_elected)
+        else:
+            self._leader.clear()
+            logger.warning(f"Экземпляр {self.holder_id} больше не ведущий")
+            self._notify(self._on_revoked)
+            
+    def _tick(self):
+        try:
+            acquired = self.backend.acquire(self.holder_id, self.ttl)
+        except Exception as e:
+            logger.error(f"Ошибка хранилища аренды лидерства: {e}")
+            # Держим лидерство, пока аренда гарантированно не истекла у других реплик
+            if self.is_leader and time.monotonic() - self._last_renewed > self.ttl - self.renew_interval:
+                self._set_leader(False)
+            return
+        if acquired:
+            self._last_renewed = time.monotonic()
+        elif not self.is_leader:
+            holder = self.backend.current_holder()
+            logger.debug(f"Ведущий экземпляр: {holder or 'неизвестен'}")
+        self._set_leader(acquired)
+        
+    def _run(self):
+        while not self._stopped.is_set():
+            self._tick()
+            self._stopped.wait(self.renew_interval)
+            
+    def start(self):
+        """Запускает фоновый поток выбора ведущего"""
+        logger.info(f"Выбор ведущего: {type(self.backend).__name__}, аренда {self.ttl:.0f} сек, id {self.holder_id}")
+        self._thread = threading.Thread(target=self._run, name="leader-elector", daemon=True)
+        self._thread.start()
+        
+    def stop(self):
+        """Останавливает выбор и освобождает аренду (ведомые подхватят сразу)"""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=self.renew_interval + 5)
+        was_leader = self.is_leader
+        self._set_leader(False)
+        if was_leader:
+            try:
+                self.backend.release(self.holder_id)
+            except Exception as e:
+                logger.error(f"Не удалось освободить аренду лидерства: {e}")
+        self._leader.clear()
+        self.backend.close()
+
+
+def create_lease_backend(kind: str = LEADER_ELECTION_BACKEND) -> Optional[LeaseBackend]:
+    """Хранилище аренды из конфигурации (None - выбор ведущего отключен)"""
+    kind = (kind or "none").lower()
+    if kind == "file":
+        if RAILWAY_REPLICA_ID:
+            # flock исключает только процессы одного хоста - реплики на разных хостах станут ведущими одновременно
+            logger.error(
+                "Выбор ведущего через блокировку файла не работает между репликами Railway: "
+                "задайте LEADER_LEASE_PATH на общем томе (или LEADER_ELECTION_BACKEND=sqlite), "
+                "иначе несколько реплик будут публиковать одни и те же посты"
+            )
+        return FileLockBackend(LEADER_LOCK_PATH)
+    if kind == "sqlite":
+        return SqliteLeaseBackend(LEADER_LEASE_PATH, LEADER_LEASE_NAME)
+    if kind != "none":
+        logger.warning(f"Неизвестное хранилище аренды лидерства '{kind}', выбор ведущего отключен")
+    return None
+
+
+def create_leader_elector() -> Optional[LeaderElector]:
+    """LeaderElector по настройкам конфигурации (None - работаем как единственный экземпляр)"""
+    backend = create_lease_backend()
+    if backend is None:
+        return None
+    return LeaderElector(backend, ttl=LEADER_LEASE_TTL_SECONDS)
@@ -3,17 +3,31 @@
 """
 import asyncio
 import logging
-import threading
-import time
 from datetime import datetime, time as dt_time, timedelta
+from typing import Optional
 import pytz
 import os
 import sys
 
-from google_sheets_client import GoogleSheetsClient
-from telegram_client import TelegramClient
+from google_sheets_client import GoogleSheetsClient, SheetsUnavailableError
+from telegram_client import TelegramClient, SendResult
 from notification_system import NotificationSystem, NotificationType
-from config import CHECK_TIMES, CHECK_INTERVAL_MINUTES, LOOKBACK_MINUTES, STATUS_PUBLISHED, STATUS_ERROR, STATUS_PENDING
+from post_record import Post
+from post_scheduler import DueTimeScheduler
+from publish_pipeline import PublishPipeline
+from publish_outbox import PublishOutbox, STATE_SENT, STATE_INTENT, STATE_PARTIAL, STATE_DONE
+from catchup_policy import CatchupPolicy
+from channel_fanout import ChannelFanout
+from leader_election import LeaderElector, LeadershipLostError
+from media_cache import MediaCache
+from render_cache import RenderCache
+from config import (
+    CHECK_TIMES, SCHEDULER_RESYNC_MINUTES, TELEGRAM_CHAT_MIN_INTERVAL_SECONDS, PUBLISH_OUTBOX_PATH,
+    TELEGRAM_CHANNEL_IDS, TELEGRAM_SEND_MAX_ATTEMPTS, TELEGRAM_FORMAT_MODE,
+    MEDIA_CACHE_PATH, MEDIA_PREFETCH_LEAD_MINUTES, MEDIA_DOWNLOAD_TIMEOUT_SECONDS, RENDER_CACHE_PATH,
+    CATCHUP_MODE, CATCHUP_GRACE_MINUTES, CATCHUP_WINDOW_MINUTES, CATCHUP_KEEP_LATEST, CATCHUP_MAX_AGE_HOURS,
+    STATUS_PUBLISHED, STATUS_ERROR, STATUS_PARTIAL, STATUS_PENDING, STATUS_SKIPPED
+)
 
 # Настройка логирования
 logging.basicConfig(
@@ -57,15 +71,44 @@ def debug_google_sheets_setup():
 class TelegramAutomation:
     """Основной класс для автоматизации публикаций"""
     
-    def __init__(self):
+    def __init__(self, leader: Optional[LeaderElector] = None):
+        # leader - выбор ведущего среди реплик (None - единственный экземпляр, публикуем всегда)
+        self.leader = leader
         self.sheets_client = None
         self.telegram_client = None
         self.notification_system = None
+        self.outbox = None
+        self.channel_fanout = None
+        self._fanout_results = {}
+        self.media_cache = None
+        self.render_cache = None
+        # Будущие посты из последнего чтения таблицы (для предзагрузки изображений)
+        self._upcoming_posts = []
+        self._prefetch_task = None
+        self._media_alerted = set()
         self.moscow_tz = pytz.timezone('Europe/Moscow')
         self.daily_stats = {'published': 0, 'errors': 0, 'pending': 0}
+        self.scheduler = DueTimeScheduler(timedelta(minutes=SCHEDULER_RESYNC_MINUTES))
+        self._loop = None
+        self._stop_event = None
+        self.publish_pipeline = PublishPipeline(
+            send=self._send_post_once,
+            finalize=self._finalize_post,
+            # Темп отправки в каждый чат выдерживает общая очередь TelegramSendQueue
+            min_interval=0,
+            flush=self._flush_status_updates_in_background
+        )
+        self.catchup_policy = CatchupPolicy(
+            mode=CATCHUP_MODE,
+            grace=timedelta(minutes=CATCHUP_GRACE_MINUTES),
+            window=timedelta(minutes=CATCHUP_WINDOW_MINUTES),
+            keep_latest=CATCHUP_KEEP_LATEST,
+            max_age=timedelta(hours=CATCHUP_MAX_AGE_HOURS),
+            send_interval=TELEGRAM_CHAT_MIN_INTERVAL_SECONDS
+        )
         
-    async def initialize(self):
-        """Инициализация клиентов"""
+    async def initialize(self, test_mode: bool = False):
+        """Инициализация клиентов (test_mode - только проверка соединений, таблица не меняется)"""
         try:
             logger.info("Инициализация клиентов...")
             
@@ -75,17 +118,32 @@ class TelegramAutomation:
             self.sheets_client = GoogleSheetsClient()
             
             # Принудительно обновляем заголовки Google Sheets
-            if self.sheets_client.service:
+            if self.sheets_client.service and not test_mode:
                 logger.info("🔄 Принудительно обновляем заголовки Google Sheets...")
-                self.sheets_client.setup_headers()
+                await asyncio.to_thread(self.sheets_client.setup_headers)
             self.telegram_client = TelegramClient()
             self.notification_system = NotificationSystem(self.telegram_client)
+            self.channel_fanout = ChannelFanout(
+                self.telegram_client,
+                TELEGRAM_CHANNEL_IDS,
+                max_attempts=TELEGRAM_SEND_MAX_ATTEMPTS
+            )
+            self.outbox = PublishOutbox(PUBLISH_OUTBOX_PATH)
+            self.media_cache = MediaCache(MEDIA_CACHE_PATH, download_timeout=MEDIA_DOWNLOAD_TIMEOUT_SECONDS)
+            self.telegram_client.media_cache = self.media_cache
+            self.render_cache = RenderCache(RENDER_CACHE_PATH)
+            self.telegram_client.render_cache = self.render_cache
             
             # Проверяем соединение с Telegram
             if not await self.telegram_client.test_connection():
                 raise Exception("Не удалось подключиться к Telegram Bot API")
             
             logger.info("Клиенты успешно инициализированы")
+            if test_mode:
+                return True
+            
+            # Дописываем статусы постов, отправленных перед падением прошлого процесса
+            await self._reconcile_outbox()
             
             # Отправляем уведомление о запуске
             current_time = datetime.now(self.moscow_tz)
@@ -93,9 +151,10 @@ class TelegramAutomation:
                 "🚀 Система автоматизации запущена",
                 {
                     "время": current_time.strftime('%Y-%m-%d %H:%M:%S MSK'),
-                    "проверка": f"каждые {CHECK_INTERVAL_MINUTES} минут",
-                    "поиск": f"за последние {LOOKBACK_MINUTES} минут",
+                    "публикация": "точно по времени поста",
+                    "синхронизация": f"каждые {SCHEDULER_RESYNC_MINUTES} минут",
                     "канал": "@sovpalitest",
+                    "каналы по умолчанию": ", ".join(TELEGRAM_CHANNEL_IDS),
                     "статус": "готов к работе"
                 }
             )
@@ -106,37 +165,19 @@ class TelegramAutomation:
             logger.error(f"Ошибка инициализации: {e}")
             return False
     
-    def _should_publish_post(self, post: dict, current_time: datetime) -> bool:
+    def _should_publish_post(self, post: Post, current_time: datetime) -> bool:
         """Проверяет, подходит ли время поста для публикации"""
         try:
-            post_date_str = post.get('date', '')
-            post_time_str = post.get('time', '')
-            
-            if not post_date_str or not post_time_str:
-                logger.warning(f"Пост из строки {post['row_index']} не имеет даты или времени")
+            if not post.date or not post.time:
+                logger.warning(f"Пост из строки {post.row_index} не имеет даты или времени")
                 return False
             
-            # Парсим дату и время поста
-            try:
-                post_datetime = datetime.strptime(f"{post_date_str} {post_time_str}", "%Y-%m-%d %H:%M")
-                post_datetime = self.moscow_tz.localize(post_datetime)
-            except ValueError:
-                # Пробуем другие форматы
-                try:
-                    post_datetime = datetime.strptime(f"{post_date_str} {post_time_str}", "%d.%m.%Y %H:%M")
-                    post_datetime = self.moscow_tz.localize(post_datetime)
-                except ValueError:
-                    try:
-                        # Пробуем формат с коротким годом (20.09.25)
-                        post_datetime = datetime.strptime(f"{post_date_str} {post_time_str}", "%d.%m.%y %H:%M")
-                        post_datetime = self.moscow_tz.localize(post_datetime)
-                    except ValueError:
-                        try:
-                            post_datetime = datetime.strptime(f"{post_date_str} {post_time_str}", "%Y-%m-%d %H:%M:%S")
-                            post_datetime = self.moscow_tz.localize(post_datetime)
-                        except ValueError:
-                            logger.warning(f"Не удалось распарсить дату/время поста: {post_date_str} {post_time_str}")
-                            return False
+            # Дата и время поста разбираются один раз при первом обращении
+            post_datetime = post.publish_at
+            if post_datetime is None:
+                # Предупреждение уже записано парсером при первом разборе этой даты
+                logger.debug(f"Не удалось распарсить дату/время поста из строки {post.row_index}: {post.date} {post.time}")
+                return False
             
             # Проверяем, подходит ли время (пост должен быть до текущего времени)
             time_diff = (current_time - post_datetime).total_seconds() / 60  # в минутах
@@ -146,10 +187,10 @@ class TelegramAutomation:
             # time_diff = 0 означает, что пост сейчас
             # time_diff < 0 означает, что пост в будущем
             if time_diff >= 0:
-                logger.info(f"Пост из строки {post['row_index']} подходит по времени (время поста: {post_datetime.strftime('%H:%M')}, текущее: {current_time.strftime('%H:%M')}, разница: {time_diff:.1f} мин)")
+                logger.info(f"Пост из строки {post.row_index} подходит по времени (время поста: {post_datetime.strftime('%H:%M')}, текущее: {current_time.strftime('%H:%M')}, разница: {time_diff:.1f} мин)")
                 return True
             else:
-                logger.debug(f"Пост из строки {post['row_index']} не подходит по времени (время поста: {post_datetime.strftime('%H:%M')}, текущее: {current_time.strftime('%H:%M')}, разница: {time_diff:.1f} мин) - пост в будущем")
+                logger.debug(f"Пост из строки {post.row_index} не подходит по времени (время поста: {post_datetime.strftime('%H:%M')}, текущее: {current_time.strftime('%H:%M')}, разница: {time_diff:.1f} мин) - пост в будущем")
                 return False
                 
         except Exception as e:
@@ -159,12 +200,24 @@ class TelegramAutomation:
     async def process_pending_posts(self):
         """Обрабатывает посты, готовые к публикации"""
         try:
+            if not self._is_leader():
+                logger.info("Экземпляр не ведущий - публикацией занимается другая реплика")
+                return
             logger.info("Начинаем обработку постов...")
             
+            # Дешевая проверка: если таблица не менялась и посты не наступили, полное чтение не нужно
+            current_time = datetime.now(self.moscow_tz)
+            if not await asyncio.to_thread(self.sheets_client.has_changes, current_time):
+                logger.info("Изменений нет - пропускаем проверку без уведомления")
+                return
+            
             # Получаем список постов для публикации
-            pending_posts = self.sheets_client.get_pending_posts()
+            # Запрос к таблице выполняем в отдельном потоке, чтобы не блокировать event loop
+            pending_posts = await asyncio.to_thread(self.sheets_client.get_pending_posts)
             
             if not pending_posts:
+                self.scheduler.sync([])
+                self._upcoming_posts = []
                 logger.info("Нет постов для публикации")
                 # Отправляем уведомление о пустой проверке
                 current_time = datetime.now(self.moscow_tz)
@@ -174,18 +227,43 @@ class TelegramAutomation:
             
             logger.info(f"Найдено {len(pending_posts)} постов со статусом 'Ожидает'")
             
+            # Тексты новых и измененных строк рендерим сейчас, чтобы при публикации отправлять готовое
+            await asyncio.to_thread(self.render_cache.prepare, pending_posts)
+            
             # Фильтруем посты по времени
             current_time = datetime.now(self.moscow_tz)
             logger.info(f"🕐 Текущее время (Москва): {current_time.strftime('%Y-%m-%d %H:%M:%S')}")
             posts_to_publish = []
             
             for post in pending_posts:
-                logger.info(f"🔍 Проверяем пост из строки {post['row_index']}: {post['date']} {post['time']}")
+                logger.info(f"🔍 Проверяем пост из строки {post.row_index}: {post.date} {post.time}")
                 if self._should_publish_post(post, current_time):
                     posts_to_publish.append(post)
-                    logger.info(f"✅ Пост из строки {post['row_index']} добавлен в очередь публикации")
+                    logger.info(f"✅ Пост из строки {post.row_index} добавлен в очередь публикации")
                 else:
-                    logger.info(f"⏰ Пост из строки {post['row_index']} не подходит по времени (время: {post['time']}, дата: {post['date']})")
+                    logger.info(f"⏰ Пост из строки {post.row_index} не подходит по времени (время: {post.time}, дата: {post.date})")
+            
+            # Просроченные после простоя посты не публикуем пачкой, а действуем по политике догоняющей публикации
+            catchup = self.catchup_policy.plan(posts_to_publish, current_time)
+            posts_to_publish = catchup['now']
+            for post in catchup['skipped']:
+                self.sheets_client.queue_status_update(
+                    post.row_index, STATUS_SKIPPED, f"Пропущен после простоя (режим {self.catchup_policy.mode})"
+                )
+            if catchup['changed']:
+                await self.notification_system.send_catchup_notification(
+                    self.catchup_policy.mode, catchup['overdue'], len(catchup['now']),
+                    len(catchup['deferred']), len(catchup['skipped']),
+                    catchup['completion'].strftime('%H:%M:%S')
+                )
+            
+            # Будущие и отложенные посты ставим в очередь планировщика - проснемся ровно к их времени
+            upcoming = [post for post in pending_posts if post not in posts_to_publish and post not in catchup['skipped']]
+            self.scheduler.sync(upcoming, due_overrides=catchup['planned'])
+            self._upcoming_posts = [
+                (catchup['planned'].get(post.row_index, post.publish_at), post)
+                for post in upcoming if post.has_images and post.publish_at
+            ]
             
             if not posts_to_publish:
                 logger.info("Нет постов, готовых к публикации по времени")
@@ -197,194 +275,327 @@ class TelegramAutomation:
             logger.info(f"Найдено {len(posts_to_publish)} постов, готовых к публикации")
             self.daily_stats['pending'] = len(posts_to_publish)
             
-            # Счетчики для уведомления
-            published_count = 0
-            errors_count = 0
-            
-            for post in posts_to_publish:
-                success = await self.publish_post(post)
-                if success:
-                    published_count += 1
-                else:
-                    errors_count += 1
+            # Отправка идет по порядку, а статусы и уведомления - параллельно со следующими отправками
+            report = await self.publish_pipeline.run(posts_to_publish)
+            logger.info(f"📡 Задержка запросов к Telegram: {self.telegram_client.latency.summary()}")
             
             # Отправляем уведомление о результатах проверки
             current_time_str = current_time.strftime('%H:%M:%S MSK')
             await self.notification_system.send_check_notification(
-                len(pending_posts), published_count, errors_count, current_time_str
+                len(pending_posts), report['published'], report['errors'], current_time_str,
+                drain_seconds=report['drain_seconds']
             )
                 
+        except SheetsUnavailableError as e:
+            # Таблица недоступна - это не "нет постов": ничего не публикуем и не меняем статусы
+            logger.warning(f"Google Sheets временно недоступна, пропускаем цикл: {e}")
+            await self.notification_system.send_error_notification(
+                f"Google Sheets временно недоступна, повторим при следующей проверке: {str(e)}"
+            )
         except Exception as e:
             logger.error(f"Ошибка при обработке постов: {e}")
             await self.notification_system.send_error_notification(
                 f"Ошибка обработки постов: {str(e)}"
             )
+        finally:
+            # Записываем все статусы цикла одним запросом
+            await self._flush_status_updates()
     
-    async def publish_post(self, post: dict) -> bool:
-        """Публикует один пост. Возвращает True если успешно, False если ошибка"""
-        row_index = post['row_index']
-        post_time = post['time']
-        # Более строгая проверка наличия изображений
-        image_urls = post.get('image_urls', [])
-        has_images = bool(image_urls and len(image_urls) > 0 and any(url.strip() for url in image_urls if url.strip()))
+    async def _reconcile_outbox(self):
+        """Сверяет журнал публикаций с таблицей после запуска"""
+        if not self.sheets_client.service:
+            return
+        try:
+            pending_posts = await asyncio.to_thread(self.sheets_client.get_pending_posts)
+        except SheetsUnavailableError as e:
+            # Не страшно: перед каждой отправкой журнал проверяется заново
+            logger.warning(f"Не удалось сверить журнал публикаций с таблицей: {e}")
+            return
         
+        result = self.outbox.reconcile(pending_posts)
+        for post in result['sent']:
+            logger.info(f"Пост из строки {post.row_index} уже был отправлен до перезапуска - записываем статус")
+            self.sheets_client.queue_status_update(post.row_index, STATUS_PUBLISHED)
+        for post in result['unknown']:
+            error_msg = "Процесс перезапустился во время отправки - проверьте канал, пост мог быть опубликован"
+            self.sheets_client.queue_status_update(post.row_index, STATUS_ERROR, error_msg)
+            self.outbox.discard(post)
+            await self.notification_system.send_error_notification(error_msg, post)
+        await self._flush_status_updates()
+    
+    async def _flush_status_updates(self):
+        """Сбрасывает накопленные за цикл статусы в Google Sheets"""
+        if not self.sheets_client:
+            return
+        report = await asyncio.to_thread(self.sheets_client.flush_status_updates)
+        if self.outbox:
+            self.outbox.mark_done(report['updated'])
+        if report['failed']:
+            await self.notification_system.send_error_notification(
+                f"Не удалось записать статусы в таблицу для строк: {', '.join(map(str, report['failed']))}. "
+                f"Повторим при следующей проверке"
+            )
+    
+    async def _flush_status_updates_in_background(self):
+        """Промежуточный сброс статусов во время публикации пачки (ошибки сообщит итоговый сброс)"""
+        report = await asyncio.to_thread(self.sheets_client.flush_status_updates)
+        self.outbox.mark_done(report['updated'])
+    
+    async def publish_post(self, post: Post) -> bool:
+        """Публикует один пост. Возвращает True если успешно, False если ошибка"""
+        error = None
         try:
-            logger.info(f"Публикуем пост из строки {row_index} (время: {post_time})")
-            logger.info(f"🖼️ Изображения: {'да' if has_images else 'нет'}")
-            logger.info(f"📊 image_urls: {image_urls}")
-            logger.info(f"📊 Количество URL: {len(image_urls) if image_urls else 0}")
-            
-            # Проверяем, является ли пост цитатой (начинается с ">")
-            is_quote = post['text'].strip().startswith('>')
-            
-            if is_quote:
-                # ЦИТАТА - используем специальный метод для цитат
-                logger.info("💬 Цитата - используем специальный метод для цитат")
-                success = await self.telegram_client.send_quote_post(
-                    text=post['text'],
-                    image_urls=post['image_urls']
-                )
-            else:
-                # ОБЫЧНЫЙ ПОСТ - определяем метод по количеству изображений
-                if has_images:
-                    image_count = len(post['image_urls'])
-                    if image_count > 1:
-                        # Пост с НЕСКОЛЬКИМИ изображениями - Markdown метод с медиагруппой
-                        logger.info(f"🖼️ Пост с {image_count} изображениями - используем Markdown метод с медиагруппой")
-                        success = await self.telegram_client.send_markdown_post_with_multiple_images(
-                            text=post['text'],
-                            image_urls=post['image_urls']
-                        )
-                    else:
-                        # Пост с ОДНИМ изображением - HTML метод
-                        logger.info("🖼️ Пост с 1 изображением - используем HTML метод")
-                        success = await self.telegram_client.send_html_post_with_image(
-                            text=post['text'],
-                            image_urls=post['image_urls']
-                        )
-                else:
-                    # Пост БЕЗ изображений - Markdown метод
-                    logger.info("📝 Пост без изображений - используем Markdown метод")
-                    success = await self.telegram_client.send_markdown_post(
-                        text=post['text']
-                    )
-            
-            if success:
-                # Обновляем статус на "Опубликовано"
-                self.sheets_client.update_post_status(row_index, STATUS_PUBLISHED)
-                self.daily_stats['published'] += 1
-                logger.info(f"Пост из строки {row_index} успешно опубликован")
-                
-                # Отправляем уведомление об успехе
-                await self.notification_system.send_info_notification(
-                    "Пост опубликован",
-                    {
-                        "Дата": post['date'],
-                        "Время": post['time'],
-                        "Длина": f"{len(post['text'])} символов",
-                        "Изображения": "да" if has_images else "нет",
-                        "Формат": "HTML" if has_images else "Markdown"
-                    }
-                )
-                return True
-            else:
-                # Обновляем статус на "Ошибка"
-                error_msg = "Ошибка отправки в Telegram"
-                self.sheets_client.update_post_status(row_index, STATUS_ERROR, error_msg)
-                self.daily_stats['errors'] += 1
-                logger.error(f"Ошибка публикации поста из строки {row_index}")
-                
-                # Отправляем уведомление об ошибке
-                await self.notification_system.send_error_notification(error_msg, post)
-                return False
-                
+            success = await self._send_post_once(post)
         except Exception as e:
-            error_msg = f"Неожиданная ошибка: {str(e)}"
-            logger.error(f"Ошибка публикации поста из строки {row_index}: {e}")
-            
-            try:
-                self.sheets_client.update_post_status(row_index, STATUS_ERROR, error_msg)
-                self.daily_stats['errors'] += 1
-            except Exception as update_error:
-                logger.error(f"Ошибка обновления статуса: {update_error}")
+            logger.error(f"Ошибка публикации поста из строки {post.row_index}: {e}")
+            success, error = False, e
+        await self._finalize_post(post, success, error)
+        return success
+    
+    async def _send_post_once(self, post: Post) -> bool:
+        """
+        Отправляет пост не более одного раза: намерение и message_id фиксируются
+        в журнале публикаций до и после вызова Telegram API. Частично отправленный
+        пост продолжается с шага, на котором была ошибка
+        """
+        if not self._is_leader():
+            raise LeadershipLostError("экземпляр перестал быть ведущим - пост опубликует новая ведущая реплика")
+        state = self.outbox.get_state(post)
+        if state == STATE_SENT:
+            # Отправлен, но статус в таблицу еще не записан - только дописываем статус
+            logger.warning(f"Пост из строки {post.row_index} уже отправлен (журнал публикаций) - повторно не публикуем")
+            self.outbox.record_sent(post, None)
+            return True
+        if state == STATE_INTENT:
+            raise RuntimeError("процесс перезапустился во время отправки этого поста - проверьте канал, пост мог быть опубликован")
+        if state == STATE_DONE:
+            # Та же строка с тем же текстом уже публиковалась, и ей снова поставили "Ожидает"
+            logger.warning(f"Пост из строки {post.row_index} уже публиковался (журнал публикаций) - публикуем повторно")
+        resume = self.outbox.get_partial(post) if state == STATE_PARTIAL else None
+        
+        self.outbox.record_intent(post)
+        # Рассылка по всем каналам поста; результат по каналам заберет _finalize_post
+        result = await self.channel_fanout.publish(post, self._send_post, resume)
+        self._fanout_results[post.row_index] = result
+        message_ids = {
+            destination: destination_result['message_ids']
+            for destination, destination_result in result['destinations'].items()
+        }
+        if result['ok']:
+            self.outbox.record_sent(post, message_ids)
+            return True
+        if result['partial']:
+            # Часть сообщений уже в канале: запоминаем их и шаги плана, повтор продолжит с места ошибки
+            self.outbox.record_partial(post, message_ids, {
+                destination: destination_result['steps']
+                for destination, destination_result in result['destinations'].items()
+                if not destination_result['ok']
+            })
+        return False
+    
+    async def _send_post(self, post: Post, telegram_client: TelegramClient, start: int = 0) -> SendResult:
+        """Отправляет пост в канал клиента по плану отправки, начиная с шага start"""
+        logger.info(f"Публикуем пост из строки {post.row_index} (время: {post.time})")
+        # План составляется по содержимому поста (текст, изображения, лимиты Telegram) и при
+        # повторе получается тем же, поэтому продолжить можно с любого шага;
+        # ошибка планирования - ValueError до любого запроса
+        plan = telegram_client.plan_post(post.text, post.image_urls)
+        return await telegram_client.execute_plan(plan, start=start)
+    
+    async def _finalize_post(self, post: Post, success: bool, error: Optional[Exception] = None):
+        """Ставит статус поста в буфер записи и отправляет уведомление о результате"""
+        row_index = post.row_index
+        if isinstance(error, LeadershipLostError):
+            # Статус не трогаем: пост остается "Ожидает" для новой ведущей реплики
+            logger.warning(f"Пост из строки {row_index} не отправлен: {error}")
+            return
+        fanout = self._fanout_results.pop(row_index, None)
+        destination_statuses = fanout['statuses'] if fanout else None
+        
+        if success:
+            # Обновляем статус на "Опубликовано"
+            self.sheets_client.queue_status_update(row_index, STATUS_PUBLISHED, None, destination_statuses)
+            self.daily_stats['published'] += 1
+            self.scheduler.record_published(post, datetime.now(self.moscow_tz))
+            logger.info(f"Пост из строки {row_index} успешно опубликован")
             
-            # Отправляем уведомление об ошибке
-            await self.notification_system.send_error_notification(error_msg, post)
-            return False
+            # Отправляем уведомление об успехе
+            await self.notification_system.send_info_notification(
+                "Пост опубликован",
+                {
+                    "Дата": post.date,
+                    "Время": post.time,
+                    "Длина": f"{len(post.text)} символов",
+                    "Изображения": "да" if post.has_images else "нет",
+                    "Формат": "MessageEntity" if TELEGRAM_FORMAT_MODE == "entities" else "HTML",
+                    "Каналы": destination_statuses or "—"
+                }
+            )
+            return
+        
+        if fanout and fanout['partial']:
+            # Часть сообщений уже в канале - запись в журнале остается, повтор строки продолжит с места ошибки
+            status = STATUS_PARTIAL
+            error_msg = (f"Пост опубликован частично: отправка прервалась посреди поста. Поставьте статус "
+                         f"\"{STATUS_PENDING}\" - будут отправлены только недостающие сообщения")
+        else:
+            # Отправка не состоялась - запись в журнале не нужна, пост можно будет отправить снова
+            self.outbox.discard(post)
+            status = STATUS_ERROR
+            error_msg = f"Неожиданная ошибка: {str(error)}" if error else "Ошибка отправки в Telegram"
+        if destination_statuses:
+            error_msg = f"{error_msg} (по каналам: {destination_statuses})"
+        
+        # Обновляем статус на "Ошибка" или "Частично опубликовано"
+        try:
+            self.sheets_client.queue_status_update(row_index, status, error_msg, destination_statuses)
+            self.daily_stats['errors'] += 1
+        except Exception as update_error:
+            logger.error(f"Ошибка обновления статуса: {update_error}")
+        logger.error(f"Ошибка публикации поста из строки {row_index}")
+        
+        # Отправляем уведомление об ошибке
+        await self.notification_system.send_error_notification(error_msg, post)
+    
+    def _is_leader(self) -> bool:
+        return self.leader is None or self.leader.is_leader
     
-    def _run_process_posts_thread(self):
-        """Запускает обработку постов в отдельном потоке"""
+    async def _sleep(self, seconds: float):
+        """Ждет указанное время или сигнал остановки"""
         try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self.process_pending_posts())
-            loop.close()
-        except Exception as e:
-            logger.error(f"Ошибка в _run_process_posts_thread: {e}")
+            await asyncio.wait_for(self._stop_event.wait(), timeout=max(seconds, 0))
+        except asyncio.TimeoutError:
+            pass
     
-    def _schedule_worker(self):
-        """Рабочий поток для расписания"""
+    async def _schedule_worker(self):
+        """Цикл расписания в общем event loop"""
         logger.info("Запуск системы автоматических проверок...")
         logger.info("Время работы: 8:01 - 22:01 (МСК)")
         logger.info("Время отдыха: 23:00 - 7:00 (МСК)")
-        logger.info(f"Проверяем каждые {CHECK_INTERVAL_MINUTES} минут")
-        logger.info(f"Ищем посты за последние {LOOKBACK_MINUTES} минут")
+        logger.info(f"Публикуем точно по времени постов, синхронизация с таблицей каждые {SCHEDULER_RESYNC_MINUTES} минут")
         
-        while True:
+        # Цикл завершается и при потере лидерства: публикацию продолжит другая реплика
+        while not self._stop_event.is_set() and self._is_leader():
             try:
                 current_time = datetime.now(self.moscow_tz)
-                current_hour = current_time.hour
                 
                 # Для тестирования работаем всегда (убираем ограничение по времени)
-                logger.info(f"🕐 Время: {current_time.strftime('%H:%M')} - проверяем посты")
+                due_rows = self.scheduler.pop_due(current_time)
+                if due_rows:
+                    logger.info(f"🕐 Время: {current_time.strftime('%H:%M:%S')} - наступило время постов из строк {due_rows}")
+                else:
+                    logger.info(f"🕐 Время: {current_time.strftime('%H:%M:%S')} - плановая синхронизация с таблицей")
+                self.scheduler.mark_synced(current_time)
                 
-                # Запускаем обработку в отдельном потоке
-                thread = threading.Thread(target=self._run_process_posts_thread)
-                thread.daemon = True
-                thread.start()
-                thread.join()  # Ждем завершения
+                await self.process_pending_posts()
                 
-                # Ждем CHECK_INTERVAL_MINUTES минут до следующей проверки
-                time.sleep(CHECK_INTERVAL_MINUTES * 60)
+                # Спим до ближайшего поста или до плановой синхронизации
+                now = datetime.now(self.moscow_tz)
+                self._start_media_prefetch(now)
+                wakeup = self.scheduler.next_wakeup(now)
+                stats = self.scheduler.stats()
+                logger.info(
+                    f"📅 В очереди {stats['depth']} постов, следующий: {stats['next_due'] or 'нет'}, "
+                    f"просыпаемся в {wakeup.strftime('%H:%M:%S')} "
+                    f"(опоздание публикаций: среднее {stats['lateness_avg']} сек, макс. {stats['lateness_max']} сек)"
+                )
+                await self._sleep((wakeup - now).total_seconds())
                 
             except Exception as e:
                 logger.error(f"Ошибка в _schedule_worker: {e}")
-                time.sleep(CHECK_INTERVAL_MINUTES * 60)
+                await self._sleep(SCHEDULER_RESYNC_MINUTES * 60)
     
     async def run_scheduled_checks(self):
-        """Запускает проверки по расписанию"""
-        # Запускаем рабочий поток в фоне
-        schedule_thread = threading.Thread(target=self._schedule_worker)
-        schedule_thread.daemon = True
-        schedule_thread.start()
-        
-        # Основной поток ждет
-        try:
-            while True:
-                await asyncio.sleep(1)
-        except KeyboardInterrupt:
-            logger.info("Получен сигнал остановки")
+        """Запускает проверки по расписанию (до вызова stop())"""
+        await self._schedule_worker()
+        logger.info("Получен сигнал остановки")
     
     async def run_manual_check(self):
         """Запускает ручную проверку (для тестирования)"""
         logger.info("Запуск ручной проверки...")
         await self.process_pending_posts()
     
-    def run(self, manual=False):
-        """Основной метод запуска"""
+    def _start_media_prefetch(self, now: datetime):
+        """Запускает в фоне предзагрузку изображений постов, до которых осталось меньше MEDIA_PREFETCH_LEAD_MINUTES"""
+        if not self.media_cache or (self._prefetch_task and not self._prefetch_task.done()):
+            return
+        horizon = now + timedelta(minutes=MEDIA_PREFETCH_LEAD_MINUTES)
+        posts = [post for due_at, post in self._upcoming_posts if due_at <= horizon]
+        if posts:
+            self._prefetch_task = asyncio.create_task(self._prefetch_media(posts))
+    
+    async def _prefetch_media(self, posts):
+        """Скачивает и проверяет изображения постов; о битых ссылках сообщает заранее, один раз"""
+        try:
+            for post in posts:
+                result = await self.telegram_client.prefetch_images(post.image_urls)
+                for url, error in result.items():
+                    if error and url not in self._media_alerted:
+                        self._media_alerted.add(url)
+                        await self.notification_system.send_error_notification(
+                            f"Изображение поста не прошло проверку ({error}): {url}. "
+                            f"До публикации {post.date} {post.time} еще есть время заменить ссылку",
+                            post
+                        )
+        except Exception as e:
+            logger.error(f"Ошибка предзагрузки изображений: {e}")
+    
+    async def shutdown(self):
+        """Записывает накопленные статусы и закрывает соединения"""
+        try:
+            if self._prefetch_task and not self._prefetch_task.done():
+                self._prefetch_task.cancel()
+            if self.sheets_client:
+                await asyncio.to_thread(self.sheets_client.close)
+            if self.telegram_client:
+                await self.telegram_client.close()
+            if self.outbox:
+                self.outbox.close()
+            if self.media_cache:
+                await self.media_cache.close()
+            if self.render_cache:
+                self.render_cache.close()
+        except Exception as e:
+            logger.error(f"Ошибка при остановке: {e}")
+    
+    async def run_connection_test(self) -> bool:
+        """Проверка соединений (--test): ничего не публикует и не пишет в таблицу, соединения закрываются"""
+        try:
+            return await self.initialize(test_mode=True)
+        finally:
+            await self.shutdown()
+    
+    def stop(self):
+        """Останавливает цикл расписания (можно вызывать из другого потока)"""
+        if self._loop and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+    
+    async def _run(self, manual: bool):
+        """
+        Весь жизненный цикл в одном event loop: клиенты, пулы соединений
+        и кэши живут между циклами проверки и закрываются один раз при остановке
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
         try:
             # Инициализируем клиентов
-            if not asyncio.run(self.initialize()):
+            if not await self.initialize():
                 logger.error("Не удалось инициализировать клиенты")
                 return
             
             if manual:
                 # Ручная проверка
-                asyncio.run(self.run_manual_check())
+                await self.run_manual_check()
             else:
                 # Автоматические проверки по расписанию
-                asyncio.run(self.run_scheduled_checks())
-                
+                await self.run_scheduled_checks()
+        finally:
+            await self.shutdown()
+    
+    def run(self, manual=False):
+        """Основной метод запуска"""
+        try:
+            asyncio.run(self._run(manual))
         except KeyboardInterrupt:
             logger.info("Получен сигнал остановки")
         except Exception as e:
@@ -407,8 +618,10 @@ def main():
     if args.test:
         # Тестовый режим
         logger.info("Тестовый режим: проверка соединений...")
-        asyncio.run(automation.initialize())
-        logger.info("Тест завершен")
+        if asyncio.run(automation.run_connection_test()):
+            logger.info("Тест завершен")
+        else:
+            logger.error("Тест не пройден: см. ошибки выше")
     else:
         # Основной режим
         automation.run(manual=args.manual)
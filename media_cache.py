@@ -0,0 +1,213 @@
+"""
+Предзагрузка изображений постов и кэш file_id Telegram
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Union
+
+import aiohttp
+from telebot.types import InputFile
+
+logger = logging.getLogger(__name__)
+
+# Сигнатуры форматов, которые Telegram принимает как фото
+_IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+# Ограничение Telegram на размер фото, загружаемого ботом
+TELEGRAM_PHOTO_MAX_BYTES = 10 * 1024 * 1024
+
+
+def detect_image_format(data: bytes) -> Optional[str]:
+    """Формат изображения по первым байтам (None - не изображение)"""
+    for signature, extension in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+class PrefetchedImage:
+    """Загруженное и проверенное изображение"""
+    
+    __slots__ = ('data', 'content_hash', 'extension')
+    
+    def __init__(self, data: bytes, extension: str):
+        self.data = data
+        self.content_hash = hashlib.sha256(data).hexdigest()
+        self.extension = extension
+        
+    def as_input_file(self) -> InputFile:
+        # Новый файловый объект на каждую отправку: поток читается при загрузке до конца
+        return InputFile(io.BytesIO(self.data), file_name=f"image.{self.extension}")
+
+
+class MediaCache:
+    """
+    Изображения для постов.
+    prefetch() заранее (до времени поста) параллельно скачивает изображения
+    и проверяет, что это действительно картинка допустимого размера, и держит
+    их в памяти. При первой отправке Telegram получает файл, а file_id из
+    ответа сохраняется в SQLite по URL и по хэшу содержимого; все следующие
+    отправки (другие каналы, повторы, та же картинка по другой ссылке)
+    передают только file_id. resolve() выбирает лучший доступный источник:
+    file_id, загруженный файл или, если предзагрузка не удалась, исходный URL.
+    """
+    
+    def __init__(self, path: str, download_timeout: float = 20.0, max_bytes: int = TELEGRAM_PHOTO_MAX_BYTES,
+                 concurrency: int = 4, max_prefetched: int = 50):
+        self.path = path
+        self.download_timeout = download_timeout
+        self.max_bytes = max_bytes
+        self.concurrency = concurrency
+        self.max_prefetched = max_prefetched
+        
+        self._prefetched: 'OrderedDict[str, PrefetchedImage]' = OrderedDict()
+        self._failed: Dict[str, str] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS media ("
+            " url TEXT PRIMARY KEY,"
+            " content_hash TEXT,"
+            " file_id TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS media_content_hash ON media (content_hash)")
+        
+        # Метрики
+        self.stats = {'downloaded': 0, 'invalid': 0, 'file_id_hits': 0, 'uploads': 0, 'url_fallbacks': 0}
+        
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.download_timeout))
+        return self._session
+        
+    def file_id(self, url: str) -> Optional[str]:
+        """file_id, сохраненный для URL (или для того же содержимого по другому URL)"""
+        with self._lock:
+            row = self._conn.execute("SELECT file_id FROM media WHERE url = ?", (url,)).fetchone()
+            if row:
+                return row[0]
+            image = self._prefetched.get(url)
+            if image is None:
+                return None
+            row = self._conn.execute(
+                "SELECT file_id FROM media WHERE content_hash = ? ORDER BY updated_at DESC LIMIT 1",
+                (image.content_hash,)
+            ).fetchone()
+        if row:
+            # Та же картинка уже загружалась по другой ссылке
+            self.remember(url, row[0])
+            return row[0]
+        return None
+        
+    async def _download(self, url: str, semaphore: asyncio.Semaphore) -> Optional[str]:
+        """Скачивает и проверяет одно изображение. Возвращает текст ошибки или None"""
+        async with semaphore:
+            try:
+                async with self._get_session().get(url, allow_redirects=True) as response:
+                    if response.status != 200:
+                        return f"HTTP {response.status}"
+                    if response.content_length and response.content_length > self.max_bytes:
+                        return f"слишком большой файл ({response.content_length} байт)"
+                    data = await response.content.read(self.max_bytes + 1)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                return f"ошибка загрузки: {type(e).__name__}"
+                
+        if len(data) > self.max_bytes:
+            return f"слишком большой файл (больше {self.max_bytes} байт)"
+        extension = detect_image_format(data)
+        if extension is None:
+            return "по ссылке не изображение"
+            
+        self._prefetched[url] = PrefetchedImage(data, extension)
+        self._prefetched.move_to_end(url)
+        while len(self._prefetched) > self.max_prefetched:
+            self._prefetched.popitem(last=False)
+        return None
+        
+    async def prefetch(self, urls: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Параллельно скачивает и проверяет изображения, для которых еще нет file_id.
+        Возвращает {url: текст ошибки или None}
+        """
+        urls = [url for url in dict.fromkeys(urls) if url not in self._prefetched and not self.file_id(url)]
+        if not urls:
+            return {}
+        semaphore = asyncio.Semaphore(self.concurrency)
+        errors = await asyncio.gather(*(self._download(url, semaphore) for url in urls))
+        result = dict(zip(urls, errors))
+        
+        for url, error in result.items():
+            if error:
+                self.stats['invalid'] += 1
+                self._failed[url] = error
+                logger.warning(f"Изображение не прошло проверку ({error}): {url}")
+            else:
+                self.stats['downloaded'] += 1
+                self._failed.pop(url, None)
+        logger.info(f"Предзагружено изображений: {sum(1 for error in errors if not error)} из {len(urls)}")
+        return result
+        
+    def failure(self, url: str) -> Optional[str]:
+        """Ошибка последней предзагрузки URL (None - не было или прошла успешно)"""
+        return self._failed.get(url)
+        
+    def resolve(self, url: str) -> Union[str, InputFile]:
+        """Источник фото для отправки: file_id, загруженный файл или исходный URL"""
+        file_id = self.file_id(url)
+        if file_id:
+            self.stats['file_id_hits'] += 1
+            return file_id
+        image = self._prefetched.get(url)
+        if image is not None:
+            self.stats['uploads'] += 1
+            return image.as_input_file()
+        self.stats['url_fallbacks'] += 1
+        return url
+        
+    def remember(self, url: str, file_id: str):
+        """Сохраняет file_id, который Telegram вернул для изображения"""
+        image = self._prefetched.get(url)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO media (url, content_hash, file_id, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET content_hash = COALESCE(excluded.content_hash, media.content_hash), "
+                "file_id = excluded.file_id, updated_at = excluded.updated_at",
+                (url, image.content_hash if image else None, file_id, time.time())
+            )
+        # Файл больше не нужен: дальше отправляем по file_id
+        self._prefetched.pop(url, None)
+        
+    def remember_message(self, url: str, message: Any):
+        """Сохраняет file_id самого большого размера фото из отправленного сообщения"""
+        photo = getattr(message, 'photo', None)
+        if photo:
+            self.remember(url, photo[-1].file_id)
+            
+    def forget(self, url: str):
+        """Удаляет file_id, который Telegram перестал принимать"""
+        with self._lock:
+            self._conn.execute("DELETE FROM media WHERE url = ?", (url,))
+            
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        logger.info(f"Кэш изображений: {self.stats}")
+        with self._lock:
+            self._conn.close()
@@ -4,6 +4,8 @@
 import logging
 from typing import Dict, Any, Optional
 from telegram_client import TelegramClient
+from telegram_send_queue import PRIORITY_NOTIFICATION
+from post_record import Post
 from config import ADMIN_CHAT_ID, NOTIFICATION_CHANNEL_ID, ALERT_ADMIN_CHANNEL
 
 logger = logging.getLogger(__name__)
@@ -33,7 +35,7 @@ class NotificationSystem:
         except Exception as e:
             logger.error(f"Ошибка отправки информационного уведомления: {e}")
     
-    async def send_error_notification(self, message: str, post: Optional[Dict[str, Any]] = None):
+    async def send_error_notification(self, message: str, post: Optional[Post] = None):
         """Отправляет уведомление об ошибке"""
         try:
             error_message = f"❌ ОШИБКА ПУБЛИКАЦИИ\n\n"
@@ -41,16 +43,18 @@ class NotificationSystem:
             
             if post:
                 error_message += f"\nДетали поста:\n"
-                error_message += f"• Дата: {post.get('date', 'Неизвестно')}\n"
-                error_message += f"• Время: {post.get('time', 'Неизвестно')}\n"
-                error_message += f"• Длина: {len(post.get('text', ''))} символов\n"
-                error_message += f"• Изображения: {'да' if post.get('image_urls') else 'нет'}\n"
+                error_message += f"• Строка: {post.row_index}\n"
+                error_message += f"• Дата: {post.date or 'Неизвестно'}\n"
+                error_message += f"• Время: {post.time or 'Неизвестно'}\n"
+                error_message += f"• Длина: {len(post.text)} символов\n"
+                error_message += f"• Изображения: {'да' if post.has_images else 'нет'}\n"
             
             await self._send_notification(error_message, NotificationType.ERROR)
         except Exception as e:
             logger.error(f"Ошибка отправки уведомления об ошибке: {e}")
     
-    async def send_check_notification(self, total_pending: int, published_count: int, errors_count: int, current_time: str):
+    async def send_check_notification(self, total_pending: int, published_count: int, errors_count: int, current_time: str,
+                                      drain_seconds: Optional[float] = None):
         """Отправляет уведомление о результатах проверки в AlertChanel"""
         try:
             # Определяем статус проверки
@@ -70,6 +74,8 @@ class NotificationSystem:
             message += f"📝 <b>Найдено постов:</b> {total_pending}\n"
             message += f"✅ <b>Опубликовано:</b> {published_count}\n"
             message += f"❌ <b>Ошибок:</b> {errors_count}\n"
+            if drain_seconds is not None:
+                message += f"⏱ <b>Время публикации:</b> {drain_seconds:.1f} сек\n"
             
             if published_count > 0:
                 message += f"\n🎉 <b>Успешно опубликовано {published_count} постов!</b>"
@@ -84,14 +90,32 @@ class NotificationSystem:
         except Exception as e:
             logger.error(f"Ошибка отправки уведомления о проверке: {e}")
     
+    async def send_catchup_notification(self, mode: str, overdue: int, now_count: int, deferred_count: int,
+                                        skipped_count: int, completion: str):
+        """Отправляет уведомление о плане догоняющей публикации после простоя"""
+        try:
+            message = f"⏳ <b>ДОГОНЯЮЩАЯ ПУБЛИКАЦИЯ</b>\n\n"
+            message += f"📊 <b>Режим:</b> {mode}\n"
+            message += f"📝 <b>Просрочено постов:</b> {overdue}\n"
+            message += f"🚀 <b>Публикуем сейчас:</b> {now_count}\n"
+            message += f"🗓 <b>Отложено:</b> {deferred_count}\n"
+            message += f"⏭ <b>Пропущено:</b> {skipped_count}\n"
+            message += f"🏁 <b>Ожидаемое окончание:</b> {completion} (Москва)\n"
+            
+            await self._send_alert_notification(message)
+            
+        except Exception as e:
+            logger.error(f"Ошибка отправки уведомления о догоняющей публикации: {e}")
+    
     async def _send_alert_notification(self, message: str):
         """Отправляет уведомление в AlertChanel"""
         try:
             if self.alert_channel_id:
-                await self.telegram_client.bot.send_message(
+                await self.telegram_client.send(self.telegram_client.bot.send_message,
                     chat_id=self.alert_channel_id,
                     text=message,
-                    parse_mode='HTML'
+                    parse_mode='HTML',
+                    priority=PRIORITY_NOTIFICATION
                 )
                 logger.info("Уведомление о проверке отправлено в AlertChanel")
             else:
@@ -105,10 +129,11 @@ class NotificationSystem:
             # Сначала пытаемся отправить в канал уведомлений
             if self.notification_channel_id:
                 try:
-                    success = await self.telegram_client.bot.send_message(
+                    success = await self.telegram_client.send(self.telegram_client.bot.send_message,
                         chat_id=self.notification_channel_id,
                         text=message,
-                        parse_mode='HTML'
+                        parse_mode='HTML',
+                        priority=PRIORITY_NOTIFICATION
                     )
                     if success:
                         logger.info(f"Уведомление отправлено в канал: {notification_type}")
@@ -118,10 +143,11 @@ class NotificationSystem:
             
             # Если не получилось, отправляем в админский чат
             if self.admin_chat_id:
-                await self.telegram_client.bot.send_message(
+                await self.telegram_client.send(self.telegram_client.bot.send_message,
                     chat_id=self.admin_chat_id,
                     text=message,
-                    parse_mode='HTML'
+                    parse_mode='HTML',
+                    priority=PRIORITY_NOTIFICATION
                 )
                 logger.info(f"Уведомление отправлено в админский чат: {notification_type}")
             else:
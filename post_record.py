@@ -0,0 +1,170 @@
+"""
+Компактная запись поста из Google Sheets
+"""
+import logging
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional
+import pytz
+
+logger = logging.getLogger(__name__)
+
+MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+
+# Поддерживаемые форматы даты и времени в таблице
+PUBLISH_DATETIME_FORMATS = [
+    "%Y-%m-%d %H:%M",
+    "%d.%m.%Y %H:%M",
+    "%d.%m.%y %H:%M",  # Формат с коротким годом (20.09.25)
+    "%Y-%m-%d %H:%M:%S",
+]
+
+# Те же форматы в виде заранее скомпилированных регулярных выражений:
+# один match вместо перебора strptime с исключениями
+_ISO_DATETIME_RE = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})\s+(\d{1,2}):(\d{1,2})(?::(\d{1,2}))?')
+_DOTTED_DATETIME_RE = re.compile(r'(\d{1,2})\.(\d{1,2})\.(\d{4}|\d{2})\s+(\d{1,2}):(\d{1,2})')
+
+# Размер кэша разобранных пар (дата, время)
+PUBLISH_DATETIME_CACHE_SIZE = 16384
+
+# Порядок колонок в таблице (A:I)
+(COL_DATE, COL_TIME, COL_TEXT, COL_PROMPT_RU, COL_PROMPT_EN, COL_IMAGE_URLS, COL_STATUS,
+ COL_DESTINATIONS, COL_DESTINATION_STATUS) = range(9)
+
+# Заголовки колонок таблицы
+SHEET_HEADERS = ['Дата', 'Время', 'Пост', 'Промпт RU', 'Промпт EN', 'Изображение', 'Статус',
+                 'Каналы', 'Статус по каналам']
+
+_NOT_PARSED = object()
+
+
+def _match_publish_datetime(value: str) -> Optional[datetime]:
+    """Разбирает строку одним из поддерживаемых форматов (None, если ни один не подошел)"""
+    match = _DOTTED_DATETIME_RE.fullmatch(value)
+    if match:
+        day, month, year, hour, minute = match.groups()
+        year = int(year)
+        if len(match.group(3)) == 2:
+            # Как %y в strptime: 69-99 -> 19xx, 00-68 -> 20xx
+            year += 1900 if year >= 69 else 2000
+        return datetime(year, int(month), int(day), int(hour), int(minute))
+    
+    match = _ISO_DATETIME_RE.fullmatch(value)
+    if match:
+        year, month, day, hour, minute, second = match.groups()
+        return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second or 0))
+    return None
+
+
+@lru_cache(maxsize=PUBLISH_DATETIME_CACHE_SIZE)
+def parse_publish_datetime(date_str: str, time_str: str) -> Optional[datetime]:
+    """
+    Парсит дату и время поста в datetime с часовым поясом Москвы (None, если формат неизвестен).
+    Результат кэшируется, поэтому нераспознанная дата попадает в лог один раз, а не каждый цикл.
+    """
+    try:
+        parsed = _match_publish_datetime(f"{date_str} {time_str}")
+    except ValueError:
+        # Формат подошел, но значения вне диапазона (например, 31.02)
+        parsed = None
+    
+    if parsed is None:
+        logger.warning(f"Не удалось распарсить дату/время поста: {date_str} {time_str}")
+        return None
+    return MOSCOW_TZ.localize(parsed)
+
+
+class Post:
+    """
+    Пост из строки таблицы.
+    Хранит исходную строку как есть (без копирования в словарь), а поля,
+    требующие разбора (список изображений, время публикации), вычисляет
+    лениво и запоминает.
+    """
+    
+    __slots__ = ('row_index', '_row', '_image_urls', '_publish_at')
+    
+    def __init__(self, row: List[str], row_index: Optional[int] = None):
+        self.row_index = row_index
+        self._row = row
+        self._image_urls = None
+        self._publish_at = _NOT_PARSED
+        
+    @classmethod
+    def from_row(cls, row: List[str], row_index: Optional[int] = None) -> 'Post':
+        """Создает пост из строки таблицы (единый парсер для всех методов чтения)"""
+        return cls(row, row_index)
+        
+    def _cell(self, column: int) -> str:
+        """Возвращает значение колонки или пустую строку"""
+        return self._row[column] if len(self._row) > column else ''
+        
+    @property
+    def row(self) -> List[str]:
+        return self._row
+        
+    @property
+    def date(self) -> str:
+        return self._cell(COL_DATE)
+        
+    @property
+    def time(self) -> str:
+        return self._cell(COL_TIME)
+        
+    @property
+    def text(self) -> str:
+        return self._cell(COL_TEXT)
+        
+    @property
+    def prompt_ru(self) -> str:
+        return self._cell(COL_PROMPT_RU)
+        
+    @property
+    def prompt_en(self) -> str:
+        return self._cell(COL_PROMPT_EN)
+        
+    @property
+    def status(self) -> str:
+        return self._cell(COL_STATUS)
+        
+    @property
+    def image_urls(self) -> List[str]:
+        """Список URL изображений из колонки F (разбирается один раз)"""
+        if self._image_urls is None:
+            raw = self._cell(COL_IMAGE_URLS)
+            self._image_urls = [url.strip() for url in raw.split(',') if url.strip()] if raw else []
+        return self._image_urls
+        
+    @property
+    def has_images(self) -> bool:
+        return bool(self.image_urls)
+        
+    @property
+    def destinations(self) -> List[str]:
+        """Каналы из колонки H (пустой список - публиковать в каналы из конфигурации)"""
+        raw = self._cell(COL_DESTINATIONS)
+        return [dest.strip() for dest in raw.split(',') if dest.strip()] if raw else []
+        
+    @property
+    def destination_statuses(self) -> Dict[str, str]:
+        """Статусы по каналам из колонки I ("канал: статус; канал: статус")"""
+        statuses = {}
+        for item in self._cell(COL_DESTINATION_STATUS).split(';'):
+            dest, _, status = item.partition(':')
+            if dest.strip():
+                statuses[dest.strip()] = status.strip()
+        return statuses
+        
+    @property
+    def publish_at(self) -> Optional[datetime]:
+        """Время публикации с часовым поясом Москвы (None, если дата/время не заданы или не распознаны)"""
+        if self._publish_at is _NOT_PARSED:
+            if self.date and self.time:
+                self._publish_at = parse_publish_datetime(self.date, self.time)
+            else:
+                self._publish_at = None
+        return self._publish_at
+        
+    def __repr__(self) -> str:
+        return f"Post(row={self.row_index}, date={self.date!r}, time={self.time!r}, status={self.status!r})"
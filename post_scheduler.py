@@ -0,0 +1,133 @@
+"""
+Планировщик публикаций по времени постов (min-heap)
+"""
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from post_record import Post
+
+logger = logging.getLogger(__name__)
+
+
+class DueTimeScheduler:
+    """
+    Очередь ожидающих постов, упорядоченная по времени публикации.
+    Куча хранит (время, строка, версия); при повторной синхронизации
+    устаревшие записи не удаляются из кучи, а пропускаются при чтении
+    (ленивое удаление), поэтому sync() и pop_due() - O(log n) на пост.
+    Планировщик только подсказывает, когда проснуться: что именно
+    публиковать, решается по свежему чтению таблицы.
+    """
+    
+    def __init__(self, resync_interval: timedelta):
+        self.resync_interval = resync_interval
+        self._heap: List[Tuple[datetime, int, int]] = []
+        self._entries: Dict[int, Tuple[datetime, int]] = {}
+        self._version = 0
+        self._lock = threading.Lock()
+        self.last_sync: Optional[datetime] = None
+        
+        # Метрики опоздания публикаций (секунды после запланированного времени)
+        self.published = 0
+        self.lateness_total = 0.0
+        self.lateness_max = 0.0
+        
+    def sync(self, pending_posts: List[Post], due_overrides: Optional[Dict[int, datetime]] = None):
+        """
+        Заменяет очередь актуальным списком ожидающих постов из таблицы.
+        due_overrides - время публикации, назначенное вместо времени из таблицы
+        (например, планом догоняющей публикации)
+        """
+        due_overrides = due_overrides or {}
+        with self._lock:
+            self._version += 1
+            entries = {}
+            for post in pending_posts:
+                due_at = due_overrides.get(post.row_index, post.publish_at)
+                if due_at is None or post.row_index is None:
+                    continue
+                entries[post.row_index] = (due_at, self._version)
+                
+            # Куча перестраивается целиком, если устаревших записей стало больше актуальных
+            if len(self._heap) > 2 * len(entries) + 16:
+                self._heap = [(at, row, version) for row, (at, version) in entries.items()]
+                heapq.heapify(self._heap)
+            else:
+                for row, (at, version) in entries.items():
+                    heapq.heappush(self._heap, (at, row, version))
+            self._entries = entries
+            
+    def mark_synced(self, now: datetime):
+        """Отмечает обращение к таблице (в том числе неудачное или пропущенное по хэшу)"""
+        self.last_sync = now
+        
+    def _discard_stale(self):
+        """Убирает с вершины кучи записи, замененные последней синхронизацией"""
+        while self._heap:
+            at, row, version = self._heap[0]
+            if self._entries.get(row) == (at, version):
+                return
+            heapq.heappop(self._heap)
+            
+    def next_due(self) -> Optional[datetime]:
+        """Время ближайшего поста в очереди (None, если очередь пуста)"""
+        with self._lock:
+            self._discard_stale()
+            return self._heap[0][0] if self._heap else None
+            
+    def pop_due(self, now: datetime) -> List[int]:
+        """Извлекает строки постов, время которых наступило"""
+        due = []
+        with self._lock:
+            while True:
+                self._discard_stale()
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                _, row, _ = heapq.heappop(self._heap)
+                del self._entries[row]
+                due.append(row)
+        return due
+        
+    def next_resync(self) -> datetime:
+        """Время следующей плановой синхронизации с таблицей"""
+        return self.last_sync + self.resync_interval
+        
+    def next_wakeup(self, now: datetime) -> datetime:
+        """Ближайшее из: время следующего поста и плановая синхронизация"""
+        if self.last_sync is None:
+            return now
+        wakeup = self.next_resync()
+        due = self.next_due()
+        if due is not None and due < wakeup:
+            wakeup = due
+        return max(wakeup, now)
+        
+    @property
+    def depth(self) -> int:
+        """Количество постов в очереди"""
+        return len(self._entries)
+        
+    def record_published(self, post: Post, published_at: datetime):
+        """Учитывает опоздание публикации относительно времени поста"""
+        if post.publish_at is None:
+            return
+        lateness = max(0.0, (published_at - post.publish_at).total_seconds())
+        with self._lock:
+            self.published += 1
+            self.lateness_total += lateness
+            self.lateness_max = max(self.lateness_max, lateness)
+            
+    def stats(self) -> Dict[str, object]:
+        """Состояние очереди и метрики опоздания"""
+        next_due = self.next_due()
+        return {
+            'depth': self.depth,
+            'next_due': next_due.strftime('%Y-%m-%d %H:%M:%S') if next_due else None,
+            'next_resync': self.next_resync().strftime('%Y-%m-%d %H:%M:%S') if self.last_sync else None,
+            'published': self.published,
+            'lateness_avg': round(self.lateness_total / self.published, 1) if self.published else 0.0,
+            'lateness_max': round(self.lateness_max, 1),
+        }
@@ -0,0 +1,234 @@
+"""
+Журнал публикаций (outbox) в SQLite для защиты от повторной публикации
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from post_record import Post
+
+logger = logging.getLogger(__name__)
+
+# Состояния записи
+STATE_INTENT = "intent"  # Собираемся отправить (отправка могла пройти, а могла и нет)
+STATE_SENT = "sent"      # Telegram принял сообщения, статус в таблице еще не записан
+STATE_DONE = "done"      # Статус "Опубликовано" записан в таблицу
+STATE_PARTIAL = "partial"  # Часть сообщений поста в канале, повтор продолжит с шага, на котором была ошибка
+
+
+class PublishOutbox:
+    """
+    Журнал публикаций постов.
+    Перед отправкой записывается намерение (intent), после отправки - message_id
+    (sent), после записи статуса в таблицу - завершение (done). Каждая запись
+    фиксируется на диске до перехода к следующему шагу (synchronous=FULL),
+    поэтому после падения процесса известно, какие посты уже ушли в канал.
+    Запись определяется содержимым поста (дата, время, текст), номером строки
+    и набором каналов, поэтому две строки с одинаковым текстом и временем -
+    разные записи. Строки в таблице могут сдвигаться, поэтому при сверке после
+    перезапуска незавершенная запись без точного совпадения переносится на
+    ожидающий пост с тем же содержимым (см. reconcile).
+    Если отправка оборвалась посреди плана, запись остается в состоянии partial
+    с message_id уже отправленных сообщений и числом выполненных шагов по
+    каналам, чтобы повтор не публиковал их заново.
+    """
+    
+    def __init__(self, path: str, retention_days: int = 30):
+        self.path = path
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " post_key TEXT PRIMARY KEY,"
+            " row_index INTEGER,"
+            " state TEXT NOT NULL,"
+            " message_ids TEXT,"
+            " updated_at REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+        if 'progress' not in columns:
+            # Журнал от прежней версии: добавляем шаги плана для продолжения отправки
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN progress TEXT")
+        if 'content_key' not in columns:
+            # В прежней версии ключом записи был хэш содержимого - он и становится content_key
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN content_key TEXT")
+            self._conn.execute("UPDATE outbox SET content_key = post_key WHERE content_key IS NULL")
+        self._prune()
+        
+    @staticmethod
+    def content_key(post: Post) -> str:
+        """Хэш содержимого поста (дата, время, текст) - не зависит от номера строки"""
+        payload = '\x1f'.join((post.date, post.time, post.text))
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+        
+    @classmethod
+    def post_key(cls, post: Post) -> str:
+        """Ключ записи: содержимое, номер строки и каналы поста"""
+        payload = '\x1f'.join((cls.content_key(post), str(post.row_index), ','.join(sorted(post.destinations))))
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+        
+    def _prune(self):
+        """Удаляет завершенные и так и не повторенные частичные записи старше retention_days"""
+        cutoff = time.time() - self.retention_days * 86400
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM outbox WHERE state IN (?, ?) AND updated_at < ?", (STATE_DONE, STATE_PARTIAL, cutoff)
+            )
+            
+    def _write(self, post: Post, state: str,
+               message_ids: Optional[Dict[str, List[int]]] = None, progress: Optional[Dict[str, int]] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outbox (post_key, content_key, row_index, state, message_ids, progress, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(post_key) DO UPDATE SET row_index = excluded.row_index, state = excluded.state, "
+                "message_ids = COALESCE(excluded.message_ids, outbox.message_ids), "
+                "progress = COALESCE(excluded.progress, outbox.progress), updated_at = excluded.updated_at",
+                (self.post_key(post), self.content_key(post), post.row_index, state,
+                 json.dumps(message_ids) if message_ids is not None else None,
+                 json.dumps(progress) if progress is not None else None,
+                 time.time())
+            )
+            
+    def get_state(self, post: Post) -> Optional[str]:
+        """Состояние поста в журнале (None, если пост не отправлялся)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM outbox WHERE post_key = ?", (self.post_key(post),)
+            ).fetchone()
+        return row[0] if row else None
+        
+    def record_intent(self, post: Post):
+        """Фиксирует намерение отправить пост (до вызова Telegram API)"""
+        self._write(post, STATE_INTENT)
+        
+    def record_sent(self, post: Post, message_ids: Optional[Dict[str, List[int]]]):
+        """Фиксирует успешную отправку и message_id сообщений по каналам (None - оставить прежние)"""
+        self._write(post, STATE_SENT, message_ids)
+        
+    def record_partial(self, post: Post, message_ids: Dict[str, List[int]], progress: Dict[str, int]):
+        """
+        Фиксирует частичную отправку: message_id уже отправленных сообщений по каналам
+        и число выполненных шагов плана в каналах, куда пост ушел не полностью
+        """
+        self._write(post, STATE_PARTIAL, message_ids, progress)
+        
+    def get_partial(self, post: Post) -> Optional[Dict[str, dict]]:
+        """Частичная отправка поста: {'message_ids': {канал: [...]}, 'progress': {канал: шагов}} или None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT message_ids, progress FROM outbox WHERE post_key = ? AND state = ?",
+                (self.post_key(post), STATE_PARTIAL)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'message_ids': json.loads(row[0] or '{}'), 'progress': json.loads(row[1] or '{}')}
+        
+    def discard(self, post: Post):
+        """Удаляет запись: Telegram отклонил отправку, пост не опубликован"""
+        with self._lock:
+            self._conn.execute("DELETE FROM outbox WHERE post_key = ?", (self.post_key(post),))
+            
+    def mark_done(self, row_indices: List[int]):
+        """Отмечает завершенными отправленные посты, статус которых записан в таблицу"""
+        if not row_indices:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbox SET state = ?, updated_at = ? WHERE row_index = ? AND state = ?",
+                [(STATE_DONE, time.time(), row_index, STATE_SENT) for row_index in row_indices]
+            )
+            
+    def unfinished(self) -> Dict[str, Dict[str, object]]:
+        """Незавершенные записи: {post_key: {'content_key', 'row_index', 'state', 'message_ids'}}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT post_key, content_key, row_index, state, message_ids FROM outbox "
+                "WHERE state != ? ORDER BY row_index", (STATE_DONE,)
+            ).fetchall()
+        return {
+            post_key: {'content_key': content_key, 'row_index': row_index, 'state': state,
+                       'message_ids': json.loads(message_ids or '{}')}
+            for post_key, content_key, row_index, state, message_ids in rows
+        }
+        
+    def _move(self, old_key: str, post: Post):
+        """Переносит запись на пост с тем же содержимым в другой строке"""
+        post_key = self.post_key(post)
+        with self._lock:
+            # Завершенная запись прежней публикации этой строки больше не нужна
+            self._conn.execute("DELETE FROM outbox WHERE post_key = ? AND state = ?", (post_key, STATE_DONE))
+            self._conn.execute(
+                "UPDATE outbox SET post_key = ?, row_index = ?, updated_at = ? WHERE post_key = ?",
+                (post_key, post.row_index, time.time(), old_key)
+            )
+        
+    def reconcile(self, pending_posts: List[Post]) -> Dict[str, List[Post]]:
+        """
+        Сверяет журнал с ожидающими постами из таблицы после перезапуска.
+        Возвращает {'sent': [...], 'unknown': [...]}:
+        sent - посты уже в канале, осталось записать статус;
+        unknown - процесс упал во время отправки, результат неизвестен.
+        Частичные отправки не трогаем: их продолжит повтор строки.
+        Запись без точного совпадения (строки сдвинулись, пока процесс не работал)
+        переносится на ожидающий пост с тем же содержимым, не совпавший точно с
+        другой записью, - первую по порядку строк.
+        Отправленные записи, которых уже нет среди ожидающих, считаются завершенными.
+        """
+        unfinished = self.unfinished()
+        result = {'sent': [], 'unknown': []}
+        matched = {self.post_key(post) for post in pending_posts if self.post_key(post) in unfinished}
+        
+        for post in pending_posts:
+            post_key = self.post_key(post)
+            entry = unfinished.get(post_key)
+            if not entry:
+                moved = next((
+                    key for key, candidate in unfinished.items()
+                    if key not in matched and candidate['content_key'] == self.content_key(post)
+                ), None)
+                if moved is None:
+                    continue
+                entry = unfinished[moved]
+                logger.warning(
+                    f"Журнал публикаций: запись строки {entry['row_index']} перенесена на строку "
+                    f"{post.row_index} с тем же текстом и временем (строки в таблице сдвинулись)"
+                )
+                self._move(moved, post)
+                matched.add(moved)
+            if entry['state'] == STATE_SENT:
+                # Запоминаем текущий номер строки - по нему будет записан статус
+                self.record_sent(post, entry['message_ids'])
+                result['sent'].append(post)
+            elif entry['state'] == STATE_INTENT:
+                result['unknown'].append(post)
+                
+        # Статус в таблице уже не "Ожидает": отправленные завершены, незавершенные намерения не нужны
+        stale = [post_key for post_key in unfinished if post_key not in matched]
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbox SET state = ?, updated_at = ? WHERE post_key = ? AND state = ?",
+                [(STATE_DONE, time.time(), post_key, STATE_SENT) for post_key in stale]
+            )
+            self._conn.executemany(
+                "DELETE FROM outbox WHERE post_key = ? AND state = ?",
+                [(post_key, STATE_INTENT) for post_key in stale]
+            )
+            
+        if result['sent'] or result['unknown']:
+            logger.warning(
+                f"Журнал публикаций: {len(result['sent'])} постов уже отправлены, "
+                f"{len(result['unknown'])} с неизвестным результатом отправки"
+            )
+        return result
+        
+    def close(self):
+        with self._lock:
+            self._conn.close()
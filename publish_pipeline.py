@@ -0,0 +1,151 @@
+"""
+Конвейер публикации постов: отправка в Telegram с темпом на чат
+и параллельная пост-обработка (статусы в таблице, уведомления)
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from post_record import Post
+
+logger = logging.getLogger(__name__)
+
+SendFunc = Callable[[Post], Awaitable[bool]]
+FinalizeFunc = Callable[[Post, bool, Optional[Exception]], Awaitable[None]]
+
+
+class PublishPipeline:
+    """
+    Публикует пачку наступивших постов.
+    Посты одного чата отправляются строго по очереди (в порядке времени
+    публикации) и не чаще, чем раз в min_interval секунд; разные чаты
+    идут параллельно. Пост-обработка поста N (finalize) запускается
+    фоновой задачей и выполняется, пока отправляется пост N+1.
+    Статусы, накопленные в буфере, сбрасываются в фоне через flush
+    не чаще, чем раз в flush_interval секунд (бережем квоту записи).
+    """
+    
+    def __init__(self, send: SendFunc, finalize: FinalizeFunc, min_interval: float = 1.0,
+                 flush: Optional[Callable[[], Awaitable[Any]]] = None,
+                 flush_interval: float = 5.0, chat_of: Optional[Callable[[Post], Any]] = None,
+                 max_background: int = 10):
+        self.send = send
+        self.finalize = finalize
+        self.flush = flush
+        self.flush_interval = flush_interval
+        self.min_interval = min_interval
+        self.chat_of = chat_of or (lambda post: None)
+        self.max_background = max_background
+        
+        self._last_send: Dict[Any, float] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_requested = False
+        self._flushing = False
+        self._last_flush = 0.0
+        
+    @staticmethod
+    def _schedule_key(post: Post):
+        """Порядок публикации: время поста, затем номер строки"""
+        return (post.publish_at is None, post.publish_at or 0, post.row_index or 0)
+        
+    async def _pace(self, chat: Any):
+        """Выдерживает минимальный интервал между отправками в один чат"""
+        last = self._last_send.get(chat)
+        if last is not None:
+            wait = last + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        self._last_send[chat] = time.monotonic()
+        
+    def _request_flush(self):
+        """Запускает фоновый сброс статусов; если сброс уже идет - повторит его после"""
+        if not self.flush:
+            return
+        if self._flush_task and not self._flush_task.done():
+            self._flush_requested = True
+            return
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        
+    async def _flush_loop(self):
+        while True:
+            wait = self._last_flush + self.flush_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._flush_requested = False
+            self._flushing = True
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка фонового сброса статусов: {e}")
+            finally:
+                self._flushing = False
+                self._last_flush = time.monotonic()
+            if not self._flush_requested:
+                return
+                
+    async def _finalize(self, post: Post, success: bool, error: Optional[Exception],
+                        semaphore: asyncio.Semaphore):
+        async with semaphore:
+            try:
+                await self.finalize(post, success, error)
+            except Exception as e:
+                logger.error(f"Ошибка пост-обработки поста из строки {post.row_index}: {e}")
+            self._request_flush()
+            
+    async def _run_lane(self, chat: Any, posts: List[Post], report: Dict[str, Any],
+                        background: List[asyncio.Task], semaphore: asyncio.Semaphore):
+        """Отправляет посты одного чата по порядку"""
+        for post in posts:
+            await self._pace(chat)
+            error = None
+            try:
+                success = await self.send(post)
+            except Exception as e:
+                success, error = False, e
+                logger.error(f"Ошибка публикации поста из строки {post.row_index}: {e}")
+            report['published' if success else 'errors'] += 1
+            background.append(asyncio.create_task(self._finalize(post, success, error, semaphore)))
+            
+    async def run(self, posts: List[Post]) -> Dict[str, Any]:
+        """
+        Публикует посты и дожидается всей пост-обработки.
+        Возвращает {'published', 'errors', 'send_seconds', 'drain_seconds'}:
+        send_seconds - время до последней отправки, drain_seconds - до полного
+        завершения (включая уведомления и идущую запись статусов).
+        """
+        report = {'published': 0, 'errors': 0, 'send_seconds': 0.0, 'drain_seconds': 0.0}
+        if not posts:
+            return report
+            
+        lanes: Dict[Any, List[Post]] = defaultdict(list)
+        for post in sorted(posts, key=self._schedule_key):
+            lanes[self.chat_of(post)].append(post)
+            
+        started = time.monotonic()
+        background: List[asyncio.Task] = []
+        semaphore = asyncio.Semaphore(self.max_background)
+        
+        await asyncio.gather(*(
+            self._run_lane(chat, lane_posts, report, background, semaphore)
+            for chat, lane_posts in lanes.items()
+        ))
+        report['send_seconds'] = time.monotonic() - started
+        
+        await asyncio.gather(*background)
+        if self._flush_task and not self._flush_task.done():
+            if self._flushing:
+                self._flush_requested = False
+                await self._flush_task
+            else:
+                # Отложенный сброс не нужен: остаток статусов запишет итоговый сброс цикла
+                self._flush_task.cancel()
+        report['drain_seconds'] = time.monotonic() - started
+        
+        logger.info(
+            f"Очередь из {len(posts)} постов разобрана за {report['drain_seconds']:.1f} сек "
+            f"(отправка: {report['send_seconds']:.1f} сек, опубликовано: {report['published']}, "
+            f"ошибок: {report['errors']})"
+        )
+        return report
@@ -0,0 +1,70 @@
+"""
+Ограничитель частоты запросов (token bucket) и экспоненциальная задержка для повторов
+"""
+import asyncio
+import random
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Потокобезопасный token bucket.
+    Токены пополняются равномерно со скоростью rate_per_second до capacity.
+    reserve() сразу списывает токен и возвращает, сколько нужно подождать,
+    поэтому один и тот же bucket работает и из потоков, и из event loop.
+    """
+    
+    def __init__(self, rate_per_second: float, capacity: float = None, name: str = ""):
+        self.rate = rate_per_second
+        self.capacity = capacity if capacity is not None else max(rate_per_second, 1.0)
+        self.name = name
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        
+        # Метрики
+        self.throttled = 0
+        self.total_wait = 0.0
+        
+    @classmethod
+    def per_minute(cls, requests_per_minute: float, name: str = "") -> 'TokenBucket':
+        """Создает bucket под поминутную квоту (допускает всплеск до квоты минуты)"""
+        return cls(requests_per_minute / 60.0, capacity=requests_per_minute, name=name)
+        
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Списывает токены и возвращает время ожидания в секундах (0, если токены есть)"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            wait = -self._tokens / self.rate
+            self.throttled += 1
+            self.total_wait += wait
+            return wait
+            
+    def acquire(self, tokens: float = 1.0):
+        """Блокирующее ожидание токена (для синхронного кода)"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            logger.debug(f"Лимит {self.name}: ждем {wait:.2f} сек")
+            time.sleep(wait)
+            
+    async def acquire_async(self, tokens: float = 1.0):
+        """Ожидание токена без блокировки event loop"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            logger.debug(f"Лимит {self.name}: ждем {wait:.2f} сек")
+            await asyncio.sleep(wait)
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 32.0) -> float:
+    """Экспоненциальная задержка с джиттером для попытки attempt (начиная с 0)"""
+    delay = min(cap, base * (2 ** attempt))
+    return random.uniform(delay / 2, delay)
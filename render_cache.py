@@ -0,0 +1,198 @@
+"""
+Кэш готовых к отправке текстов постов (рендер при чтении таблицы, а не при публикации)
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, List, Optional
+
+from telegram_formatting import FormattedText, Span, compile_post
+
+logger = logging.getLogger(__name__)
+
+# Версия рендера входит в ключ: после изменения компилятора старые записи не используются
+RENDER_VERSION = 2
+
+
+def content_hash(text: str) -> str:
+    """Ключ кэша: хэш текста поста и версии рендера"""
+    return hashlib.sha256(f"{RENDER_VERSION}\0{text}".encode('utf-8')).hexdigest()
+
+
+class RenderedPost:
+    """
+    Разобранный текст поста: чистый текст и диапазоны форматирования.
+    HTML или MessageEntity для конкретного сообщения строит план отправки
+    из этого представления, поэтому отдельно они не хранятся
+    """
+    
+    __slots__ = ('content_hash', 'formatted')
+    
+    def __init__(self, content_hash: str, formatted: FormattedText):
+        self.content_hash = content_hash
+        self.formatted = formatted
+        
+    @classmethod
+    def render(cls, text: str, key: Optional[str] = None) -> 'RenderedPost':
+        """Разбирает текст поста один раз"""
+        return cls(key or content_hash(text), compile_post(text))
+        
+    def to_json(self) -> str:
+        return json.dumps({
+            'text': self.formatted.text,
+            'spans': [[span.type, span.start, span.end, span.url] for span in self.formatted.spans],
+        }, ensure_ascii=False)
+        
+    @classmethod
+    def from_json(cls, key: str, payload: str) -> 'RenderedPost':
+        data = json.loads(payload)
+        return cls(key, FormattedText(data['text'], [Span(*span) for span in data['spans']]))
+
+
+class RenderCache:
+    """
+    Готовые тексты постов по хэшу содержимого.
+    prepare() вызывается при чтении таблицы (и после генерации постов): новые
+    и измененные строки рендерятся один раз и сохраняются в SQLite, так что
+    при публикации get() только достает готовый результат из памяти или с
+    диска. Ключ - хэш текста, поэтому измененный текст просто получает новый
+    ключ; запись старого текста удаляется, когда на нее больше не ссылается
+    ни одна ожидающая строка таблицы (текст изменен, пост опубликован или строка
+    удалена). Рендеры, которые так и не попали в таблицу (например, после
+    генерации), удаляются через orphan_ttl_hours.
+    """
+    
+    def __init__(self, path: str, max_memory: int = 256, orphan_ttl_hours: float = 24):
+        self.path = path
+        self.max_memory = max_memory
+        self.orphan_ttl_hours = orphan_ttl_hours
+        self._memory: 'OrderedDict[str, RenderedPost]' = OrderedDict()
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS renders ("
+            " content_hash TEXT PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            " row_index INTEGER PRIMARY KEY,"
+            " content_hash TEXT NOT NULL)"
+        )
+        
+        # Метрики
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'rendered': 0, 'invalidated': 0, 'pruned': 0}
+        
+    def _remember(self, rendered: RenderedPost):
+        # prepare() работает в отдельном потоке, get() - в event loop
+        with self._lock:
+            self._memory[rendered.content_hash] = rendered
+            self._memory.move_to_end(rendered.content_hash)
+            while len(self._memory) > self.max_memory:
+                self._memory.popitem(last=False)
+                
+    def _lookup(self, key: str) -> Optional[RenderedPost]:
+        with self._lock:
+            rendered = self._memory.get(key)
+            if rendered is not None:
+                self._memory.move_to_end(key)
+        if rendered is not None:
+            self.stats['memory_hits'] += 1
+            return rendered
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM renders WHERE content_hash = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        try:
+            rendered = RenderedPost.from_json(key, row[0])
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Поврежденная запись кэша рендера {key[:12]}: {e} - рендерим заново")
+            return None
+        self.stats['disk_hits'] += 1
+        self._remember(rendered)
+        return rendered
+        
+    def get(self, text: str) -> RenderedPost:
+        """Готовый текст поста; если его еще нет (строка не проходила prepare), рендерит и сохраняет"""
+        key = content_hash(text)
+        rendered = self._lookup(key)
+        if rendered is None:
+            rendered = self._store(key, text)
+        return rendered
+        
+    def _store(self, key: str, text: str) -> RenderedPost:
+        rendered = RenderedPost.render(text, key)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO renders (content_hash, payload, created_at) VALUES (?, ?, ?)",
+                (key, rendered.to_json(), time.time())
+            )
+        self.stats['rendered'] += 1
+        self._remember(rendered)
+        return rendered
+        
+    def prepare_texts(self, texts: Iterable[str]) -> int:
+        """Рендерит тексты, которых еще нет в кэше. Возвращает число новых рендеров"""
+        rendered = 0
+        for text in dict.fromkeys(texts):
+            if not text:
+                continue
+            key = content_hash(text)
+            if self._lookup(key) is None:
+                self._store(key, text)
+                rendered += 1
+        return rendered
+        
+    def prepare(self, posts: List[Any]) -> int:
+        """
+        Рендерит новые и измененные посты из списка ожидающих публикации и удаляет
+        рендеры строк, которых в нем больше нет (текст изменен, пост опубликован
+        или строка удалена). Возвращает число новых рендеров
+        """
+        keys = {post.row_index: content_hash(post.text) for post in posts if post.text and post.row_index}
+        with self._lock:
+            previous = dict(self._conn.execute("SELECT row_index, content_hash FROM rows").fetchall())
+            
+        rendered = self.prepare_texts(post.text for post in posts if post.text)
+        
+        changed = {row: key for row, key in keys.items() if previous.get(row) != key}
+        gone = [row for row in previous if row not in keys]
+        # Старый текст строки больше не нужен, если его нет в других ожидающих строках
+        stale = {key for row, key in previous.items() if keys.get(row) != key} - set(keys.values())
+        orphan_cutoff = time.time() - self.orphan_ttl_hours * 3600
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO rows (row_index, content_hash) VALUES (?, ?)", changed.items()
+            )
+            self._conn.executemany("DELETE FROM rows WHERE row_index = ?", [(row,) for row in gone])
+            self._conn.executemany("DELETE FROM renders WHERE content_hash = ?", [(key,) for key in stale])
+            orphans = [row[0] for row in self._conn.execute(
+                "SELECT content_hash FROM renders WHERE created_at < ? "
+                "AND content_hash NOT IN (SELECT content_hash FROM rows)", (orphan_cutoff,)
+            )]
+            self._conn.executemany("DELETE FROM renders WHERE content_hash = ?", [(key,) for key in orphans])
+            self._conn.execute("COMMIT")
+            for key in stale.union(orphans):
+                self._memory.pop(key, None)
+        if stale:
+            self.stats['invalidated'] += len(stale)
+            logger.info(f"Удалено рендеров измененных, опубликованных и удаленных строк: {len(stale)}")
+        if orphans:
+            self.stats['pruned'] += len(orphans)
+            logger.info(f"Удалено рендеров без строки в таблице старше {self.orphan_ttl_hours} ч: {len(orphans)}")
+        if rendered:
+            logger.info(f"Подготовлено текстов постов: {rendered} (всего строк {len(keys)})")
+        return rendered
+        
+    def close(self):
+        logger.info(f"Кэш рендера постов: {self.stats}")
+        with self._lock:
+            self._conn.close()
@@ -14,6 +14,7 @@ import os
 from main import TelegramAutomation
 from telegram_command_handler import TelegramCommandHandler
 from health_check import run_health_server
+from leader_election import create_leader_elector
 
 # Настройка логирования
 logging.basicConfig(
@@ -29,45 +30,70 @@ logger = logging.getLogger(__name__)
 
 # Глобальная переменная для контроля работы
 running = True
+automation = None
+command_handler = None
+# Выбор ведущего: расписание и polling команд работают только у одной реплики
+leader = create_leader_elector()
 
 def signal_handler(signum, frame):
     """Обработчик сигналов для корректного завершения"""
     global running
     logger.info(f"Получен сигнал {signum}, завершаем работу...")
     running = False
+    if automation:
+        # Останавливаем расписание: статусы будут записаны, соединения закрыты
+        automation.stop()
+    if command_handler:
+        command_handler.stop_polling()
+
+def on_leadership_revoked():
+    """Лидерство потеряно - останавливаем публикацию и polling, ждем нового избрания"""
+    if automation:
+        automation.stop()
+    if command_handler:
+        command_handler.stop_polling()
+
+def wait_for_leadership() -> bool:
+    """Ждет, пока экземпляр станет ведущим (сразу True, если выбор ведущего отключен)"""
+    if leader is None:
+        return running
+    while running:
+        if leader.wait_for_leadership(timeout=5):
+            return running
+    return False
 
 def run_command_handler():
-    """Запуск обработчика команд в отдельном потоке"""
+    """Запуск обработчика команд в отдельном потоке (только на ведущей реплике)"""
+    global command_handler
     try:
         logger.info("Инициализация обработчика команд...")
-        handler = TelegramCommandHandler()
-        
-        # Небольшая задержка перед запуском polling
-        import time
-        time.sleep(5)
+        command_handler = TelegramCommandHandler()
         
-        logger.info("Запуск обработчика команд...")
-        handler.start_polling()
+        while wait_for_leadership():
+            logger.info("Запуск обработчика команд...")
+            command_handler.start_polling()
+            if leader is None:
+                break
+            # polling остановлен: потеряно лидерство или завершение работы
+            time.sleep(1)
     except Exception as e:
         logger.error(f"Ошибка в обработчике команд: {e}")
-        # Если ошибка 409, ждем и пробуем снова
-        if "409" in str(e) or "Conflict" in str(e):
-            logger.warning("Конфликт обнаружен, ожидание 60 секунд...")
-            time.sleep(60)
-            try:
-                handler = TelegramCommandHandler()
-                handler.start_polling()
-            except Exception as retry_e:
-                logger.error(f"Ошибка при повторной попытке: {retry_e}")
 
 def run_main_automation():
-    """Запуск основного приложения автоматизации"""
-    try:
-        automation = TelegramAutomation()
-        asyncio.run(automation.initialize())
-        automation.run()
-    except Exception as e:
-        logger.error(f"Ошибка в основном приложении: {e}")
+    """Запуск основного приложения автоматизации (только на ведущей реплике)"""
+    global automation
+    while wait_for_leadership():
+        try:
+            automation = TelegramAutomation(leader)
+            # run() сам инициализирует клиентов в том же event loop, где они работают
+            automation.run()
+        except Exception as e:
+            logger.error(f"Ошибка в основном приложении: {e}")
+        if leader is None:
+            break
+        if running:
+            logger.info("Публикация остановлена - ждем, пока экземпляр снова станет ведущим")
+            time.sleep(1)
 
 async def main():
     """Основная функция"""
@@ -89,13 +115,16 @@ async def main():
         health_thread.daemon = True
         health_thread.start()
         
+        if leader:
+            leader.on_revoked(on_leadership_revoked)
+            leader.start()
+        
         # Запускаем основное приложение в отдельном потоке
         automation_thread = threading.Thread(target=run_main_automation)
         automation_thread.daemon = True
         automation_thread.start()
         
         # Небольшая задержка перед запуском обработчика команд
-        import time
         time.sleep(10)
         
         # Запускаем обработчик команд в отдельном потоке
@@ -111,6 +140,9 @@ async def main():
     except Exception as e:
         logger.error(f"Критическая ошибка: {e}")
     finally:
+        if leader:
+            # Освобождаем аренду - другая реплика подхватит работу без ожидания ttl
+            leader.stop()
         logger.info("🛑 Система остановлена")
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+План отправки поста в Telegram
+
+Пост один раз разбирается в план: список вызовов Bot API с готовыми
+данными. Длина текста и подписей считается в UTF-16, как в Telegram. Поэтому
+план не содержит запросов, которые заведомо будут отклонены, и запасные попытки
+не нужны. План пишется в лог и может быть построен без отправки:
+    python send_planner.py post.txt --images https://.../1.jpg,https://.../2.jpg
+"""
+import argparse
+import json
+import logging
+from typing import Any, Dict, List
+
+from telegram_formatting import (
+    MESSAGE_TEXT_LIMIT, CAPTION_LIMIT, PREVIEW_ANCHOR, FormattedText, compile_post, sanitize, utf16_length
+)
+
+logger = logging.getLogger(__name__)
+
+# Способы передачи форматирования
+FORMAT_ENTITIES = "entities"      # Чистый текст + MessageEntity
+FORMAT_PARSE_MODE = "parse_mode"  # Telegram HTML
+
+# Telegram принимает в медиагруппе до 10 фото
+MEDIA_GROUP_LIMIT = 10
+
+# Методы Bot API, которые выполняет TelegramClient.execute_plan
+SEND_MESSAGE = "send_message"
+SEND_PHOTO = "send_photo"
+SEND_MEDIA_GROUP = "send_media_group"
+
+
+class SendCall:
+    """Один вызов Bot API: метод, параметры (без chat_id) и изображения"""
+    
+    __slots__ = ('method', 'params', 'image_urls', 'length', 'limit')
+    
+    def __init__(self, method: str, params: Dict[str, Any], image_urls: List[str] = None,
+                 length: int = 0, limit: int = 0):
+        self.method = method
+        self.params = params
+        self.image_urls = image_urls or []
+        self.length = length  # Длина текста или подписи в UTF-16
+        self.limit = limit
+        
+    def describe(self) -> str:
+        details = []
+        if self.image_urls:
+            details.append(f"фото {len(self.image_urls)}")
+        if self.limit:
+            details.append(f"{'подпись' if self.method != SEND_MESSAGE else 'текст'} {self.length}/{self.limit}")
+        entities = self.params.get('entities') or self.params.get('caption_entities')
+        if entities:
+            details.append(f"сущностей {len(entities)}")
+        if self.params.get('disable_web_page_preview') is False:
+            details.append("предпросмотр")
+        return f"{self.method}({', '.join(details)})"
+        
+    def to_dict(self) -> Dict[str, Any]:
+        params = {
+            key: [entity.to_dict() for entity in value] if key in ('entities', 'caption_entities') else value
+            for key, value in self.params.items()
+        }
+        return {'method': self.method, 'params': params, 'image_urls': self.image_urls}
+
+
+class SendPlan:
+    """План отправки поста: стратегия, вызовы по порядку и замечания"""
+    
+    __slots__ = ('strategy', 'calls', 'notes')
+    
+    def __init__(self, strategy: str, calls: List[SendCall], notes: List[str] = None):
+        self.strategy = strategy
+        self.calls = calls
+        self.notes = notes or []
+        
+    def describe(self) -> str:
+        description = f"{self.strategy}: " + " -> ".join(call.describe() for call in self.calls)
+        if self.notes:
+            description += f" ({'; '.join(self.notes)})"
+        return description
+        
+    def to_dict(self) -> Dict[str, Any]:
+        return {'strategy': self.strategy, 'calls': [call.to_dict() for call in self.calls], 'notes': self.notes}
+        
+    def __len__(self) -> int:
+        return len(self.calls)
+
+
+class SendPlanner:
+    """
+    Выбирает способ отправки поста по его содержимому:
+    без изображений - сообщения по 4096 символов; одно изображение -
+    предпросмотр по невидимой ссылке в начале текста; несколько - медиагруппа
+    с подписью до 1024 символов. Текст сверх лимита не обрезается, а уходит
+    следующими сообщениями, разрезанный по абзацам.
+    """
+    
+    def __init__(self, format_mode: str = FORMAT_ENTITIES):
+        if format_mode not in (FORMAT_ENTITIES, FORMAT_PARSE_MODE):
+            logger.warning(f"Неизвестный способ форматирования '{format_mode}', используем {FORMAT_ENTITIES}")
+            format_mode = FORMAT_ENTITIES
+        self.format_mode = format_mode
+        
+    def _text_params(self, part: FormattedText, limit: int, caption: bool = False) -> Dict[str, Any]:
+        """Текст части с форматированием в выбранном виде (проверен на лимит и правила Bot API)"""
+        clean = sanitize(part, limit)
+        text_key, entities_key = ('caption', 'caption_entities') if caption else ('text', 'entities')
+        if self.format_mode == FORMAT_ENTITIES:
+            return {text_key: clean.text, entities_key: clean.to_entities()}
+        return {text_key: clean.render_html(), 'parse_mode': 'HTML'}
+        
+    def _message(self, part: FormattedText, **params) -> SendCall:
+        params = {**self._text_params(part, MESSAGE_TEXT_LIMIT), **params}
+        return SendCall(SEND_MESSAGE, params, length=part.utf16_length, limit=MESSAGE_TEXT_LIMIT)
+        
+    def plan(self, formatted: FormattedText, image_urls: List[str] = None) -> SendPlan:
+        """План отправки подготовленного текста с изображениями (URL уже в том виде, в котором их получит Telegram)"""
+        image_urls = list(image_urls or [])
+        notes = []
+        if len(image_urls) > MEDIA_GROUP_LIMIT:
+            notes.append(f"изображений {len(image_urls)}, отправляем первые {MEDIA_GROUP_LIMIT}")
+            image_urls = image_urls[:MEDIA_GROUP_LIMIT]
+        formatted = formatted.strip()
+        if not formatted.text and not image_urls:
+            raise ValueError("пустой пост: нет ни текста, ни изображений")
+            
+        parts = []
+        if len(image_urls) > 1:
+            parts = formatted.split(MESSAGE_TEXT_LIMIT, first_limit=CAPTION_LIMIT)
+            params = self._text_params(parts[0], CAPTION_LIMIT, caption=True) if parts else {}
+            calls = [SendCall(SEND_MEDIA_GROUP, params, image_urls,
+                              length=parts[0].utf16_length if parts else 0, limit=CAPTION_LIMIT)]
+            calls += [self._message(part) for part in parts[1:]]
+            strategy = "медиагруппа"
+        elif image_urls and not formatted.text:
+            calls = [SendCall(SEND_PHOTO, {}, image_urls)]
+            strategy = "фото"
+        elif image_urls:
+            # Невидимый символ ссылки тоже входит в лимит
+            parts = formatted.split(MESSAGE_TEXT_LIMIT, first_limit=MESSAGE_TEXT_LIMIT - utf16_length(PREVIEW_ANCHOR))
+            calls = [self._message(parts[0].with_link_preview(image_urls[0]), disable_web_page_preview=False)]
+            calls[0].image_urls = image_urls
+            calls += [self._message(part) for part in parts[1:]]
+            strategy = "предпросмотр изображения"
+        else:
+            parts = formatted.split(MESSAGE_TEXT_LIMIT)
+            calls = [self._message(part) for part in parts]
+            strategy = "текст"
+            
+        if len(parts) > 1:
+            notes.append(f"текст разделен на {len(parts)} части по лимитам Telegram")
+        return SendPlan(strategy, calls, notes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='План отправки поста в Telegram (без отправки)')
+    parser.add_argument('text_file', help='Файл с текстом поста')
+    parser.add_argument('--images', default='', help='URL изображений через запятую')
+    parser.add_argument('--format', default=FORMAT_ENTITIES, choices=[FORMAT_ENTITIES, FORMAT_PARSE_MODE],
+                        help='Способ передачи форматирования')
+    args = parser.parse_args()
+    
+    with open(args.text_file, encoding='utf-8') as f:
+        text = f.read()
+    image_urls = [url.strip() for url in args.images.split(',') if url.strip()]
+    plan = SendPlanner(args.format).plan(compile_post(text), image_urls)
+    print(plan.describe())
+    print(json.dumps(plan.to_dict(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
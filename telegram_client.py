@@ -1,22 +1,119 @@
 """
 Клиент для работы с Telegram Bot API
 """
+import copy
+import json
 import logging
-from typing import List
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 import asyncio
+from telebot import asyncio_helper
 from telebot.async_telebot import AsyncTeleBot
 from telebot.types import InputMediaPhoto
-from config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHANNEL_ID
+from telegram_send_queue import TelegramSendQueue, PRIORITY_POST, is_retryable_send_error
+from render_cache import RenderedPost
+from send_planner import SendPlanner, SendPlan, SEND_MEDIA_GROUP, SEND_PHOTO
+from config import (
+    TELEGRAM_BOT_TOKEN, TELEGRAM_CHANNEL_ID, TELEGRAM_REQUEST_TIMEOUT_SECONDS, TELEGRAM_CONNECTION_LIMIT, TELEGRAM_FORMAT_MODE,
+    TELEGRAM_GLOBAL_MESSAGES_PER_SECOND, TELEGRAM_CHAT_MESSAGES_PER_MINUTE, TELEGRAM_CHAT_MIN_INTERVAL_SECONDS
+)
 
 logger = logging.getLogger(__name__)
 
+# Подпись медиагруппы или фото, отправляемая обычным сообщением (если изображения отпали)
+_CAPTION_TO_TEXT = {'caption': 'text', 'caption_entities': 'entities'}
+
+
+class SendResult:
+    """
+    Результат выполнения плана отправки.
+    steps_done - сколько шагов плана выполнено (вместе с пропущенными при продолжении),
+    message_ids - message_id сообщений, отправленных этим вызовом. При ошибке шага
+    error - ее текст, retryable - шаг точно не дошел до Telegram и его можно повторить
+    """
+    
+    __slots__ = ('message_ids', 'steps_done', 'total_steps', 'error', 'retryable')
+    
+    def __init__(self, message_ids: List[int], steps_done: int, total_steps: int,
+                 error: Optional[str] = None, retryable: bool = False):
+        self.message_ids = message_ids
+        self.steps_done = steps_done
+        self.total_steps = total_steps
+        self.error = error
+        self.retryable = retryable
+        
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.steps_done >= self.total_steps
+        
+    def __bool__(self) -> bool:
+        return self.ok
+
+
+class RequestLatencyStats:
+    """Задержка запросов к Bot API по методам (последние window замеров для перцентилей)"""
+    
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._counts: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        
+    def record(self, method: str, seconds: float, ok: bool):
+        self._samples.setdefault(method, deque(maxlen=self.window)).append(seconds)
+        self._counts[method] = self._counts.get(method, 0) + 1
+        if not ok:
+            self._errors[method] = self._errors.get(method, 0) + 1
+            
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """{метод: {'count', 'errors', 'avg_ms', 'p50_ms', 'p95_ms', 'max_ms'}}"""
+        result = {}
+        for method, samples in self._samples.items():
+            ordered = sorted(samples)
+            result[method] = {
+                'count': self._counts[method],
+                'errors': self._errors.get(method, 0),
+                'avg_ms': round(sum(ordered) / len(ordered) * 1000, 1),
+                'p50_ms': round(ordered[len(ordered) // 2] * 1000, 1),
+                'p95_ms': round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000, 1),
+                'max_ms': round(ordered[-1] * 1000, 1),
+            }
+        return result
+        
+    def summary(self) -> str:
+        """Строка для лога"""
+        return ', '.join(
+            f"{method}: {stats['count']} запр., p50 {stats['p50_ms']:.0f} мс, p95 {stats['p95_ms']:.0f} мс"
+            + (f", ошибок {stats['errors']}" if stats['errors'] else '')
+            for method, stats in sorted(self.snapshot().items())
+        ) or 'запросов не было'
+
+
 class TelegramClient:
     """Клиент для работы с Telegram Bot API"""
     
     def __init__(self):
         self.bot_token = TELEGRAM_BOT_TOKEN
         self.channel_id = self._normalize_channel_id(TELEGRAM_CHANNEL_ID)
+        # Один бот на процесс: все запросы (посты и уведомления) идут через общую
+        # aiohttp-сессию telebot с пулом keep-alive соединений
+        asyncio_helper.REQUEST_TIMEOUT = TELEGRAM_REQUEST_TIMEOUT_SECONDS
+        asyncio_helper.REQUEST_LIMIT = TELEGRAM_CONNECTION_LIMIT
         self.bot = AsyncTeleBot(self.bot_token)
+        self.latency = RequestLatencyStats()
+        # Все отправки (посты и уведомления) идут через одну очередь с лимитами Bot API
+        self.send_queue = TelegramSendQueue(
+            global_per_second=TELEGRAM_GLOBAL_MESSAGES_PER_SECOND,
+            chat_per_minute=TELEGRAM_CHAT_MESSAGES_PER_MINUTE,
+            chat_min_interval=TELEGRAM_CHAT_MIN_INTERVAL_SECONDS
+        )
+        # Кэш изображений и file_id (подключается в TelegramAutomation.initialize)
+        self.media_cache = None
+        # Кэш готовых текстов постов (подключается в TelegramAutomation.initialize)
+        self.render_cache = None
+        # Выбор способа отправки поста: один план вместо перебора методов с запасными попытками
+        self.send_planner = SendPlanner(TELEGRAM_FORMAT_MODE)
         logger.info(f"TelegramClient инициализирован с channel_id: {self.channel_id}")
     
     def _normalize_channel_id(self, channel_id: str) -> str:
@@ -37,6 +134,21 @@ class TelegramClient:
         
         return channel_id
     
+    def for_channel(self, channel_id: str) -> 'TelegramClient':
+        """
+        Клиент для публикации в другой канал/группу.
+        Бот, его сессия, очередь отправки и статистика задержек общие, отличается только channel_id.
+        """
+        client = copy.copy(self)
+        client.channel_id = self._normalize_channel_id(str(channel_id))
+        return client
+    
+    def rendered(self, text: str) -> RenderedPost:
+        """Готовый к отправке текст поста: из кэша (подготовлен при чтении таблицы) или рендер на месте"""
+        if self.render_cache is not None:
+            return self.render_cache.get(text)
+        return RenderedPost.render(text)
+    
     def _convert_google_drive_url(self, url: str) -> str:
         """
         Преобразует ссылку Google Drive в прямую ссылку на изображение
@@ -50,493 +162,161 @@ class TelegramClient:
             return direct_url
         return url
     
-    async def test_connection(self) -> bool:
-        """Проверяет соединение с Telegram Bot API"""
-        try:
-            bot_info = await self.bot.get_me()
-            logger.info(f"Бот подключен: @{bot_info.username}")
-            
-            # Проверяем доступ к каналу
-            try:
-                chat_info = await self.bot.get_chat(self.channel_id)
-                logger.info(f"Канал доступен: {chat_info.title} (ID: {chat_info.id})")
-                return True
-            except Exception as e:
-                logger.error(f"Ошибка доступа к каналу {self.channel_id}: {e}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Ошибка подключения к Telegram: {e}")
-            return False
-    
-    async def send_post(self, text: str, image_urls: List[str] = None) -> bool:
+    async def prefetch_images(self, image_urls: List[str]) -> Dict[str, Optional[str]]:
         """
-        Отправляет пост в Telegram канал (универсальный метод)
+        Заранее скачивает и проверяет изображения поста (см. MediaCache.prefetch).
+        Возвращает {исходный URL: текст ошибки или None} для загруженных сейчас изображений
         """
-        try:
-            if image_urls and len(image_urls) > 0:
-                return await self.send_image_post(text, image_urls)
-            else:
-                return await self.send_text_message(text)
-        except Exception as e:
-            logger.error(f"Ошибка отправки поста: {e}")
-            return False
+        if not self.media_cache:
+            return {}
+        converted = {self._convert_google_drive_url(url): url for url in image_urls}
+        result = await self.media_cache.prefetch(list(converted))
+        return {converted[url]: error for url, error in result.items()}
     
-    async def send_html_post_with_image(self, text: str, image_urls: List[str]) -> bool:
-        """
-        МЕТОД 1: Отправляет HTML пост С изображениями (для обеденных постов)
-        Изображение добавляется в конец поста с предпросмотром (~4000 символов)
-        """
-        try:
-            if not image_urls or len(image_urls) == 0:
-                logger.error("Нет изображений для HTML поста")
-                return False
-            
-            # Обрабатываем текст для постов с изображениями
-            processed_text = self._process_text_for_image_posts(text)
-            # Преобразуем ссылку Google Drive в прямую ссылку
-            image_url = self._convert_google_drive_url(image_urls[0])
-            
-            logger.info(f"Отправляем HTML пост с изображением: {image_url}")
-            logger.info(f"Длина текста: {len(processed_text)} символов")
-            
-            # Создаем новый экземпляр бота для этого запроса
-            bot = AsyncTeleBot(self.bot_token)
-            
-            # Используем невидимый символ в начале для предпросмотра изображения
-            # Это позволяет использовать до ~4000 символов текста
-            invisible_char = "&#8288;"  # Word Joiner - невидимый символ
-            message_text = f'<a href="{image_url}">{invisible_char}</a>{processed_text}'
-            
-            try:
-                await bot.send_message(
-                    chat_id=self.channel_id,
-                    text=message_text,
-                    parse_mode='HTML',
-                    disable_web_page_preview=False
-                )
-                
-                logger.info("HTML пост с изображением отправлен (невидимый символ + предпросмотр)")
-                return True
-                
-            except Exception as e:
-                logger.warning(f"Не удалось отправить с предпросмотром: {e}")
-                
-                # Если не получилось, пробуем отправить фото с подписью
-                try:
-                    # Ограничиваем длину подписи до 1000 символов для фото
-                    caption = processed_text[:1000] if len(processed_text) > 1000 else processed_text
-                    
-                    await bot.send_photo(
-                        chat_id=self.channel_id,
-                        photo=image_url,
-                        caption=caption,
-                        parse_mode='HTML'
-                    )
-                    
-                    # Если текст длиннее 1000 символов, отправляем остаток отдельным сообщением
-                    if len(processed_text) > 1000:
-                        remaining_text = processed_text[1000:]
-                        await bot.send_message(
-                            chat_id=self.channel_id,
-                            text=remaining_text,
-                            parse_mode='HTML'
-                        )
-                    
-                    logger.info("HTML пост с изображением отправлен как фото с подписью")
-                    return True
-                    
-                except Exception as e2:
-                    logger.error(f"Не удалось отправить как фото: {e2}")
-                    raise e2
-            
-        except Exception as e:
-            logger.error(f"Ошибка отправки HTML поста с изображением: {e}")
-            return False
+    def _photo_source(self, image_url: str) -> Any:
+        """Что передать в Telegram как фото: file_id, предзагруженный файл или URL"""
+        return self.media_cache.resolve(image_url) if self.media_cache else image_url
     
-    async def send_markdown_post(self, text: str) -> bool:
-        """
-        МЕТОД 2: Отправляет Markdown пост БЕЗ изображений (для утренних и вечерних постов)
-        """
-        try:
-            # Обрабатываем текст для Markdown постов
-            formatted_text = self.format_text_for_telegram_markdown(text)
-            
-            # Создаем новый экземпляр бота для этого запроса
-            bot = AsyncTeleBot(self.bot_token)
-            
-            await bot.send_message(
-                chat_id=self.channel_id,
-                text=formatted_text,
-                parse_mode='Markdown'
-            )
-            
-            logger.info("Markdown пост без изображения отправлен")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Ошибка отправки Markdown поста: {e}")
-            return False
+    def _usable_images(self, image_urls: List[str]) -> List[str]:
+        """Изображения без ошибки предзагрузки: битую ссылку Telegram все равно отклонит"""
+        if not self.media_cache:
+            return image_urls
+        usable = []
+        for image_url in image_urls:
+            error = self.media_cache.failure(image_url)
+            if error:
+                logger.warning(f"Изображение не прошло проверку ({error}), отправляем пост без него: {image_url}")
+            else:
+                usable.append(image_url)
+        return usable
     
-    async def send_markdown_post_with_multiple_images(self, text: str, image_urls: List[str]) -> bool:
-        """
-        МЕТОД 3: Отправляет Markdown пост С несколькими изображениями
-        Ограничение: до 1000 символов текста + медиагруппа с изображениями
-        """
-        try:
-            if not image_urls or len(image_urls) == 0:
-                logger.error("Нет изображений для поста с несколькими изображениями")
-                return False
-            
-            # Ограничиваем длину текста до 1000 символов
-            if len(text) > 1000:
-                text = text[:1000] + "..."
-                logger.warning(f"Текст обрезан до 1000 символов (было {len(text)} символов)")
-            
-            # Обрабатываем текст для Markdown постов
-            formatted_text = self.format_text_for_telegram_markdown(text)
-            
-            logger.info(f"Отправляем Markdown пост с {len(image_urls)} изображениями")
-            logger.info(f"Длина текста: {len(formatted_text)} символов")
-            
-            # Создаем новый экземпляр бота для этого запроса
-            bot = AsyncTeleBot(self.bot_token)
-            
-            # Создаем медиагруппу (до 10 изображений)
-            media_group = []
-            max_images = min(len(image_urls), 10)  # Telegram ограничивает до 10 изображений
-            
-            for i, image_url in enumerate(image_urls[:max_images]):
-                # Преобразуем ссылку Google Drive в прямую ссылку
-                converted_url = self._convert_google_drive_url(image_url)
-                
-                if i == 0:
-                    # Первое изображение с подписью
-                    media_group.append(InputMediaPhoto(
-                        media=converted_url,
-                        caption=formatted_text,
-                        parse_mode='Markdown'
-                    ))
-                else:
-                    # Остальные изображения без подписи
-                    media_group.append(InputMediaPhoto(
-                        media=converted_url
-                    ))
-            
-            # Отправляем медиагруппу
-            await bot.send_media_group(
-                chat_id=self.channel_id,
-                media=media_group
-            )
-            
-            logger.info(f"Markdown пост с {max_images} изображениями отправлен как медиагруппа")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Ошибка отправки Markdown поста с несколькими изображениями: {e}")
-            return False
+    def _remember_photos(self, image_urls: List[str], messages: List[Any]):
+        """Запоминает file_id отправленных фото, чтобы следующие отправки не загружали их заново"""
+        if not self.media_cache:
+            return
+        for image_url, message in zip(image_urls, messages):
+            self.media_cache.remember_message(image_url, message)
     
-    async def send_image_post(self, text: str, image_urls: List[str]) -> bool:
-        """
-        МЕТОД 1: Отправляет пост С изображениями
-        Использует HTML с невидимым символом (изображение внутри поста, до 4000 символов)
-        """
-        try:
-            if not image_urls or len(image_urls) == 0:
-                return False
-            
-            # Обрабатываем текст для постов с изображениями
-            processed_text = self._process_text_for_image_posts(text)
-            
-            # Используем HTML с невидимым символом (изображение внутри поста)
-            # Преобразуем ссылку Google Drive в прямую ссылку
-            image_url = self._convert_google_drive_url(image_urls[0])
-            invisible_char = "&#8288;"  # Word Joiner
-            
-            # Формируем сообщение с невидимой ссылкой (изображение внутри поста)
-            message_text = f'<a href="{image_url}">{invisible_char}</a>{processed_text}'
-            
-            # Создаем новый экземпляр бота для этого запроса
-            bot = AsyncTeleBot(self.bot_token)
-            
-            await bot.send_message(
-                chat_id=self.channel_id,
-                text=message_text,
-                parse_mode='HTML',
-                disable_web_page_preview=False
-            )
-            
-            logger.info("Пост с изображением отправлен через HTML с невидимым символом (до 4000 символов)")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Ошибка отправки поста с изображением: {e}")
-            return False
+    def _forget_photos(self, image_urls: List[str], error: Exception):
+        """Telegram отклонил file_id (например, файл удален) - следующая попытка пойдет по URL"""
+        if self.media_cache and 'file identifier' in str(error).lower():
+            for image_url in image_urls:
+                self.media_cache.forget(image_url)
     
-    async def send_text_message(self, text: str) -> bool:
-        """
-        МЕТОД 2: Отправляет пост БЕЗ изображений
-        Использует HTML конвертацию для форматирования
-        """
+    async def timed(self, request: Awaitable[Any]) -> Any:
+        """Выполняет запрос к Bot API и записывает его задержку (метод берется из имени корутины)"""
+        method = getattr(request, '__name__', 'request')
+        started = time.perf_counter()
+        ok = False
         try:
-            # Конвертируем Markdown в HTML для постов без изображений
-            formatted_text = self.format_text_for_telegram_html(text)
-            
-            # Создаем новый экземпляр бота для этого запроса
-            bot = AsyncTeleBot(self.bot_token)
-            
-            await bot.send_message(
-                chat_id=self.channel_id,
-                text=formatted_text,
-                parse_mode='HTML'
-            )
-            
-            logger.info("Пост без изображения отправлен через HTML конвертацию")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Ошибка отправки текстового поста: {e}")
-            return False
+            result = await request
+            ok = True
+            return result
+        finally:
+            self.latency.record(method, time.perf_counter() - started, ok)
     
-    def _process_text_for_image_posts(self, text: str) -> str:
+    async def send(self, method: Callable[..., Awaitable[Any]], priority: int = PRIORITY_POST, **kwargs) -> Any:
         """
-        Обрабатывает текст для постов с изображениями (HTML формат)
-        Валидирует и исправляет HTML теги для корректного отображения
+        Отправляет сообщение через общую очередь: method - метод бота (bot.send_message и т.п.),
+        kwargs - его аргументы (обязательно chat_id). При 429 очередь сама выждет retry_after и повторит
         """
-        # Заменяем <br> на переносы строк для лучшего отображения
-        text = text.replace('<br>', '\n')
-        text = text.replace('<br/>', '\n')
-        text = text.replace('<br />', '\n')
-        
-        # Удаляем только неподдерживаемые HTML теги, оставляем <b>, <i>, <u>
-        text = text.replace('<div>', '')
-        text = text.replace('</div>', '')
-        text = text.replace('<p>', '')
-        text = text.replace('</p>', '')
-        
-        # Обрабатываем списки
-        text = text.replace('<ul>', '')
-        text = text.replace('</ul>', '')
-        text = text.replace('<ol>', '')
-        text = text.replace('</ol>', '')
-        text = text.replace('<li>', '• ')
-        text = text.replace('</li>', '\n')
+        media = kwargs.get('media')
+        cost = len(media) if isinstance(media, list) else 1
         
-        # ВАЖНО: Валидируем и исправляем HTML теги
-        text = self._validate_html_tags(text)
+        def request():
+            # Загружаемые файлы перематываем: при повторе после 429 поток читается заново
+            for value in [*kwargs.values(), *(media if isinstance(media, list) else [])]:
+                upload = getattr(getattr(value, 'media', value), 'file', None)
+                if hasattr(upload, 'seek'):
+                    upload.seek(0)
+            return self.timed(method(**kwargs))
         
-        return text
+        return await self.send_queue.submit(kwargs.get('chat_id'), request, priority=priority, cost=cost)
     
-    def _validate_html_tags(self, text: str) -> str:
-        """
-        Валидирует и исправляет HTML теги для корректного парсинга Telegram
-        """
-        # Поддерживаемые теги
-        supported_tags = ['b', 'i', 'u', 'strong', 'em']
-        
-        for tag in supported_tags:
-            # Подсчитываем открывающие и закрывающие теги
-            open_tags = text.count(f'<{tag}>')
-            close_tags = text.count(f'</{tag}>')
-            
-            # Если есть незакрытые теги, закрываем их
-            if open_tags > close_tags:
-                missing_closes = open_tags - close_tags
-                text += f'</{tag}>' * missing_closes
-                logger.warning(f"Исправлено {missing_closes} незакрытых тегов <{tag}>")
-            
-            # Если есть лишние закрывающие теги, удаляем их
-            elif close_tags > open_tags:
-                # Удаляем лишние закрывающие теги с конца
-                extra_closes = close_tags - open_tags
-                for _ in range(extra_closes):
-                    text = text.rsplit(f'</{tag}>', 1)[0] + text.rsplit(f'</{tag}>', 1)[1]
-                logger.warning(f"Удалено {extra_closes} лишних закрывающих тегов </{tag}>")
-        
-        return text
-    
-    def format_text_for_telegram_markdown(self, text: str) -> str:
-        """
-        Обрабатывает текст для Markdown постов (без изображений)
-        """
-        # Заменяем HTML теги на Markdown
-        text = text.replace('<b>', '**')
-        text = text.replace('</b>', '**')
-        text = text.replace('<i>', '*')
-        text = text.replace('</i>', '*')
-        text = text.replace('<u>', '__')
-        text = text.replace('</u>', '__')
-        text = text.replace('<br>', '\n')
-        text = text.replace('<br/>', '\n')
-        text = text.replace('<br />', '\n')
-        
-        # Удаляем HTML теги
-        text = text.replace('<div>', '')
-        text = text.replace('</div>', '')
-        text = text.replace('<p>', '')
-        text = text.replace('</p>', '')
-        
-        return text
-    
-    def format_text_for_telegram_html(self, text: str) -> str:
-        """
-        Конвертирует Markdown в HTML для Telegram
-        """
-        import re
-        
-        # Жирный текст - исправляем парсинг
-        text = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', text)
-        
-        # Курсив - исправляем парсинг
-        text = re.sub(r'\*(.*?)\*', r'<i>\1</i>', text)
-        
-        # Подчеркнутый - исправляем парсинг
-        text = re.sub(r'__(.*?)__', r'<u>\1</u>', text)
-        
-        # Зачеркнутый - исправляем парсинг
-        text = re.sub(r'~~(.*?)~~', r'<s>\1</s>', text)
-        
-        # Моноширинный - исправляем парсинг
-        text = re.sub(r'`(.*?)`', r'<code>\1</code>', text)
-        
-        # Блок кода - исправляем парсинг
-        text = re.sub(r'```(.*?)```', r'<pre>\1</pre>', text, flags=re.DOTALL)
-        
-        # Ссылки
-        text = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'<a href="\2">\1</a>', text)
-        
-        # Цитаты - обрабатываем многострочные цитаты
-        text = re.sub(r'^> (.+?)$', r'<blockquote>\1</blockquote>', text, flags=re.MULTILINE)
-        
-        return text
-    
-    async def send_quote_post(self, text: str, image_urls: List[str] = None) -> bool:
-        """
-        СПЕЦИАЛЬНЫЙ МЕТОД: Отправляет цитату (пост, начинающийся с ">")
-        Цитаты могут быть с изображением или без
-        """
+    async def close(self):
+        """Закрывает HTTP-сессию бота (она общая для процесса и живет между циклами)"""
+        logger.info(f"Задержка запросов к Telegram: {self.latency.summary()}")
+        logger.info(f"Очередь отправки Telegram: {self.send_queue.stats()}")
+        await self.send_queue.close()
         try:
-            # Проверяем, что это действительно цитата
-            if not text.strip().startswith('>'):
-                logger.error("Это не цитата - текст не начинается с '>'")
-                return False
-            
-            # Обрабатываем текст для цитат
-            processed_text = self._process_text_for_quotes(text)
-            
-            # Создаем новый экземпляр бота для этого запроса
-            bot = AsyncTeleBot(self.bot_token)
-            
-            if image_urls and len(image_urls) > 0 and any(url.strip() for url in image_urls if url.strip()):
-                # Цитата с изображением - используем медиагруппу
-                return await self._send_quote_with_image(bot, processed_text, image_urls)
-            else:
-                # Цитата без изображения - обычное сообщение
-                return await self._send_quote_without_image(bot, processed_text)
-                
-        except Exception as e:
-            logger.error(f"Ошибка отправки цитаты: {e}")
-            return False
-    
-    async def _send_quote_without_image(self, bot, text: str) -> bool:
-        """Отправляет цитату без изображения"""
-        try:
-            # Обрабатываем текст для HTML цитат
-            formatted_text = self._process_text_for_quotes(text)
-            
-            await bot.send_message(
-                chat_id=self.channel_id,
-                text=formatted_text,
-                parse_mode='HTML'
-            )
-            
-            logger.info("Цитата без изображения отправлена")
-            return True
-            
+            await self.bot.close_session()
         except Exception as e:
-            logger.error(f"Ошибка отправки цитаты без изображения: {e}")
-            return False
+            logger.debug(f"Сессия бота не закрыта: {e}")
     
-    async def _send_quote_with_image(self, bot, text: str, image_urls: List[str]) -> bool:
-        """Отправляет цитату с изображением"""
+    async def test_connection(self) -> bool:
+        """Проверяет соединение с Telegram Bot API"""
         try:
-            # Обрабатываем текст для HTML цитат
-            formatted_text = self._process_text_for_quotes(text)
-            
-            # Для цитат с изображениями используем тот же подход, что и для обычных постов
-            # Это более надежно, чем медиагруппы с HTML
-            if len(image_urls) == 1:
-                # Одно изображение - используем HTML метод как для обычных постов
-                return await self.send_html_post_with_image(formatted_text, image_urls)
-            else:
-                # Несколько изображений - используем Markdown метод как для обычных постов
-                return await self.send_markdown_post_with_multiple_images(formatted_text, image_urls)
+            bot_info = await self.timed(self.bot.get_me())
+            logger.info(f"Бот подключен: @{bot_info.username}")
             
+            # Проверяем доступ к каналу
+            try:
+                chat_info = await self.timed(self.bot.get_chat(self.channel_id))
+                logger.info(f"Канал доступен: {chat_info.title} (ID: {chat_info.id})")
+                return True
+            except Exception as e:
+                logger.error(f"Ошибка доступа к каналу {self.channel_id}: {e}")
+                return False
+                
         except Exception as e:
-            logger.error(f"Ошибка отправки цитаты с изображением: {e}")
+            logger.error(f"Ошибка подключения к Telegram: {e}")
             return False
     
-    def _process_text_for_quotes(self, text: str) -> str:
-        """
-        Обрабатывает текст для цитат
-        Создает правильное форматирование цитат в Telegram (HTML)
-        """
-        # Убираем лишние пробелы и переносы
-        text = text.strip()
-        
-        # Обрабатываем цитаты - заменяем ">" на HTML форматирование
-        lines = text.split('\n')
-        processed_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            if line.startswith('>'):
-                # Убираем ">" и добавляем HTML форматирование цитаты
-                quote_text = line[1:].strip()
-                if quote_text:
-                    # Создаем цитату с HTML форматированием
-                    # Используем <blockquote> для создания цитаты в HTML
-                    processed_lines.append(f'<blockquote>{quote_text}</blockquote>')
-            else:
-                processed_lines.append(line)
-        
-        # Объединяем строки
-        result = '\n'.join(processed_lines)
-        
-        # Обрабатываем HTML теги для цитат
-        result = self._process_html_for_quotes(result)
-        
-        return result
+    def plan_post(self, text: str, image_urls: List[str] = None) -> SendPlan:
+        """План отправки поста из подготовленного текста (см. SendPlanner)"""
+        converted = [self._convert_google_drive_url(url) for url in image_urls or []]
+        return self.send_planner.plan(self.rendered(text).formatted, converted)
     
-    def _process_html_for_quotes(self, text: str) -> str:
+    async def execute_plan(self, plan: SendPlan, start: int = 0, dry_run: bool = False) -> SendResult:
         """
-        Обрабатывает HTML теги для цитат
+        Выполняет план отправки по шагам, начиная с шага start (продолжение после ошибки:
+        уже отправленные шаги не повторяются). На первой ошибке останавливается и
+        возвращает то, что успело уйти. dry_run - только записать план в лог, ничего не отправляя
         """
-        # Заменяем <br> на переносы строк
-        text = text.replace('<br>', '\n')
-        text = text.replace('<br/>', '\n')
-        text = text.replace('<br />', '\n')
-        
-        # Обрабатываем жирный текст
-        text = text.replace('<b>', '<b>')
-        text = text.replace('</b>', '</b>')
-        
-        # Обрабатываем курсив
-        text = text.replace('<i>', '<i>')
-        text = text.replace('</i>', '</i>')
-        
-        # Обрабатываем подчеркивание
-        text = text.replace('<u>', '<u>')
-        text = text.replace('</u>', '</u>')
+        logger.info(f"📋 План отправки в {self.channel_id}: {plan.describe()}")
+        if dry_run:
+            logger.info(json.dumps(plan.to_dict(), ensure_ascii=False))
+            return SendResult([], start, len(plan))
+        if start:
+            logger.info(f"Продолжаем отправку с шага {start + 1} из {len(plan)}")
         
-        # Удаляем неподдерживаемые теги
-        text = text.replace('<div>', '')
-        text = text.replace('</div>', '')
-        text = text.replace('<p>', '')
-        text = text.replace('</p>', '')
-        
-        # Убираем лишние переносы строк
-        text = text.replace('\n\n\n', '\n\n')
+        message_ids = []
+        for step in range(start, len(plan)):
+            call = plan.calls[step]
+            try:
+                if call.method in (SEND_MEDIA_GROUP, SEND_PHOTO):
+                    # Изображения, не прошедшие предзагрузку, не отправляем; число шагов плана
+                    # при этом не меняется, поэтому продолжение после ошибки идет с того же шага
+                    image_urls = self._usable_images(call.image_urls)
+                    if not image_urls:
+                        if not call.params:
+                            raise ValueError("ни одно изображение поста не прошло проверку, а текста нет")
+                        params = {_CAPTION_TO_TEXT.get(key, key): value for key, value in call.params.items()}
+                        messages = [await self.send(self.bot.send_message, chat_id=self.channel_id, **params)]
+                    else:
+                        try:
+                            if len(image_urls) > 1:
+                                # Подпись и ее форматирование - у первого фото; фото - file_id, загруженный файл или URL
+                                media = [
+                                    InputMediaPhoto(media=self._photo_source(url), **(call.params if i == 0 else {}))
+                                    for i, url in enumerate(image_urls)
+                                ]
+                                messages = await self.send(self.bot.send_media_group, chat_id=self.channel_id, media=media)
+                            else:
+                                messages = [await self.send(self.bot.send_photo, chat_id=self.channel_id,
+                                                            photo=self._photo_source(image_urls[0]), **call.params)]
+                        except Exception as e:
+                            self._forget_photos(image_urls, e)
+                            raise
+                        self._remember_photos(image_urls, messages)
+                else:
+                    messages = [await self.send(self.bot.send_message, chat_id=self.channel_id, **call.params)]
+            except Exception as e:
+                logger.error(f"Ошибка отправки поста (шаг {step + 1} из {len(plan)}, {call.describe()}): {e}")
+                if step:
+                    logger.error(f"До ошибки выполнено шагов: {step}, отправлены сообщения: {message_ids}")
+                return SendResult(message_ids, step, len(plan), str(e) or type(e).__name__, is_retryable_send_error(e))
+            message_ids.extend(message.message_id for message in messages)
         
-        return text
-    
+        logger.info(f"Пост отправлен ({plan.strategy}), сообщений: {len(message_ids)}")
+        return SendResult(message_ids, len(plan), len(plan))
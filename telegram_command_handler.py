@@ -206,14 +206,14 @@ class TelegramCommandHandler:
             
             # Подсчитываем статистику
             total_posts = len(all_posts)
-            published = sum(1 for post in all_posts if post.get('status') == 'Опубликовано')
-            pending = sum(1 for post in all_posts if post.get('status') == 'Ожидает')
-            errors = sum(1 for post in all_posts if post.get('status') == 'Ошибка')
+            published = sum(1 for post in all_posts if post.status == 'Опубликовано')
+            pending = sum(1 for post in all_posts if post.status == 'Ожидает')
+            errors = sum(1 for post in all_posts if post.status == 'Ошибка')
             
             # Группируем по датам
             posts_by_date = {}
             for post in all_posts:
-                date = post.get('date', 'Неизвестно')
+                date = post.date or 'Неизвестно'
                 if date not in posts_by_date:
                     posts_by_date[date] = 0
                 posts_by_date[date] += 1
@@ -274,18 +274,9 @@ class TelegramCommandHandler:
             self.bot.polling(none_stop=True, interval=1, timeout=20)
             
         except Exception as e:
+            # Конфликт 409 (второй getUpdates) исключает выбор ведущего в run_full_system.py:
+            # polling запускает только ведущая реплика
             logger.error(f"Ошибка при запуске бота: {e}")
-            # Если ошибка 409, ждем и пробуем снова
-            if "409" in str(e) or "Conflict" in str(e):
-                logger.warning("Обнаружен конфликт - другой экземпляр бота уже запущен")
-                logger.info("Ожидание 30 секунд перед повторной попыткой...")
-                import time
-                time.sleep(30)
-                logger.info("Повторная попытка запуска...")
-                try:
-                    self.bot.polling(none_stop=True, interval=1, timeout=20)
-                except Exception as retry_e:
-                    logger.error(f"Ошибка при повторной попытке: {retry_e}")
     
     def stop_polling(self):
         """Остановка бота"""
@@ -0,0 +1,559 @@
+"""
+Компилятор форматирования постов для Telegram
+
+Текст поста из таблицы (смесь Markdown и HTML от генератора) разбирается за
+один проход одним заранее скомпилированным регулярным выражением в
+промежуточное представление: чистый текст и список диапазонов форматирования.
+Из него за линейное время строится Telegram HTML, Markdown или MessageEntity.
+Диапазоны строятся через стек, поэтому вывод всегда правильно вложен и сбалансирован.
+"""
+import html
+import logging
+import re
+from bisect import bisect_left
+from typing import List, Optional, Tuple
+
+from telebot.types import MessageEntity
+
+logger = logging.getLogger(__name__)
+
+# Типы форматирования (совпадают с типами MessageEntity Bot API)
+BOLD = 'bold'
+ITALIC = 'italic'
+UNDERLINE = 'underline'
+STRIKETHROUGH = 'strikethrough'
+SPOILER = 'spoiler'
+CODE = 'code'
+PRE = 'pre'
+TEXT_LINK = 'text_link'
+BLOCKQUOTE = 'blockquote'
+
+# HTML-теги Telegram -> тип форматирования
+_HTML_TAGS = {
+    'b': BOLD, 'strong': BOLD,
+    'i': ITALIC, 'em': ITALIC,
+    'u': UNDERLINE, 'ins': UNDERLINE,
+    's': STRIKETHROUGH, 'strike': STRIKETHROUGH, 'del': STRIKETHROUGH,
+    'tg-spoiler': SPOILER,
+    'code': CODE, 'pre': PRE,
+    'a': TEXT_LINK,
+    'blockquote': BLOCKQUOTE,
+}
+
+# Тип форматирования -> HTML-тег при выводе
+_HTML_OUTPUT = {
+    BOLD: 'b', ITALIC: 'i', UNDERLINE: 'u', STRIKETHROUGH: 's', SPOILER: 'tg-spoiler',
+    CODE: 'code', PRE: 'pre', TEXT_LINK: 'a', BLOCKQUOTE: 'blockquote',
+}
+
+# Маркеры Markdown -> тип форматирования
+_MD_MARKERS = {'**': BOLD, '*': ITALIC, '__': UNDERLINE, '~~': STRIKETHROUGH, '||': SPOILER}
+
+# Классический Markdown Telegram (parse_mode='Markdown') поддерживает только эти типы, без вложенности
+_LEGACY_MARKDOWN = {BOLD: ('*', '*'), ITALIC: ('_', '_'), CODE: ('`', '`'), PRE: ('```\n', '\n```')}
+_LEGACY_MARKDOWN_ESCAPE_RE = re.compile(r'([_*`\[])')
+
+# Единое регулярное выражение токенизатора (порядок альтернатив важен).
+# Последняя альтернатива съедает обычный текст целиком, чтобы движок не пробовал
+# остальные альтернативы на каждой позиции
+_TOKEN_RE = re.compile(r"""
+      (?P<fence>```)
+    | (?P<backtick>`)
+    | (?P<br><br\s*/?>)
+    | (?P<tag></?(?P<tag_name>b|strong|i|em|u|ins|s|strike|del|tg-spoiler|code|pre|a|blockquote)(?P<tag_attrs>\s[^<>]*)?>)
+    | (?P<li><li(?:\s[^<>]*)?>)
+    | (?P<li_end></li>)
+    | (?P<block></?(?:p|div|ul|ol)(?:\s[^<>]*)?/?>)
+    | (?P<drop></?span(?:\s[^<>]*)?>)
+    | (?P<entity>&(?:\#\d{1,7}|\#x[0-9a-fA-F]{1,6}|amp|lt|gt|quot|apos|nbsp);)
+    | (?P<link>\[(?P<link_text>[^\[\]\n]+)\]\((?P<link_url>[^()\s]+)\))
+    | (?P<md>\*\*|__|~~|\|\||\*)
+    | (?P<quote>^[ \t]*>[ \t]?)
+    | (?P<newline>\n(?:[ \t]*\n)*)
+    | (?P<text>[^`<&\[*_~|>\n]+|.)
+""", re.VERBOSE | re.MULTILINE | re.IGNORECASE | re.DOTALL)
+
+# Символы, с которых начинается любая разметка: текст без них разбирать не нужно
+_MARKUP_CHARS_RE = re.compile(r'[`<&\[*_~|>]')
+# Серии обратных апострофов: токенизатор делит серию на ``` и одиночные `
+_BACKTICK_RUN_RE = re.compile(r'`+')
+# Несколько пустых строк подряд схлопываются в одну (как токен newline)
+_BLANK_LINES_RE = re.compile(r'\n(?:[ \t]*\n)+')
+
+_HREF_RE = re.compile(r"""href\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+
+# Лимиты Bot API в кодовых единицах UTF-16
+MESSAGE_TEXT_LIMIT = 4096
+CAPTION_LIMIT = 1024
+
+# Невидимый символ (Word Joiner), на который вешается ссылка для предпросмотра изображения
+PREVIEW_ANCHOR = '\u2060'
+
+# Символы вне BMP (эмодзи) занимают в UTF-16 две кодовые единицы
+_ASTRAL_RE = re.compile('[\U00010000-\U0010ffff]')
+
+_ENTITY_URL_RE = re.compile(r'^(?:https?|tg)://\S+$', re.IGNORECASE)
+# Сущности, которые не могут содержать другие сущности и быть их частью
+_EXCLUSIVE_ENTITIES = {CODE, PRE}
+
+
+class Span:
+    """Диапазон форматирования [start, end) в символах чистого текста"""
+    
+    __slots__ = ('type', 'start', 'end', 'url')
+    
+    def __init__(self, type: str, start: int, end: int, url: Optional[str] = None):
+        self.type = type
+        self.start = start
+        self.end = end
+        self.url = url
+        
+    def __repr__(self) -> str:
+        return f"Span({self.type}, {self.start}, {self.end}{', ' + self.url if self.url else ''})"
+
+
+class _Open:
+    """Открытое форматирование на стеке разбора"""
+    
+    __slots__ = ('type', 'piece', 'marker', 'placeholder', 'url')
+    
+    def __init__(self, type: str, piece: int, marker: str, placeholder: Optional[int] = None, url: str = None):
+        self.type = type
+        self.piece = piece              # Индекс фрагмента, с которого начинается диапазон
+        self.marker = marker            # Markdown-маркер, 'html' или '>' (цитата из Markdown)
+        self.placeholder = placeholder  # Фрагмент с текстом маркера (останется в тексте, если не закроется)
+        self.url = url
+
+
+def utf16_length(text: str) -> int:
+    """Длина строки в кодовых единицах UTF-16 (так считает лимиты и смещения Telegram)"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+class FormattedText:
+    """Промежуточное представление поста: чистый текст и вложенные диапазоны форматирования"""
+    
+    __slots__ = ('text', 'spans', '_astral', '_entities')
+    
+    def __init__(self, text: str, spans: List[Span]):
+        self.text = text
+        self.spans = spans
+        self._astral: Optional[List[int]] = None
+        self._entities: Optional[List[MessageEntity]] = None
+        
+    def _astral_positions(self) -> List[int]:
+        """Позиции символов вне BMP - по ним позиции в символах переводятся в UTF-16 (считаются один раз)"""
+        if self._astral is None:
+            self._astral = [match.start() for match in _ASTRAL_RE.finditer(self.text)]
+        return self._astral
+        
+    def _ordered_spans(self) -> List[Span]:
+        # Внешние диапазоны раньше внутренних: по началу, затем по убыванию конца
+        return sorted(self.spans, key=lambda span: (span.start, -span.end))
+        
+    def render_html(self) -> str:
+        """Telegram HTML (parse_mode='HTML'): текст экранирован, теги правильно вложены"""
+        text = self.text
+        out = []
+        pos = 0
+        stack: List[Span] = []
+        
+        def close_until(offset: int):
+            nonlocal pos
+            while stack and stack[-1].end <= offset:
+                span = stack.pop()
+                out.append(html.escape(text[pos:span.end], quote=False))
+                pos = span.end
+                out.append(f'</{_HTML_OUTPUT[span.type]}>')
+                
+        for span in self._ordered_spans():
+            close_until(span.start)
+            out.append(html.escape(text[pos:span.start], quote=False))
+            pos = span.start
+            tag = _HTML_OUTPUT[span.type]
+            if span.type == TEXT_LINK:
+                out.append(f'<a href="{html.escape(span.url or "", quote=True)}">')
+            else:
+                out.append(f'<{tag}>')
+            # Диапазоны вложены по построению; на всякий случай не даем выйти за родителя
+            if stack and span.end > stack[-1].end:
+                span = Span(span.type, span.start, stack[-1].end, span.url)
+            stack.append(span)
+        close_until(len(text))
+        out.append(html.escape(text[pos:], quote=False))
+        return ''.join(out)
+        
+    def render_markdown(self) -> str:
+        """
+        Классический Markdown Telegram (parse_mode='Markdown').
+        Он не поддерживает вложенность, подчеркивание, зачеркивание и цитаты:
+        выводятся только внешние диапазоны поддерживаемых типов, остальное - текстом.
+        """
+        text = self.text
+        out = []
+        pos = 0
+        covered = 0
+        for span in self._ordered_spans():
+            if span.start < covered:
+                continue  # Вложенный диапазон
+            if span.type == TEXT_LINK:
+                inner = text[span.start:span.end]
+                if ']' in inner:
+                    continue
+                out.append(_LEGACY_MARKDOWN_ESCAPE_RE.sub(r'\\\1', text[pos:span.start]))
+                out.append(f'[{inner}]({span.url})')
+            elif span.type in _LEGACY_MARKDOWN:
+                opener, closer = _LEGACY_MARKDOWN[span.type]
+                inner = text[span.start:span.end]
+                # Внутри сущности экранирование не работает: маркер внутри сломает разметку
+                if closer.strip() in inner:
+                    continue
+                out.append(_LEGACY_MARKDOWN_ESCAPE_RE.sub(r'\\\1', text[pos:span.start]))
+                out.append(f'{opener}{inner}{closer}')
+            else:
+                continue
+            pos = covered = span.end
+        out.append(_LEGACY_MARKDOWN_ESCAPE_RE.sub(r'\\\1', text[pos:]))
+        return ''.join(out)
+        
+    def to_entities(self) -> List[MessageEntity]:
+        """MessageEntity со смещениями и длинами в кодовых единицах UTF-16 (считаются один раз)"""
+        if self._entities is None:
+            astral = self._astral_positions()
+            entities = []
+            for span in self._ordered_spans():
+                offset, end = span.start, span.end
+                if astral:
+                    offset += bisect_left(astral, offset)
+                    end += bisect_left(astral, end)
+                entities.append(MessageEntity(
+                    type=span.type, offset=offset, length=end - offset,
+                    url=span.url if span.type == TEXT_LINK else None
+                ))
+            self._entities = entities
+        return list(self._entities)
+        
+    @property
+    def utf16_length(self) -> int:
+        return len(self.text) + len(self._astral_positions())
+        
+    def slice(self, start: int, end: int) -> 'FormattedText':
+        """Часть текста [start, end) с обрезанными по ней диапазонами"""
+        spans = [
+            Span(span.type, max(span.start, start) - start, min(span.end, end) - start, span.url)
+            for span in self.spans if span.start < end and span.end > start
+        ]
+        return FormattedText(self.text[start:end], [span for span in spans if span.end > span.start])
+        
+    def utf16_index(self, units: int) -> int:
+        """Наибольшая позиция в символах, до которой текст занимает не больше units единиц UTF-16"""
+        astral = self._astral_positions()
+        index = min(units, len(self.text))
+        # Каждый символ вне BMP до позиции добавляет единицу UTF-16
+        while index > 0 and index + bisect_left(astral, index) > units:
+            index -= 1
+        return index
+        
+    def strip(self) -> 'FormattedText':
+        """Текст без пробелов и переносов по краям (диапазоны сдвигаются)"""
+        text = self.text
+        start = len(text) - len(text.lstrip())
+        end = len(text.rstrip())
+        if start == 0 and end == len(text):
+            return self
+        return self.slice(start, max(start, end))
+        
+    def split(self, limit: int, first_limit: Optional[int] = None) -> List['FormattedText']:
+        """
+        Делит текст на части не длиннее limit единиц UTF-16 (первую - не длиннее first_limit).
+        Режет по абзацу, строке или пробелу ближе к лимиту; диапазоны переносятся в части
+        """
+        parts = []
+        rest = self.strip()
+        current = first_limit or limit
+        while rest.utf16_length > current:
+            cut = rest.utf16_index(current)
+            window = rest.text[:cut]
+            for separator in ('\n\n', '\n', ' '):
+                position = window.rfind(separator)
+                if position >= cut // 2:
+                    cut = position
+                    break
+            head = rest.slice(0, cut).strip()
+            if head.text:
+                parts.append(head)
+            rest = rest.slice(cut, len(rest.text)).strip()
+            current = limit
+        if rest.text:
+            parts.append(rest)
+        return parts
+        
+    def with_link_preview(self, url: str) -> 'FormattedText':
+        """Текст с невидимой ссылкой в начале: Telegram покажет предпросмотр url над текстом"""
+        shift = len(PREVIEW_ANCHOR)
+        spans = [Span(span.type, span.start + shift, span.end + shift, span.url) for span in self.spans]
+        return FormattedText(PREVIEW_ANCHOR + self.text, [Span(TEXT_LINK, 0, shift, url)] + spans)
+
+
+def _decode_entity(entity: str) -> str:
+    if entity == '&nbsp;':
+        return ' '
+    return html.unescape(entity)
+
+
+def _has_closing_marker(text: str, position: int, marker: str) -> bool:
+    """Есть ли после position закрывающий маркер кода (` или ```) так, как его увидит токенизатор"""
+    if marker == '```':
+        return text.find(marker, position) >= 0
+    # Одиночный ` остается от серии, длина которой не кратна трем
+    return any(len(run.group()) % 3 for run in _BACKTICK_RUN_RE.finditer(text, position))
+
+
+def compile_post(text: str) -> FormattedText:
+    """
+    Разбирает текст поста за один проход.
+    Понимает HTML-теги Telegram (<b>, <i>, <u>, <s>, <a href>, <code>, <pre>,
+    <blockquote>, <tg-spoiler> и синонимы), <br>, списки <li>, лишние блочные теги
+    (<p>, <div>, <ul>, ...), HTML-сущности и Markdown (**жирный**, *курсив*,
+    __подчеркнутый__, ~~зачеркнутый~~, ||спойлер||, `код`, ```блок```,
+    [текст](url), строки-цитаты "> ..."). Незакрытые HTML-теги закрываются в
+    конце текста, лишние закрывающие отбрасываются; непарные Markdown-маркеры
+    остаются обычным текстом.
+    """
+    if not text:
+        return FormattedText('', [])
+    if not _MARKUP_CHARS_RE.search(text):
+        # Быстрый путь: разметки нет, результат тот же, что у полного разбора
+        return FormattedText(_BLANK_LINES_RE.sub('\n\n', text).strip(), [])
+        
+    pieces: List[str] = []
+    stack: List[_Open] = []
+    spans: List[Tuple[str, int, int, Optional[str]]] = []  # (тип, фрагмент начала, фрагмент конца, url)
+    verbatim: Optional[_Open] = None  # Открытый code/pre: внутри разметка не разбирается
+    fence_newline = False  # Перенос строки сразу после ``` не входит в блок
+    verbatim_start = 0
+    
+    def open_span(type: str, marker: str, placeholder_text: Optional[str] = None, url: str = None):
+        placeholder = None
+        if placeholder_text is not None:
+            placeholder = len(pieces)
+            pieces.append(placeholder_text)
+        entry = _Open(type, len(pieces), marker, placeholder, url)
+        stack.append(entry)
+        return entry
+        
+    def close_span(entry: _Open):
+        """Закрывает entry; открытые внутри него диапазоны закрываются и открываются заново после"""
+        end = len(pieces)
+        if stack[-1] is entry:
+            # Частый случай - правильно вложенная разметка
+            stack.pop()
+            spans.append((entry.type, entry.piece, end, entry.url))
+            if entry.placeholder is not None:
+                pieces[entry.placeholder] = ''
+            return
+        index = stack.index(entry)
+        reopened = stack[index + 1:]
+        del stack[index:]
+        for inner in reversed(reopened):
+            spans.append((inner.type, inner.piece, end, inner.url))
+        spans.append((entry.type, entry.piece, end, entry.url))
+        if entry.placeholder is not None:
+            pieces[entry.placeholder] = ''
+        for inner in reopened:
+            # Продолжение диапазона без маркера в тексте: если не закроется, закроется в конце
+            stack.append(_Open(inner.type, end, inner.marker, None, inner.url))
+            
+    def find_open(type: str, marker: str) -> Optional[_Open]:
+        for entry in reversed(stack):
+            if entry.type == type and entry.marker == marker:
+                return entry
+        return None
+        
+    append = pieces.append
+    position = 0
+    length = len(text)
+    for match in _TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+        if kind == 'text':
+            continue
+        start, end = match.span()
+        if start > position:
+            append(text[position:start])
+        position = end
+        token = match.group()
+        
+        if verbatim is not None:
+            # Внутри кода распознаем только закрывающий маркер и HTML-сущности (в HTML-коде)
+            closing = (
+                (kind == 'fence' and verbatim.marker == '```')
+                or (kind == 'backtick' and verbatim.marker == '`')
+                or (kind == 'tag' and verbatim.marker == 'html' and token.startswith('</')
+                    and _HTML_TAGS[match.group('tag_name').lower()] == verbatim.type)
+            )
+            if closing:
+                close_span(verbatim)
+                verbatim = None
+            elif kind == 'entity' and verbatim.marker == 'html':
+                append(_decode_entity(token))
+            elif kind == 'newline' and fence_newline and start == verbatim_start:
+                append(token[1:])
+            else:
+                append(token)
+            continue
+            
+        # Ветки по убыванию частоты токенов в постах генератора
+        if kind == 'tag':
+            type = _HTML_TAGS[match.group('tag_name').lower()]
+            if token[1] == '/':
+                entry = find_open(type, 'html')
+                if entry is not None:
+                    close_span(entry)
+            elif type == BLOCKQUOTE and (find_open(BLOCKQUOTE, 'html') or find_open(BLOCKQUOTE, '>')):
+                continue  # Цитаты не вкладываются
+            else:
+                url = None
+                if type == TEXT_LINK:
+                    href = _HREF_RE.search(match.group('tag_attrs') or '')
+                    url = html.unescape(next(group for group in href.groups() if group is not None)) if href else None
+                    if not url:
+                        continue
+                entry = open_span(type, 'html', url=url)
+                if type in (CODE, PRE):
+                    verbatim = entry
+        elif kind == 'md':
+            type = _MD_MARKERS[token]
+            entry = find_open(type, token)
+            if entry is not None and start and not text[start - 1].isspace():
+                close_span(entry)
+            elif position < length and not text[position].isspace():
+                open_span(type, token, placeholder_text=token)
+            else:
+                append(token)
+        elif kind == 'newline':
+            if stack:
+                quote = find_open(BLOCKQUOTE, '>')
+                if quote is not None and not text[position:position + 8].lstrip(' \t').startswith('>'):
+                    close_span(quote)
+            append('\n\n' if token.count('\n') > 1 else '\n')
+        elif kind == 'quote':
+            if find_open(BLOCKQUOTE, '>') is None and find_open(BLOCKQUOTE, 'html') is None:
+                open_span(BLOCKQUOTE, '>')
+        elif kind == 'backtick' or kind == 'fence':
+            if not _has_closing_marker(text, position, token):
+                # Непарный маркер кода - обычный текст, разметка после него разбирается
+                append(token)
+                continue
+            verbatim = open_span(CODE if kind == 'backtick' else PRE, token, placeholder_text=token)
+            fence_newline = kind == 'fence'
+            verbatim_start = position
+        elif kind == 'link':
+            entry = open_span(TEXT_LINK, 'link', url=match.group('link_url'))
+            append(match.group('link_text'))
+            close_span(entry)
+        elif kind == 'br' or kind == 'li_end':
+            append('\n')
+        elif kind == 'li':
+            append('• ')
+        elif kind == 'block':
+            # Блочные теги (<p>, <div>, списки) - с новой строки
+            last = next((piece for piece in reversed(pieces) if piece), '')
+            if last and not last.endswith('\n'):
+                append('\n')
+        elif kind == 'entity':
+            append(_decode_entity(token))
+        # drop: теги без аналога в Telegram просто убираем
+        
+    if position < length:
+        pieces.append(text[position:])
+        
+    # Незакрытые маркеры Markdown остаются текстом, незакрытые теги закрываются в конце
+    end = len(pieces)
+    for entry in reversed(stack):
+        if entry.placeholder is None:
+            spans.append((entry.type, entry.piece, end, entry.url))
+            
+    # Смещения фрагментов - один проход по списку
+    offsets = [0] * (len(pieces) + 1)
+    total = 0
+    for index, piece in enumerate(pieces):
+        offsets[index] = total
+        total += len(piece)
+    offsets[len(pieces)] = total
+    plain = ''.join(pieces)
+    
+    # Telegram обрезает пробелы по краям сообщения - обрезаем сами, чтобы смещения совпадали
+    stripped = plain.strip()
+    lead = len(plain) - len(plain.lstrip())
+    result = []
+    for type, first, last, url in spans:
+        start = min(max(offsets[first] - lead, 0), len(stripped))
+        stop = min(max(offsets[last] - lead, 0), len(stripped))
+        if stop > start and stripped[start:stop].strip():
+            result.append(Span(type, start, stop, url))
+    return FormattedText(stripped, result)
+
+
+def validate_entities(text: str, entities: List[MessageEntity],
+                      limit: int = MESSAGE_TEXT_LIMIT) -> Tuple[List[str], List[MessageEntity]]:
+    """
+    Проверяет текст и сущности по правилам Bot API до отправки.
+    Возвращает (ошибки текста, сущности, которые Telegram отклонит); ошибки
+    текста (пустой или длиннее limit) исправить нельзя, плохие сущности можно отбросить.
+    """
+    errors = []
+    total = utf16_length(text)
+    if not text.strip():
+        errors.append("пустой текст")
+    if total > limit:
+        errors.append(f"текст длиннее лимита ({total} > {limit} UTF-16)")
+
+    invalid = []
+    for entity in entities:
+        if (entity.type not in _HTML_OUTPUT or entity.offset < 0 or entity.length <= 0
+                or entity.offset + entity.length > total
+                or (entity.type == TEXT_LINK and not _ENTITY_URL_RE.match(entity.url or ''))):
+            invalid.append(entity)
+
+    # Вложенность: code/pre ни с чем не пересекаются, ссылки и цитаты не вкладываются в себе подобные.
+    # Из двух конфликтующих сущностей отбрасываем внутреннюю
+    rejected = {id(entity) for entity in invalid}
+    ordered = sorted((entity for entity in entities if id(entity) not in rejected),
+                     key=lambda entity: (entity.offset, -entity.length))
+    count = len(ordered)
+    for index, outer in enumerate(ordered):
+        if id(outer) in rejected:
+            continue
+        end = outer.offset + outer.length
+        for inner_index in range(index + 1, count):
+            inner = ordered[inner_index]
+            if inner.offset >= end:
+                break
+            if id(inner) in rejected:
+                continue
+            if (outer.type in _EXCLUSIVE_ENTITIES or inner.type in _EXCLUSIVE_ENTITIES
+                    or (outer.type == inner.type and outer.type in (TEXT_LINK, BLOCKQUOTE))):
+                rejected.add(id(inner))
+                invalid.append(inner)
+    return errors, invalid
+
+
+def sanitize(formatted: FormattedText, limit: int = MESSAGE_TEXT_LIMIT) -> FormattedText:
+    """
+    Текст, который Telegram примет: диапазоны, которые он отклонил бы, отбрасываются
+    (текст остается); если сам текст не пройдет (пустой или длиннее limit), ValueError - до запроса
+    """
+    ordered = formatted._ordered_spans()
+    entities = formatted.to_entities()  # В том же порядке, что и ordered
+    errors, invalid = validate_entities(formatted.text, entities, limit)
+    if errors:
+        raise ValueError("; ".join(errors))
+    if not invalid:
+        return formatted
+    logger.warning(f"Отброшено некорректных сущностей форматирования: {len(invalid)}")
+    rejected = {id(entity) for entity in invalid}
+    kept = [(span, entity) for span, entity in zip(ordered, entities) if id(entity) not in rejected]
+    clean = FormattedText(formatted.text, [span for span, _ in kept])
+    # Порядок оставшихся диапазонов тот же, поэтому сущности пересчитывать не нужно
+    clean._entities = [entity for _, entity in kept]
+    return clean
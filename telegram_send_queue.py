@@ -0,0 +1,261 @@
+"""
+Общая очередь исходящих сообщений Telegram с лимитами Bot API и учетом retry_after
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from telebot.asyncio_helper import ApiTelegramException
+
+from rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты (меньше - раньше): посты в каналы идут раньше уведомлений администраторам
+PRIORITY_POST = 0
+PRIORITY_NOTIFICATION = 10
+
+_PRIORITY_NAMES = {PRIORITY_POST: 'posts', PRIORITY_NOTIFICATION: 'notifications'}
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """retry_after из ответа 429 Too Many Requests (None - это не ограничение частоты)"""
+    if not isinstance(error, ApiTelegramException) or error.error_code != 429:
+        return None
+    parameters = (error.result_json or {}).get('parameters') or {}
+    return float(parameters.get('retry_after', 1))
+
+
+def is_retryable_send_error(error: Exception) -> bool:
+    """
+    Можно ли повторить отправку без риска дубля: Bot API ответил временной
+    ошибкой (429, 5xx), значит сообщение не отправлено. Таймаут и обрыв
+    соединения telebot сообщает одинаково (RequestTimeout) - запрос мог дойти,
+    поэтому такие ошибки не повторяем
+    """
+    return isinstance(error, ApiTelegramException) and (error.error_code == 429 or error.error_code >= 500)
+
+
+class _SendJob:
+    __slots__ = ('priority', 'seq', 'chat_id', 'cost', 'factory', 'future', 'enqueued_at', 'attempts')
+    
+    def __init__(self, priority: int, seq: int, chat_id: Any, cost: int,
+                 factory: Callable[[], Awaitable[Any]], future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.cost = cost
+        self.factory = factory
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+        
+    def __lt__(self, other: '_SendJob') -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class TelegramSendQueue:
+    """
+    Очередь отправки сообщений для всего процесса.
+    Соблюдает лимиты Bot API: не больше global_per_second сообщений в секунду
+    на бота, не чаще одного сообщения в chat_min_interval секунд и не больше
+    chat_per_minute сообщений в минуту в один чат. Сообщения одного чата уходят
+    строго по очереди (медиагруппа, затем остаток текста), разные чаты -
+    параллельно. У каждого чата своя куча задач, а в общей куче лежат только
+    первые задачи чатов, поэтому выбор следующей отправки перебирает чаты,
+    а не все сообщения. Выбирается задача с наивысшим приоритетом среди
+    чатов, в которые уже можно писать. На 429 чат блокируется ровно на
+    retry_after секунд, а сообщение возвращается в очередь на свое место.
+    """
+    
+    def __init__(self, global_per_second: float = 30.0, chat_per_minute: int = 20,
+                 chat_min_interval: float = 1.0, max_rate_limit_retries: int = 5):
+        self.chat_per_minute = chat_per_minute
+        self.chat_min_interval = chat_min_interval
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self._global = TokenBucket(global_per_second, capacity=global_per_second, name="telegram global")
+        
+        self._chat_jobs: Dict[Any, List[_SendJob]] = {}
+        # Первые задачи чатов; устаревшие записи (задача уже не первая) пропускаются при выборке
+        self._heads: List[_SendJob] = []
+        self._seq = itertools.count()
+        self._busy = set()
+        self._sent_at: Dict[Any, deque] = {}
+        self._blocked_until: Dict[Any, float] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running: set = set()
+        
+        # Метрики
+        self.sent = 0
+        self.failed = 0
+        self.paced = 0
+        self.rate_limited = 0
+        self.retry_after_total = 0.0
+        self._waits: Dict[int, deque] = {}
+        self._wait_counts: Dict[int, int] = {}
+        
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+            
+    async def submit(self, chat_id: Any, factory: Callable[[], Awaitable[Any]],
+                     priority: int = PRIORITY_POST, cost: int = 1) -> Any:
+        """
+        Ставит отправку в очередь и ждет ее результата.
+        factory создает новый запрос на каждую попытку; cost - сколько сообщений
+        он отправляет (для медиагруппы - число фото)
+        """
+        self._ensure_dispatcher()
+        # Один чат может прийти и строкой, и числом (-100...) - лимиты общие
+        job = _SendJob(priority, next(self._seq), str(chat_id), max(cost, 1), factory,
+                       asyncio.get_running_loop().create_future())
+        self._push(job)
+        self._wakeup.set()
+        return await job.future
+        
+    def _push(self, job: _SendJob):
+        """Кладет задачу в кучу ее чата; если она стала первой - и в общую кучу"""
+        jobs = self._chat_jobs.setdefault(job.chat_id, [])
+        heapq.heappush(jobs, job)
+        if jobs[0] is job:
+            heapq.heappush(self._heads, job)
+        
+    def _ready_at(self, chat_id: Any, cost: int, now: float) -> float:
+        """Когда в чат можно отправить следующее сообщение"""
+        ready = self._blocked_until.get(chat_id, 0.0)
+        sent = self._sent_at.get(chat_id)
+        if sent:
+            ready = max(ready, sent[-1] + self.chat_min_interval)
+            # Окно в минуту: ждем, пока освободится место под cost сообщений
+            overflow = len(sent) + cost - self.chat_per_minute
+            if overflow > 0:
+                ready = max(ready, sent[min(overflow, len(sent)) - 1] + 60.0)
+        return ready
+        
+    def _take_ready(self, now: float):
+        """Задача с наивысшим приоритетом среди готовых чатов, иначе время ближайшей готовности"""
+        earliest = None
+        taken = None
+        waiting = []
+        while self._heads:
+            job = heapq.heappop(self._heads)
+            jobs = self._chat_jobs.get(job.chat_id)
+            if not jobs or jobs[0] is not job:
+                continue
+            if job.chat_id in self._busy:
+                waiting.append(job)
+                continue
+            ready = self._ready_at(job.chat_id, job.cost, now)
+            if ready <= now:
+                heapq.heappop(jobs)
+                if jobs:
+                    heapq.heappush(self._heads, jobs[0])
+                else:
+                    del self._chat_jobs[job.chat_id]
+                taken = job
+                break
+            waiting.append(job)
+            earliest = ready if earliest is None else min(earliest, ready)
+        for job in waiting:
+            heapq.heappush(self._heads, job)
+        return (taken, None) if taken else (None, earliest)
+        
+    async def _dispatch(self):
+        while True:
+            now = time.monotonic()
+            job, earliest = self._take_ready(now)
+            if job is None:
+                self._wakeup.clear()
+                timeout = None if earliest is None else max(earliest - now, 0.0)
+                if timeout is not None:
+                    self.paced += 1
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+                
+            await self._global.acquire_async(job.cost)
+            self._busy.add(job.chat_id)
+            task = asyncio.create_task(self._execute(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            
+    async def _execute(self, job: _SendJob):
+        now = time.monotonic()
+        if job.attempts == 0:
+            self._waits.setdefault(job.priority, deque(maxlen=500)).append(now - job.enqueued_at)
+            self._wait_counts[job.priority] = self._wait_counts.get(job.priority, 0) + 1
+        sent = self._sent_at.setdefault(job.chat_id, deque())
+        while sent and sent[0] <= now - 60.0:
+            sent.popleft()
+        sent.extend([now] * job.cost)
+        job.attempts += 1
+        try:
+            result = await job.factory()
+        except Exception as e:
+            retry_after = retry_after_seconds(e)
+            if retry_after is not None and job.attempts <= self.max_rate_limit_retries:
+                self.rate_limited += 1
+                self.retry_after_total += retry_after
+                self._blocked_until[job.chat_id] = time.monotonic() + retry_after
+                logger.warning(f"Telegram 429 для чата {job.chat_id}: ждем {retry_after:.0f} сек (retry_after)")
+                self._push(job)
+            else:
+                self.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._busy.discard(job.chat_id)
+            self._wakeup.set()
+            
+    @property
+    def depth(self) -> int:
+        return sum(len(jobs) for jobs in self._chat_jobs.values())
+        
+    def stats(self) -> Dict[str, Any]:
+        """Метрики очереди: ожидание по приоритетам, паузы по лимитам, ответы 429"""
+        waits = {}
+        for priority, samples in self._waits.items():
+            waits[_PRIORITY_NAMES.get(priority, str(priority))] = {
+                'count': self._wait_counts[priority],
+                'avg_ms': round(sum(samples) / len(samples) * 1000, 1),
+                'max_ms': round(max(samples) * 1000, 1),
+            }
+        return {
+            'depth': self.depth,
+            'sent': self.sent,
+            'failed': self.failed,
+            'paced': self.paced,
+            'global_throttled': self._global.throttled,
+            'rate_limited': self.rate_limited,
+            'retry_after_total': round(self.retry_after_total, 1),
+            'wait': waits,
+        }
+        
+    async def close(self):
+        """Дожидается отправок в процессе и останавливает диспетчер"""
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        if self._dispatcher and not self._dispatcher.done():
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+        for jobs in self._chat_jobs.values():
+            for job in jobs:
+                if not job.future.done():
+                    job.future.set_exception(RuntimeError("очередь отправки Telegram остановлена"))
+        self._chat_jobs.clear()
+        self._heads.clear()
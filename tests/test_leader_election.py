@@ -0,0 +1,84 @@
+"""
+Аренда лидерства в SQLite: захват после истечения срока
+"""
+import pytest
+
+import leader_election
+from leader_election import LeaderElector, SqliteLeaseBackend
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+        
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(leader_election.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def lease_path(tmp_path):
+    return str(tmp_path / "lease.db")
+
+
+def test_lease_is_exclusive_until_it_expires(clock, lease_path):
+    first, second = SqliteLeaseBackend(lease_path), SqliteLeaseBackend(lease_path)
+    assert first.acquire('replica-a', ttl=15)
+    assert not second.acquire('replica-b', ttl=15)
+    assert second.current_holder() == 'replica-a'
+    
+    # Ведущий упал и не продлевает аренду
+    clock.now += 16
+    assert second.current_holder() is None
+    assert second.acquire('replica-b', ttl=15)
+    assert not first.acquire('replica-a', ttl=15)
+    assert first.current_holder() == 'replica-b'
+    first.close()
+    second.close()
+
+
+def test_renewal_keeps_the_lease(clock, lease_path):
+    first, second = SqliteLeaseBackend(lease_path), SqliteLeaseBackend(lease_path)
+    assert first.acquire('replica-a', ttl=15)
+    for _ in range(3):
+        clock.now += 10
+        assert first.acquire('replica-a', ttl=15)
+        assert not second.acquire('replica-b', ttl=15)
+    first.close()
+    second.close()
+
+
+def test_release_hands_over_immediately(clock, lease_path):
+    first, second = SqliteLeaseBackend(lease_path), SqliteLeaseBackend(lease_path)
+    assert first.acquire('replica-a', ttl=15)
+    first.release('replica-a')
+    assert second.acquire('replica-b', ttl=15)
+    first.close()
+    second.close()
+
+
+def test_standby_elector_takes_over_after_expiry(clock, lease_path):
+    leader = LeaderElector(SqliteLeaseBackend(lease_path), ttl=15, holder_id='replica-a')
+    standby = LeaderElector(SqliteLeaseBackend(lease_path), ttl=15, holder_id='replica-b')
+    elected = []
+    standby.on_elected(lambda: elected.append('replica-b'))
+    
+    leader._tick()
+    standby._tick()
+    assert leader.is_leader and not standby.is_leader
+    
+    clock.now += 16
+    standby._tick()
+    assert standby.is_leader
+    assert elected == ['replica-b']
+    # Прежний ведущий при следующем продлении узнает, что аренда потеряна
+    leader._tick()
+    assert not leader.is_leader
+    leader.backend.close()
+    standby.backend.close()
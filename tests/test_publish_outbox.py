@@ -0,0 +1,103 @@
+"""
+Журнал публикаций: продолжение после перезапуска из intent/sent/partial
+"""
+import pytest
+
+from post_record import Post
+from publish_outbox import PublishOutbox, STATE_DONE, STATE_INTENT, STATE_PARTIAL, STATE_SENT
+
+
+def make_post(row_index, text="Текст поста", destinations=""):
+    return Post(['2026-10-18', '12:00', text, '', '', '', 'Ожидает', destinations], row_index)
+
+
+@pytest.fixture
+def outbox_path(tmp_path):
+    return str(tmp_path / "outbox.db")
+
+
+def reopen(outbox: PublishOutbox, path: str) -> PublishOutbox:
+    """Перезапуск процесса: журнал читается заново с диска"""
+    outbox.close()
+    return PublishOutbox(path)
+
+
+def test_intent_is_unknown_after_restart(outbox_path):
+    outbox = PublishOutbox(outbox_path)
+    post = make_post(5)
+    outbox.record_intent(post)
+    outbox = reopen(outbox, outbox_path)
+    
+    result = outbox.reconcile([post])
+    assert result['unknown'] == [post]
+    assert result['sent'] == []
+    assert outbox.get_state(post) == STATE_INTENT
+    outbox.close()
+
+
+def test_sent_is_resumed_and_marked_done(outbox_path):
+    outbox = PublishOutbox(outbox_path)
+    post = make_post(5)
+    outbox.record_intent(post)
+    outbox.record_sent(post, {'@channel': [101, 102]})
+    outbox = reopen(outbox, outbox_path)
+    
+    result = outbox.reconcile([post])
+    assert result['sent'] == [post]
+    assert outbox.unfinished()[PublishOutbox.post_key(post)]['message_ids'] == {'@channel': [101, 102]}
+    outbox.mark_done([post.row_index])
+    assert outbox.get_state(post) == STATE_DONE
+    outbox.close()
+
+
+def test_partial_keeps_progress_and_is_left_to_retry(outbox_path):
+    outbox = PublishOutbox(outbox_path)
+    post = make_post(5, destinations="@a, @b")
+    outbox.record_intent(post)
+    outbox.record_partial(post, {'@a': [7, 8], '@b': [9]}, {'@b': 1})
+    outbox = reopen(outbox, outbox_path)
+    
+    result = outbox.reconcile([post])
+    assert result == {'sent': [], 'unknown': []}
+    assert outbox.get_state(post) == STATE_PARTIAL
+    assert outbox.get_partial(post) == {'message_ids': {'@a': [7, 8], '@b': [9]}, 'progress': {'@b': 1}}
+    outbox.close()
+
+
+def test_sent_post_no_longer_pending_is_completed(outbox_path):
+    outbox = PublishOutbox(outbox_path)
+    sent, intended = make_post(5, "Отправлен"), make_post(6, "Не отправлен")
+    outbox.record_sent(sent, {'@channel': [1]})
+    outbox.record_intent(intended)
+    outbox = reopen(outbox, outbox_path)
+    
+    # Статус обоих постов в таблице уже не "Ожидает"
+    assert outbox.reconcile([]) == {'sent': [], 'unknown': []}
+    assert outbox.get_state(sent) == STATE_DONE
+    assert outbox.get_state(intended) is None
+    outbox.close()
+
+
+def test_identical_rows_are_separate_entries(outbox_path):
+    outbox = PublishOutbox(outbox_path)
+    first, second = make_post(5), make_post(6)
+    outbox.record_sent(first, {'@channel': [1]})
+    
+    assert outbox.get_state(first) == STATE_SENT
+    assert outbox.get_state(second) is None
+    assert outbox.reconcile([first, second])['sent'] == [first]
+    outbox.close()
+
+
+def test_entry_follows_shifted_row(outbox_path):
+    outbox = PublishOutbox(outbox_path)
+    outbox.record_sent(make_post(5), {'@channel': [1]})
+    outbox = reopen(outbox, outbox_path)
+    
+    # Пока процесс не работал, выше вставили строку - пост переехал на строку 6
+    shifted = make_post(6)
+    result = outbox.reconcile([shifted])
+    assert result['sent'] == [shifted]
+    assert outbox.get_state(shifted) == STATE_SENT
+    assert outbox.get_state(make_post(5)) is None
+    outbox.close()
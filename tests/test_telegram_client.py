@@ -0,0 +1,128 @@
+"""
+TelegramClient: общий бот и очередь, задержка запросов, выполнение плана отправки
+"""
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+import pytest
+from telebot.asyncio_helper import ApiTelegramException
+
+import telegram_client
+from telegram_client import TelegramClient
+from telegram_send_queue import TelegramSendQueue
+
+IMAGES = ['https://example.com/1.jpg', 'https://example.com/2.jpg']
+LONG_POST = "<b>Заголовок</b>\n\n" + "\n\n".join(f"Абзац {i}: " + "слово " * 60 for i in range(20))
+
+
+class FakeBot:
+    """Бот без сети: запоминает вызовы и падает на заданных по счету вызовах"""
+    
+    def __init__(self, failures=None):
+        self.calls = []
+        self.failures = dict(failures or {})
+        self._ids = itertools.count(100)
+        
+    async def _call(self, method, count, **kwargs):
+        self.calls.append((method, kwargs))
+        error = self.failures.pop(len(self.calls), None)
+        if error:
+            raise error
+        return [SimpleNamespace(message_id=next(self._ids)) for _ in range(count)]
+        
+    async def send_message(self, **kwargs):
+        return (await self._call('send_message', 1, **kwargs))[0]
+        
+    async def send_photo(self, **kwargs):
+        return (await self._call('send_photo', 1, **kwargs))[0]
+        
+    async def send_media_group(self, **kwargs):
+        return await self._call('send_media_group', len(kwargs['media']), **kwargs)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # telebot проверяет формат токена при создании бота; запросы в тестах не уходят
+    monkeypatch.setattr(telegram_client, 'TELEGRAM_BOT_TOKEN', '123456:TEST')
+    client = TelegramClient()
+    client.send_queue = TelegramSendQueue(chat_min_interval=0)
+    return client
+
+
+def run_plan(client, plan, start=0):
+    async def run():
+        try:
+            return await client.execute_plan(plan, start=start)
+        finally:
+            await client.send_queue.close()
+    return asyncio.run(run())
+
+
+def test_channel_clients_share_bot_and_queue(client):
+    other = client.for_channel('-1001234567890')
+    assert other.channel_id == -1001234567890
+    assert other.bot is client.bot
+    assert other.send_queue is client.send_queue
+    assert other.latency is client.latency
+
+
+def test_timed_records_latency_per_method(client):
+    async def get_me():
+        return 'ok'
+        
+    async def send_message():
+        raise RuntimeError("boom")
+        
+    async def run():
+        assert await client.timed(get_me()) == 'ok'
+        with pytest.raises(RuntimeError):
+            await client.timed(send_message())
+            
+    asyncio.run(run())
+    stats = client.latency.snapshot()
+    assert stats['get_me']['count'] == 1 and stats['get_me']['errors'] == 0
+    assert stats['send_message']['count'] == 1 and stats['send_message']['errors'] == 1
+
+
+def test_execute_plan_sends_every_step(client):
+    client.bot = FakeBot()
+    plan = client.plan_post(LONG_POST, IMAGES)
+    result = run_plan(client, plan)
+    assert result.ok
+    assert [method for method, _ in client.bot.calls] == ['send_media_group', 'send_message', 'send_message']
+    assert result.message_ids == [100, 101, 102, 103]
+
+
+def test_execute_plan_stops_on_error_and_resumes_mid_plan(client):
+    error = ApiTelegramException('sendMessage', None, {'error_code': 502, 'description': 'Bad Gateway'})
+    client.bot = FakeBot(failures={2: error})
+    plan = client.plan_post(LONG_POST, IMAGES)
+    assert len(plan) == 3
+    
+    first = run_plan(client, plan)
+    assert not first.ok and first.retryable
+    assert first.steps_done == 1
+    assert first.message_ids == [100, 101]
+    
+    # Продолжение с шага, на котором была ошибка: медиагруппа не отправляется повторно
+    resumed = run_plan(client, plan, start=first.steps_done)
+    assert resumed.ok and resumed.steps_done == 3
+    methods = [method for method, _ in client.bot.calls]
+    assert methods == ['send_media_group', 'send_message', 'send_message', 'send_message']
+    assert client.bot.calls[1][1] == client.bot.calls[2][1]
+    assert resumed.message_ids == [102, 103]
+
+
+def test_execute_plan_timeout_is_not_retryable(client):
+    client.bot = FakeBot(failures={1: asyncio.TimeoutError()})
+    result = run_plan(client, client.plan_post("Короткий пост"))
+    assert not result.ok and not result.retryable
+    assert result.steps_done == 0 and result.message_ids == []
+
+
+def test_dry_run_sends_nothing(client):
+    client.bot = FakeBot()
+    result = asyncio.run(client.execute_plan(client.plan_post(LONG_POST, IMAGES), dry_run=True))
+    assert client.bot.calls == []
+    assert result.message_ids == []
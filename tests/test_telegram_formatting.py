@@ -0,0 +1,75 @@
+"""
+Разбор разметки постов: вложенная и несбалансированная разметка, сущности Bot API
+"""
+import pytest
+
+from telegram_formatting import compile_post, sanitize, utf16_length, validate_entities
+
+NESTED_AND_UNBALANCED = [
+    "<b>жирный <i>курсив</i></b> текст",
+    "<b>x<i>y</b>z</i>",
+    "**жирный *курсив* внутри**",
+    "<b>незакрытый тег",
+    "лишний закрывающий</i> тег",
+    "**непарный маркер и <u>подчеркнутый</u>",
+    "<a href='https://example.com'>внешняя <a href='https://example.org'>внутренняя</a></a>",
+    "<b>жирный <code>код</code></b> 👍 <i>после эмодзи</i>",
+    "<pre>код с <b>тегами</b> внутри</pre>",
+    "> цитата <b>с жирным\nи продолжение</b>",
+    "начало ` непарный апостроф и <b>жирный</b> &amp; сущность",
+    "```незакрытый блок и <i>курсив</i>",
+    "`код` и `незакрытый",
+    "[ссылка](https://example.com) и **[жирная ссылка](https://example.org)**",
+    "<tg-spoiler>спойлер ||внутри||</tg-spoiler> 🎉🎉 <s>зачеркнутый</s>",
+]
+
+
+def marks(formatted):
+    """Форматирование каждого символа: сравнение не зависит от того, как диапазоны разбиты на части"""
+    result = [set() for _ in formatted.text]
+    for span in formatted.spans:
+        for index in range(span.start, span.end):
+            result[index].add((span.type, span.url))
+    return result
+
+
+@pytest.mark.parametrize('text', NESTED_AND_UNBALANCED)
+def test_html_round_trip(text):
+    formatted = compile_post(text)
+    again = compile_post(formatted.render_html())
+    assert again.text == formatted.text
+    assert marks(again) == marks(formatted)
+
+
+@pytest.mark.parametrize('text', NESTED_AND_UNBALANCED)
+def test_sanitized_entities_pass_validation(text):
+    clean = sanitize(compile_post(text))
+    entities = clean.to_entities()
+    assert validate_entities(clean.text, entities) == ([], [])
+    total = utf16_length(clean.text)
+    assert all(0 <= entity.offset and entity.offset + entity.length <= total for entity in entities)
+
+
+def test_crossed_tags_are_split_into_nested_ranges():
+    formatted = compile_post("<b>x<i>y</b>z</i>")
+    assert formatted.text == "xyz"
+    assert formatted.render_html() == "<b>x<i>y</i></b><i>z</i>"
+
+
+def test_unclosed_markdown_stays_text():
+    assert compile_post("**непарный маркер").text == "**непарный маркер"
+    formatted = compile_post("a ` b <b>c</b> &amp;")
+    assert formatted.text == "a ` b c &"
+    assert formatted.render_html() == "a ` b <b>c</b> &amp;"
+
+
+def test_nested_links_and_code_are_rejected():
+    formatted = compile_post("<a href='https://a.example'>x <a href='https://b.example'>y</a></a> <b>b <code>c</code></b>")
+    _, invalid = validate_entities(formatted.text, formatted.to_entities())
+    assert sorted((entity.type, entity.url) for entity in invalid) == [('code', None), ('text_link', 'https://b.example')]
+
+
+def test_entity_offsets_count_utf16_units():
+    formatted = compile_post("👍 <b>жирный</b>")
+    (entity,) = formatted.to_entities()
+    assert (entity.type, entity.offset, entity.length) == ('bold', 3, 6)
@@ -0,0 +1,132 @@
+"""
+Очередь отправки Telegram: retry_after и лимиты на чат
+"""
+import asyncio
+import time
+
+import pytest
+from telebot.asyncio_helper import ApiTelegramException
+
+from telegram_send_queue import (
+    PRIORITY_NOTIFICATION, PRIORITY_POST, TelegramSendQueue, is_retryable_send_error, retry_after_seconds
+)
+
+
+def api_error(code, retry_after=None):
+    result_json = {'ok': False, 'error_code': code, 'description': f"error {code}"}
+    if retry_after is not None:
+        result_json['parameters'] = {'retry_after': retry_after}
+    return ApiTelegramException('sendMessage', None, result_json)
+
+
+class Recorder:
+    """Фабрики запросов, которые запоминают время и порядок отправок"""
+    
+    def __init__(self):
+        self.sent = []
+        
+    def factory(self, label, errors=()):
+        errors = list(errors)
+        
+        async def request():
+            if errors:
+                raise errors.pop(0)
+            self.sent.append((label, time.monotonic()))
+            return label
+            
+        return request
+
+
+def test_retry_after_helpers():
+    assert retry_after_seconds(api_error(429, retry_after=3)) == 3.0
+    assert retry_after_seconds(api_error(400)) is None
+    assert retry_after_seconds(RuntimeError()) is None
+    assert is_retryable_send_error(api_error(429)) and is_retryable_send_error(api_error(502))
+    assert not is_retryable_send_error(api_error(400))
+    assert not is_retryable_send_error(asyncio.TimeoutError())
+
+
+def test_retry_after_blocks_only_the_limited_chat():
+    recorder = Recorder()
+    
+    async def run():
+        queue = TelegramSendQueue(chat_min_interval=0)
+        started = time.monotonic()
+        limited = asyncio.ensure_future(
+            queue.submit('chat-a', recorder.factory('a', [api_error(429, retry_after=0.3)]))
+        )
+        other = asyncio.ensure_future(queue.submit('chat-b', recorder.factory('b')))
+        assert await asyncio.gather(limited, other) == ['a', 'b']
+        await queue.close()
+        return queue, started
+        
+    queue, started = asyncio.run(run())
+    sent = dict(recorder.sent)
+    assert sent['b'] - started < 0.2
+    assert sent['a'] - started >= 0.3
+    assert queue.stats()['rate_limited'] == 1
+    assert queue.stats()['retry_after_total'] == pytest.approx(0.3)
+
+
+def test_retry_after_gives_up_after_max_retries():
+    async def run():
+        queue = TelegramSendQueue(chat_min_interval=0, max_rate_limit_retries=1)
+        errors = [api_error(429, retry_after=0.01), api_error(429, retry_after=0.01)]
+        with pytest.raises(ApiTelegramException):
+            await queue.submit('chat-a', Recorder().factory('a', errors))
+        await queue.close()
+        return queue
+        
+    queue = asyncio.run(run())
+    assert queue.rate_limited == 1
+    assert queue.failed == 1
+
+
+def test_chat_min_interval_paces_one_chat():
+    recorder = Recorder()
+    
+    async def run():
+        queue = TelegramSendQueue(chat_min_interval=0.2)
+        await asyncio.gather(*(queue.submit('chat-a', recorder.factory(i)) for i in range(3)))
+        await queue.close()
+        
+    asyncio.run(run())
+    labels = [label for label, _ in recorder.sent]
+    times = [sent_at for _, sent_at in recorder.sent]
+    assert labels == [0, 1, 2]
+    assert all(later - earlier >= 0.19 for earlier, later in zip(times, times[1:]))
+
+
+def test_chat_per_minute_limit_holds_back_extra_messages():
+    recorder = Recorder()
+    
+    async def run():
+        queue = TelegramSendQueue(chat_per_minute=2, chat_min_interval=0)
+        jobs = [asyncio.ensure_future(queue.submit('chat-a', recorder.factory(f'a{i}'))) for i in range(3)]
+        jobs.append(asyncio.ensure_future(queue.submit('chat-b', recorder.factory('b0'))))
+        done, pending = await asyncio.wait(jobs, timeout=0.3)
+        assert pending == {jobs[2]}
+        assert queue.depth == 1
+        await queue.close()
+        with pytest.raises(RuntimeError):
+            await jobs[2]
+            
+    asyncio.run(run())
+    assert sorted(label for label, _ in recorder.sent) == ['a0', 'a1', 'b0']
+
+
+def test_posts_go_before_notifications_in_one_chat():
+    recorder = Recorder()
+    
+    async def run():
+        queue = TelegramSendQueue(chat_min_interval=0.05)
+        # Первая отправка занимает чат, остальные ждут и выбираются по приоритету
+        first = asyncio.ensure_future(queue.submit('chat-a', recorder.factory('first')))
+        await asyncio.sleep(0)
+        notification = queue.submit('chat-a', recorder.factory('notification'), priority=PRIORITY_NOTIFICATION)
+        post = queue.submit('chat-a', recorder.factory('post'), priority=PRIORITY_POST)
+        await asyncio.gather(first, notification, post)
+        await queue.close()
+        
+    asyncio.run(run())
+    assert [label for label, _ in recorder.sent] == ['first', 'post', 'notification']